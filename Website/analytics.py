@@ -0,0 +1,143 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from inventory import MACROS, NO_EXPIRY_ORDINAL, item_expiry_ordinal, item_name_key
+
+# Days over which a batch's waste risk decays: expiring today counts fully,
+# in RISK_HALF_LIFE_DAYS days half, and so on.
+RISK_HALF_LIFE_DAYS = 3
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+class InventoryColumns:
+    """
+    Columnar (struct-of-arrays) copy of an inventory for vectorized analytics.
+
+    One row per batch: `quantity`, `expiry` (day ordinal), `macros` (an n x 4
+    array of the remaining calories/protein/carbs/fats, from the stored
+    per-unit values where present) and integer codes into `types` / `units`.
+    Building it is a single pass over the dicts; every aggregation after that
+    is a NumPy operation over whole columns.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        n = len(items)
+        self.names: List[str] = []
+        self.quantity = np.zeros(n)
+        self.expiry = np.full(n, NO_EXPIRY_ORDINAL, dtype=np.int64)
+        self.macros = np.zeros((n, len(MACROS)))
+        type_index: Dict[str, int] = {}
+        unit_index: Dict[str, int] = {}
+        self.type_codes = np.zeros(n, dtype=np.int32)
+        self.unit_codes = np.zeros(n, dtype=np.int32)
+
+        for row, item in enumerate(items):
+            quantity = _number(item.get("quantity"))
+            per_unit = item.get("per_unit")
+            self.names.append(item_name_key(item))
+            self.quantity[row] = quantity
+            self.expiry[row] = item_expiry_ordinal(item)
+            for col, macro in enumerate(MACROS):
+                self.macros[row, col] = (
+                    _number(per_unit.get(macro)) * quantity if isinstance(per_unit, dict) else _number(item.get(macro))
+                )
+            self.type_codes[row] = type_index.setdefault(str(item.get("type") or "other"), len(type_index))
+            self.unit_codes[row] = unit_index.setdefault(str(item.get("unit") or "units"), len(unit_index))
+
+        self.types = list(type_index)
+        self.units = list(unit_index)
+
+    def __len__(self) -> int:
+        return len(self.quantity)
+
+    def _macro_dict(self, values: np.ndarray) -> Dict[str, float]:
+        return {macro: round(float(value), 1) for macro, value in zip(MACROS, values)}
+
+    def days_left(self, today: int) -> np.ndarray:
+        """Days until expiry per batch (negative = expired); huge for batches without a date."""
+        return self.expiry - today
+
+    def totals(self) -> Dict[str, float]:
+        return self._macro_dict(self.macros.sum(axis=0))
+
+    def totals_by_type(self) -> Dict[str, Dict[str, Any]]:
+        """Batch count and macro totals per food type."""
+        k = len(self.types)
+        counts = np.bincount(self.type_codes, minlength=k)
+        sums = np.zeros((k, len(MACROS)))
+        np.add.at(sums, self.type_codes, self.macros)
+        return {
+            food_type: {"batches": int(counts[code]), **self._macro_dict(sums[code])}
+            for code, food_type in enumerate(self.types)
+        }
+
+    def quantity_by_unit(self) -> Dict[str, float]:
+        sums = np.bincount(self.unit_codes, weights=self.quantity, minlength=len(self.units))
+        return {unit: round(float(sums[code]), 2) for code, unit in enumerate(self.units)}
+
+    def expiring_within(self, days: int, today: int) -> Dict[str, Any]:
+        """Batches (and their macros) that are still good but expire within `days` days."""
+        left = self.days_left(today)
+        mask = (left >= 0) & (left <= days)
+        return {"window_days": days, "batches": int(mask.sum()), **self._macro_dict(self.macros[mask].sum(axis=0))}
+
+    def expired(self, today: int) -> Dict[str, Any]:
+        mask = self.days_left(today) < 0
+        return {"batches": int(mask.sum()), **self._macro_dict(self.macros[mask].sum(axis=0))}
+
+    def waste_risk(self, today: int, top: int = 5) -> Dict[str, Any]:
+        """
+        Calorie-weighted waste risk. Each batch's risk is 1 if it expires today
+        or has expired, halving every RISK_HALF_LIFE_DAYS days before that, and
+        0 without an expiry date. The score is the share of the fridge's
+        calories at risk (0-1); `top` lists the batches with the most at stake.
+        """
+        left = self.days_left(today)
+        dated = self.expiry != NO_EXPIRY_ORDINAL
+        risk = np.where(dated, np.power(0.5, np.clip(left, 0, None) / RISK_HALF_LIFE_DAYS), 0.0)
+        calories = self.macros[:, 0]
+        at_stake = risk * calories
+
+        total_calories = calories.sum()
+        score = float(at_stake.sum() / total_calories) if total_calories > 0 else 0.0
+
+        order = np.argsort(-at_stake, kind="stable")[:top]
+        return {
+            "score": round(score, 3),
+            "calories_at_risk": round(float(at_stake.sum()), 1),
+            "top": [
+                {
+                    "name": self.names[i],
+                    "days_left": int(left[i]) if dated[i] else None,
+                    "calories": round(float(calories[i]), 1),
+                    "risk": round(float(risk[i]), 3),
+                }
+                for i in order
+                if at_stake[i] > 0
+            ],
+        }
+
+
+def summarize_inventory(
+    items: List[Dict[str, Any]],
+    expiring_days: int = 3,
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """The /api/fridge-summary payload: totals, per-type breakdown, expiry and waste risk."""
+    today_ordinal = (today or date.today()).toordinal()
+    columns = InventoryColumns(items)
+    return {
+        "batches": len(columns),
+        "distinct_foods": len(set(columns.names)),
+        "totals": columns.totals(),
+        "quantity_by_unit": columns.quantity_by_unit(),
+        "by_type": columns.totals_by_type(),
+        "expiring": columns.expiring_within(expiring_days, today_ordinal),
+        "expired": columns.expired(today_ordinal),
+        "waste_risk": columns.waste_risk(today_ordinal),
+    }
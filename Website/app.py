@@ -1,20 +1,57 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, Response, g, request, render_template, jsonify, url_for
 from google import genai
+from google.genai import types
+import copy
+import hashlib
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
+
+# Load .env before the local modules below read their configuration from it.
+load_dotenv()
+
 import data
-from datetime import datetime
+import image_prep
+import metrics
+from analytics import summarize_inventory
+from cache import TTLCache
+from jobs import FINISHED_STATES, JobManager, QueueFullError
+from json_stream import JSONArrayStreamParser
+from metrics import MODEL_ERRORS, MODEL_LATENCY, MODEL_REQUEST_BYTES, MODEL_RESPONSE_BYTES, PARSE_LATENCY, REQUEST_LATENCY
+from model_governor import MODEL_TIMEOUT, ModelGovernor, ModelUnavailableError, request_key
+from model_router import ModelRouter
+from prompt_builder import build_inventory_table, estimate_tokens
+from prompt_cache import PromptCache
+from recipe_cache import RecipeCache, recipe_cache_key
+from recipe_index import LOCAL_RECIPES, RecipeIndex
+from schemas import INVENTORY_SCHEMA, RECIPES_SCHEMA, extract_json, validate_recipe, validate_recipes
+from datetime import date, datetime
 
 
 today_date = datetime.now().strftime("%d/%m/%Y")
 import json
 
 
-load_dotenv()
-
 app = Flask(__name__)
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Each HTTP request is cut off at the governor's per-attempt timeout (in ms), so an
+# attempt the governor gave up on frees its slot instead of waiting on the API.
+client = genai.Client(
+    api_key=os.getenv("GEMINI_API_KEY"),
+    http_options=types.HttpOptions(timeout=int(MODEL_TIMEOUT * 1000)),
+)
+
+# Ask for schema-shaped JSON instead of free text (FOOGIE_STRUCTURED_OUTPUT=0 to turn off).
+STRUCTURED_OUTPUT = os.getenv("FOOGIE_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+INVENTORY_CONFIG = (
+    types.GenerateContentConfig(response_mime_type="application/json", response_schema=INVENTORY_SCHEMA)
+    if STRUCTURED_OUTPUT else None
+)
+RECIPES_CONFIG = (
+    types.GenerateContentConfig(response_mime_type="application/json", response_schema=RECIPES_SCHEMA)
+    if STRUCTURED_OUTPUT else None
+)
 
 # id for the json bin. Stores all data.
 BIN_ID = os.getenv("BIN_ID")
@@ -22,6 +59,103 @@ BIN_ID = os.getenv("BIN_ID")
 # id for testing only, contains garbage.
 TEST_BIN_ID = os.getenv("TEST_BIN_ID")
 
+# Generated recipes, reused until the inventory or the preferences change.
+recipe_cache = RecipeCache()
+data.on_inventory_change(recipe_cache.invalidate_bin)
+
+# /analyze results keyed by a hash of the image bytes, so re-uploads and
+# camera retries of the same photo skip the model call.
+image_cache = TTLCache(
+    maxsize=int(os.getenv("FOOGIE_IMAGE_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("FOOGIE_IMAGE_CACHE_TTL", "86400")),
+    name="images",
+)
+
+# Bundled recipe corpus, searched before the model is asked (see suggest_local_recipes).
+recipe_index = RecipeIndex.load() if LOCAL_RECIPES else None
+
+# Fridge summaries, keyed by bin revision so a write never serves a stale one.
+summary_cache = TTLCache(maxsize=256, ttl=3600, name="summaries")
+
+# Background workers for the model-backed endpoints (see the /api/jobs routes).
+job_manager = JobManager()
+
+# Concurrency cap, rate limit, timeouts, retries and dedup for every Gemini call.
+model_governor = ModelGovernor()
+
+# Picks the model per call (request size, latency budget, recent failures) and falls back.
+model_router = ModelRouter(model_governor)
+
+# The static prompt prefixes, uploaded once per model as Gemini cached content.
+prompt_cache = PromptCache()
+
+# /analyze/batch: how many images a request may send, and how many are analyzed at once.
+ANALYZE_BATCH_MAX_IMAGES = int(os.getenv("FOOGIE_ANALYZE_BATCH_MAX_IMAGES", "20"))
+ANALYZE_CONCURRENCY = int(os.getenv("FOOGIE_ANALYZE_CONCURRENCY", "4"))
+
+# Cache hit ratios are read from the caches' own counters when /metrics is scraped.
+metrics.REGISTRY.add_collector(
+    metrics.cache_collector(data.inventory_cache, recipe_cache, image_cache, summary_cache)
+)
+
+
+# --- Metrics ---
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    # Streamed responses are timed until their body starts.
+    started = g.pop("request_started", None)
+    if started is not None:
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Per-stage latency histograms and cache counters in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _payload_bytes(parts: list, prefix: str = None) -> int:
+    return sum(
+        len(part["text"].encode("utf-8")) if "text" in part else len(part["inline_data"]["data"])
+        for part in parts
+    ) + (len(prefix.encode("utf-8")) if prefix else 0)
+
+
+def generate_model_content(endpoint: str, parts: list, config=None, num_recipes: int = 0, prefix: str = None):
+    """
+    One Gemini call through the model router and governor (identical concurrent
+    requests share it), with its latency and payload sizes recorded under `endpoint`.
+    `prefix` is static prompt text sent ahead of `parts`, from the prompt cache when possible.
+    """
+    payload_bytes = _payload_bytes(parts, prefix)
+    MODEL_REQUEST_BYTES.observe(payload_bytes, endpoint=endpoint)
+    try:
+        with MODEL_LATENCY.time(endpoint=endpoint):
+            response = model_router.call(
+                endpoint,
+                lambda model: prompt_cache.generate_content(client, model, prefix, parts, config),
+                payload_bytes=payload_bytes,
+                num_recipes=num_recipes,
+                key=lambda model: request_key(model, prefix, parts, config),
+            )
+    except Exception:
+        MODEL_ERRORS.inc(endpoint=endpoint)
+        raise
+    MODEL_RESPONSE_BYTES.observe(len((response.text or "").encode("utf-8")), endpoint=endpoint)
+    return response
+
 
 @app.route("/")
 def index():
@@ -54,20 +188,68 @@ def get_fridge_data(bin_id):
         return jsonify({"error": "Failed to retrieve fridge data"}), 500
 
 
+# Not /api/fridge/summary: that would shadow /api/fridge/<bin_id> for a bin named "summary".
+@app.route("/api/fridge-summary")
+@app.route("/api/fridge/<bin_id>/summary")
+def fridge_summary(bin_id=None):
+    """
+    Precomputed dashboard numbers (totals, per-type breakdown, what expires in
+    the next `days` days, waste risk) so clients don't need the whole inventory.
+    """
+    bin_id = bin_id or TEST_BIN_ID  # Change to BIN_ID for actual use
+    days = request.args.get("days", 3, type=int)
+
+    fridge_data = data.read_data_from_bin(bin_id)
+    if fridge_data is None:
+        return jsonify({"error": "Failed to retrieve fridge data"}), 500
+
+    # A bin's revision changes on every write, so (bin, rev, days, day) is a safe key.
+    rev = fridge_data.get("_rev")
+    key = (bin_id, rev, days, date.today().toordinal())
+    summary = summary_cache.get(key) if rev is not None else None
+    if summary is None:
+        summary = summarize_inventory(fridge_data.get("inventory", []) or [], expiring_days=days)
+        if rev is not None:
+            summary_cache.set(key, summary)
+    return jsonify(summary)
+
+
 @app.route("/api/fridge/<bin_id>", methods=["PUT"])
 def update_fridge_data(bin_id):
-    updated_data = request.json
-
-    url = f"{data.BASE_URL}/{bin_id}"
-    headers = {"Content-Type": "application/json", "X-Master-Key": data.MASTER_KEY}
+    updated_data = request.get_json(silent=True)
+    if not isinstance(updated_data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
 
-    response = requests.put(url, headers=headers, data=json.dumps(updated_data))
+    # Clients that send back the "_rev" they loaded get a 409 instead of
+    # silently overwriting someone else's change.
+    expected_rev = updated_data.get("_rev")
 
     try:
-        response.raise_for_status()
-        return jsonify({"success": True})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        if data.replace_data_in_bin(bin_id, updated_data, expected_rev=expected_rev):
+            return jsonify({"success": True})
+        else:
+            return jsonify({"error": "Failed to update fridge data"}), 500
+    except data.ConflictError as e:
+        return jsonify({"error": str(e), "conflict": True}), 409
+
+
+@app.route("/api/model/stats")
+def model_stats():
+    """Model governor state (slots, rate-limit tokens, retry/hedge/dedup counters), routing and prompt cache stats."""
+    return jsonify(dict(model_governor.stats(), routing=model_router.stats(), prompt_cache=prompt_cache.stats()))
+
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the in-process caches and write buffer, used to size them."""
+    return jsonify({
+        "inventory": data.inventory_cache.stats(),
+        "recipes": recipe_cache.stats(),
+        "images": image_cache.stats(),
+        "summaries": summary_cache.stats(),
+        "write_buffer": data.write_buffer.stats(),
+    })
+
 
 @app.route("/api/consume/<bin_id>", methods=["POST"])
 def consume_items(bin_id):
@@ -88,16 +270,26 @@ def consume_items(bin_id):
         
         print(f"Processing consumption for bin {bin_id}: {consumed_map}")
         
-        # Use the data.py consume function
-        data.consume_data_from_bin(bin_id, consumed_map)
-        
-        # Return the updated inventory
-        updated_data = data.read_data_from_bin(bin_id)
-        
+        # One read + one write; the updated inventory comes straight back
+        result = data.consume_data_from_bin(bin_id, consumed_map)
+        if result is None:
+            return jsonify({"error": "Failed to update fridge data"}), 500
+
+        updated_data, report = result
+        shortfalls = {
+            name: entry for name, entry in report.items()
+            if entry["status"] in ("partial", "missing")
+        }
+
         return jsonify({
             "success": True,
-            "message": "Items consumed successfully",
-            "inventory": updated_data
+            "message": (
+                "Items consumed successfully" if not shortfalls
+                else "Some items could not be fully consumed"
+            ),
+            "inventory": updated_data,
+            "consumed": report,
+            "shortfalls": shortfalls,
         })
         
     except Exception as e:
@@ -106,99 +298,36 @@ def consume_items(bin_id):
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/generate-recipes", methods=["POST"])
-def generate_recipes():
-    """Generate recipe recommendations based on inventory, prioritizing expiring items"""
+def _int_or(value, default: int) -> int:
     try:
-        # Read inventory from bin
-        inventory_data = data.read_data_from_bin(
-            TEST_BIN_ID
-        )  # Change to BIN_ID for actual use
-
-        if not inventory_data or "inventory" not in inventory_data:
-            return jsonify({"error": "No inventory found"}), 400
-
-        items = inventory_data["inventory"]
-
-        if not items:
-            return jsonify({"error": "Inventory is empty"}), 400
-
-        # Sort by expiry date (earliest first)
-        from datetime import datetime
-
-        def parse_date(item):
-            try:
-                return datetime.strptime(
-                    item.get("expected_expiry_date", "31/12/2099"), "%d/%m/%Y"
-                )
-            except:
-                return datetime.max
-
-        sorted_items = sorted(items, key=parse_date)
-
-        # Analyze inventory diversity by type
-        type_counts = {}
-        for item in sorted_items:
-            item_type = item.get("type", "other")
-            type_counts[item_type] = type_counts.get(item_type, 0) + 1
+        return int(value)
+    except (TypeError, ValueError):
+        return default
 
-        available_types = list(type_counts.keys())
 
-        # Create a formatted inventory list for Gemini with CORRECTED nutritional info
-        inventory_text = (
-            "Current Inventory (sorted by expiry date - USE EARLIEST EXPIRING FIRST):\n"
-        )
-        for i, item in enumerate(sorted_items, 1):
-            days_until_expiry = "Unknown"
-            try:
-                exp_date = datetime.strptime(
-                    item.get("expected_expiry_date", ""), "%d/%m/%Y"
-                )
-                days = (exp_date - datetime.now()).days
-                days_until_expiry = (
-                    f"{days} days" if days > 0 else "EXPIRED" if days < 0 else "TODAY"
-                )
-            except:
-                pass
-
-            # Get unit and quantity for calculations
-            unit = item.get('unit', 'units')
-            quantity = item.get('quantity', 1)
-            
-            # CRITICAL: Calculate per-unit nutrition
-            # The stored values are TOTAL for all items, so divide by quantity
-            total_calories = item.get('calories', 0)
-            total_protein = item.get('protein', 0)
-            total_carbs = item.get('carbs', 0)
-            total_fats = item.get('fats', 0)
-            
-            # Calculate per-unit values
-            calories_per_unit = round(total_calories / quantity) if quantity > 0 else 0
-            protein_per_unit = round(total_protein / quantity) if quantity > 0 else 0
-            carbs_per_unit = round(total_carbs / quantity) if quantity > 0 else 0
-            fats_per_unit = round(total_fats / quantity) if quantity > 0 else 0
-            
-            inventory_text += f"{i}. {item.get('name', 'Unknown').upper()} ({item.get('type', 'food')})\n"
-            inventory_text += f"   - Available quantity: {quantity} {unit}\n"
-            inventory_text += f"   - Expires: {item.get('expected_expiry_date', 'Unknown')} ({days_until_expiry})\n"
-            inventory_text += f"   - TOTAL nutrition (for all {quantity} {unit}): {total_calories} cal, {total_protein}g protein, {total_carbs}g carbs, {total_fats}g fats\n"
-            inventory_text += f"   - PER-UNIT nutrition (per 1 {unit.rstrip('s')}): {calories_per_unit} cal, {protein_per_unit}g protein, {carbs_per_unit}g carbs, {fats_per_unit}g fats\n"
+def _calories_or(value, default: int) -> int:
+    """A positive whole calorie count, accepting numeric strings like "450" or "450.5"."""
+    try:
+        calories = round(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return calories if calories > 0 else default
 
-        # Get user preferences if provided
-        request_data = request.get_json() or {}
-        dietary_restrictions = request_data.get("dietary_restrictions", "")
-        cuisine_preference = request_data.get("cuisine_preference", "")
-        num_recipes = request_data.get("num_recipes", 3)
-        target_calories_per_meal = request_data.get("target_calories_per_meal", 500)
 
-        # Build the prompt with nutritional and diversity requirements
-        prompt = f"""{inventory_text}
+def recipe_preferences(request_data: dict) -> dict:
+    """Reads the recipe preferences from a request body, with the defaults filled in."""
+    return {
+        "dietary_restrictions": request_data.get("dietary_restrictions", ""),
+        "cuisine_preference": request_data.get("cuisine_preference", ""),
+        "num_recipes": _int_or(request_data.get("num_recipes"), 3),
+        "target_calories_per_meal": _calories_or(request_data.get("target_calories_per_meal"), 500),
+    }
 
-Available food types in inventory: {", ".join(available_types)}
 
-TARGET CALORIES PER MEAL: ~{target_calories_per_meal} calories (user's remaining daily budget divided by meals left)
-
-Generate {num_recipes} diverse and nutritionally balanced recipe recommendations following these STRICT RULES:
+# Recipe rules, identical for every request: sent once per model as cached
+# content (see prompt_cache), with build_recipe_prompt()'s text after it.
+RECIPE_PROMPT_PREFIX = """You are generating recipe recommendations from the fridge inventory, target calories,
+number of recipes and preferences given at the end of this prompt. Follow these STRICT RULES:
 
 🔴 PRIORITY RULES (MOST IMPORTANT):
 1. **ALWAYS prioritize ingredients expiring soonest** (items listed first MUST be used first)
@@ -215,24 +344,23 @@ Generate {num_recipes} diverse and nutritionally balanced recipe recommendations
 
 🥗 DIVERSITY REQUIREMENTS:
 1. Each recipe MUST use ingredients from AT LEAST 2-3 different food types (e.g., protein + vegetable + grain)
-2. Across all {num_recipes} recipes, try to use items from ALL available types: {", ".join(available_types)}
+2. Across all recipes, try to use items from ALL the available food types listed below
 3. Don't create recipes using only one food type (e.g., not just fruits or just vegetables)
 4. Balance macronutrients: aim for recipes with protein, carbs, and healthy fats
 
 📊 CRITICAL NUTRITIONAL CALCULATION RULES:
 **READ THIS CAREFULLY - THIS IS THE MOST IMPORTANT PART:**
 
-1. Each inventory item shows TWO nutrition values:
-   - TOTAL nutrition = for ALL units in inventory (e.g., 637 cal for 7 bananas)
-   - PER-UNIT nutrition = for ONE unit (e.g., 91 cal per 1 banana)
+1. The inventory table shows PER-UNIT nutrition: the "per" column says what amount it is for
+   (e.g. "1 item" or "100 grams"), NOT the whole available quantity.
 
-2. **YOU MUST USE THE PER-UNIT VALUES IN YOUR CALCULATIONS!**
-   - If using 2 bananas: 2 × 91 cal = 182 cal (NOT 2 × 637 = 1274 cal!)
-   - If using 200 grams of chicken (per-unit is per 100g): 2 × per-unit value
+2. **YOU MUST MULTIPLY BY THE AMOUNT USED:**
+   - If using 2 bananas at 91 kcal per item: 2 × 91 cal = 182 cal
+   - If using 200 grams of chicken at 110 kcal per 100 grams: 2 × 110 = 220 cal
 
 3. **CALCULATION FORMULA:**
    ```
-   Recipe Nutrition = Σ(quantity_used × per_unit_nutrition) + additional_ingredients_nutrition
+   Recipe Nutrition = Σ(amount_used / per_amount × per_unit_nutrition) + additional_ingredients_nutrition
    ```
 
 4. **EXAMPLE CALCULATION:**
@@ -241,7 +369,7 @@ Generate {num_recipes} diverse and nutritionally balanced recipe recommendations
    - Calculation: (3 × 91) + 150 = 273 + 150 = 423 total calories
    - Final: 423 cal, 3g protein, 69g carbs, 0g fats
 
-5. **TARGET: Aim for recipes around {target_calories_per_meal} calories per serving**
+5. **TARGET: Aim for recipes around the TARGET CALORIES PER MEAL given below, per serving**
 
 6. Each recipe should aim for balanced macros:
    - Protein: 15-30g per serving
@@ -254,14 +382,12 @@ Generate {num_recipes} diverse and nutritionally balanced recipe recommendations
 - When listing inventory items used, show the nutrition calculation clearly
 - Instructions should be 4-8 detailed steps
 - Cooking time should be realistic (15-60 minutes)
-
-{f"⚠️ DIETARY RESTRICTIONS: {dietary_restrictions} - STRICTLY follow these restrictions!" if dietary_restrictions else ""}
-{f"🌎 CUISINE PREFERENCE: {cuisine_preference} - Try to match this style" if cuisine_preference else ""}
+- STRICTLY follow any DIETARY RESTRICTIONS, try to match any CUISINE PREFERENCE, and never repeat a recipe listed as ALREADY SUGGESTED
 
 Format your response as a JSON array. Each recipe must include accurate nutritional calculations using PER-UNIT values:
 
 [
-  {{
+  {
     "name": "Recipe Name",
     "inventory_only": false,
     "inventory_items_used": [
@@ -272,22 +398,22 @@ Format your response as a JSON array. Each recipe must include accurate nutritio
     "instructions": ["Step 1...", "Step 2...", "Step 3...", "Step 4..."],
     "cooking_time": "30 minutes",
     "servings": 2,
-    "nutrition_per_serving": {{
+    "nutrition_per_serving": {
       "calories": 276,
       "protein": 27,
       "carbs": 33,
       "fats": 3
-    }},
-    "total_nutrition": {{
+    },
+    "total_nutrition": {
       "calories": 552,
       "protein": 54,
       "carbs": 66,
       "fats": 6
-    }},
+    },
     "food_types_used": ["protein", "fruit", "dairy"],
     "urgency": "high",
     "urgency_reason": "Uses bananas expiring in 6 days"
-  }}
+  }
 ]
 
 URGENCY LEVELS:
@@ -296,7 +422,7 @@ URGENCY LEVELS:
 - "low" = uses items expiring after 7 days
 
 ⚠️ CRITICAL REMINDERS:
-1. **USE PER-UNIT NUTRITION VALUES, NOT TOTAL VALUES!**
+1. **MULTIPLY PER-UNIT NUTRITION BY THE AMOUNT USED!**
 2. Show your calculation in the inventory_items_used list (e.g., "2 × 91 cal per item")
 3. Always include units (items, grams, containers, eggs)
 4. Double-check that your total nutrition makes sense for the quantity used
@@ -304,44 +430,255 @@ URGENCY LEVELS:
 6. AT LEAST ONE recipe must have additional items beyond seasonings
 """
 
-        # Call Gemini API
-        gemini_response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[{"role": "user", "parts": [{"text": prompt}]}],
-        )
 
-        print("Gemini recipe response:")
-        print(gemini_response.text)
+def build_recipe_prompt(items: list, preferences: dict, exclude_names: list = ()) -> tuple:
+    """
+    Builds the per-request part of the recipe prompt for an inventory, listing
+    the earliest-expiring items first; it is sent after RECIPE_PROMPT_PREFIX.
+    `exclude_names` are recipes already chosen (e.g. from the local index) that
+    the model shouldn't repeat.
+    Returns (prompt, stats) where stats describes the inventory table and prompt size.
+    """
+    dietary_restrictions = preferences["dietary_restrictions"]
+    cuisine_preference = preferences["cuisine_preference"]
+    num_recipes = preferences["num_recipes"]
+    target_calories_per_meal = preferences["target_calories_per_meal"]
 
-        # Parse the response
-        response_text = gemini_response.text.strip()
+    # Compact, budgeted inventory table (merged batches, most urgent first)
+    inventory_text, stats = build_inventory_table(items)
+    available_types = stats["types"]
 
-        # Remove markdown code fences if present
-        if response_text.startswith("```json"):
-            response_text = (
-                response_text.removeprefix("```json").removesuffix("```").strip()
-            )
-        elif response_text.startswith("```"):
-            response_text = (
-                response_text.removeprefix("```").removesuffix("```").strip()
-            )
+    # Only what changes per request; the rules are in the (cached) prefix
+    prompt = f"""{inventory_text}
 
-        # Parse JSON
-        recipes = json.loads(response_text)
+Available food types in inventory: {", ".join(available_types)}
 
-        return jsonify({"recipes": recipes})
+TARGET CALORIES PER MEAL: ~{target_calories_per_meal} calories (user's remaining daily budget divided by meals left)
 
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
-        return jsonify(
-            {
+Generate {num_recipes} diverse and nutritionally balanced recipe recommendations following the STRICT RULES above.
+{f"⚠️ DIETARY RESTRICTIONS: {dietary_restrictions} - STRICTLY follow these restrictions!" if dietary_restrictions else ""}
+{f"🌎 CUISINE PREFERENCE: {cuisine_preference} - Try to match this style" if cuisine_preference else ""}
+{f"🚫 ALREADY SUGGESTED - do not repeat these: {', '.join(exclude_names)}" if exclude_names else ""}
+"""
+    stats["prompt_tokens"] = estimate_tokens(RECIPE_PROMPT_PREFIX) + estimate_tokens(prompt)
+    stats["request_tokens"] = estimate_tokens(prompt)
+    print(
+        f"Recipe prompt: ~{stats['prompt_tokens']} tokens (~{stats['request_tokens']} beyond the shared prefix); "
+        f"{stats['batches']} batch(es) -> "
+        f"{stats['rows']} row(s), {stats['listed']} listed, {stats['named_only']} named only, {stats['dropped']} dropped"
+    )
+    return prompt, stats
+
+
+def generate_recipes_for(request_data: dict) -> tuple:
+    """
+    Generate recipe recommendations based on inventory, prioritizing expiring items.
+
+    Runs outside of a request so it can also be used by background jobs.
+    Returns a (JSON-serializable payload, HTTP status) tuple.
+    """
+    try:
+        # Read inventory from bin
+        inventory_data = data.read_data_from_bin(
+            TEST_BIN_ID
+        )  # Change to BIN_ID for actual use
+
+        if not inventory_data or "inventory" not in inventory_data:
+            return {"error": "No inventory found"}, 400
+
+        items = inventory_data["inventory"]
+
+        if not items:
+            return {"error": "Inventory is empty"}, 400
+
+        # Get user preferences if provided
+        preferences = recipe_preferences(request_data)
+
+        # Same inventory + same preferences (+ same day) = same answer, so skip the model call
+        cache_key = recipe_cache_key(items, preferences)
+        cached_recipes = recipe_cache.get(TEST_BIN_ID, cache_key)
+        if cached_recipes is not None:
+            print("Serving recipes from cache.")
+            return {"recipes": cached_recipes, "cached": True}, 200
+
+        # Fast path: recipes from the local corpus that the fridge fully covers
+        local_recipes = suggest_local_recipes(items, preferences)
+        missing = preferences["num_recipes"] - len(local_recipes)
+        if missing <= 0:
+            print(f"Serving {len(local_recipes)} local recipe(s), no model call needed.")
+            recipe_cache.set(TEST_BIN_ID, cache_key, local_recipes)
+            return {"recipes": local_recipes, "source": "local"}, 200
+
+        prompt, prompt_stats = build_recipe_prompt(
+            items,
+            dict(preferences, num_recipes=missing),
+            exclude_names=[recipe["name"] for recipe in local_recipes],
+        )
+
+        # Call Gemini API
+        try:
+            gemini_response = generate_model_content(
+                "recipes", [{"text": prompt}], RECIPES_CONFIG, num_recipes=missing, prefix=RECIPE_PROMPT_PREFIX
+            )
+        except ModelUnavailableError as e:
+            if not local_recipes:
+                raise
+            print(f"Model unavailable ({e}); serving {len(local_recipes)} local recipe(s) only.")
+            return {"recipes": local_recipes, "source": "local", "warning": str(e)}, 200
+
+        print("Gemini recipe response:")
+        print(gemini_response.text)
+
+        # Parse and validate the response (tolerates fences and truncated arrays)
+        with PARSE_LATENCY.time(kind="recipes"):
+            recipes, problems = validate_recipes(extract_json(gemini_response.text, list))
+        if problems:
+            print(f"Warning: Dropped {len(problems)} unusable recipe(s): {'; '.join(problems)}")
+        if not recipes:
+            if local_recipes:
+                return {"recipes": local_recipes, "source": "local", "warning": "Failed to parse recipe data"}, 200
+            return {
                 "error": "Failed to parse recipe data",
                 "raw_response": gemini_response.text,
-            }
-        ), 500
+            }, 500
+
+        recipes = local_recipes + recipes
+        recipe_cache.set(TEST_BIN_ID, cache_key, recipes)
+
+        return {"recipes": recipes, "prompt_stats": prompt_stats}, 200
+    except ModelUnavailableError as e:
+        print(f"Model unavailable for recipes: {e}")
+        return {"error": str(e), "retry_after": e.retry_after}, 503
     except Exception as e:
         print(f"Error generating recipes: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+
+def suggest_local_recipes(items: list, preferences: dict) -> list:
+    """Corpus recipes the inventory fully covers, best first (empty if the local index is off)."""
+    if recipe_index is None:
+        return []
+    started = time.perf_counter()
+    try:
+        recipes = recipe_index.suggest(items, preferences, limit=preferences["num_recipes"])
+    except Exception as e:
+        # The model can still answer; a bad corpus entry shouldn't fail the request.
+        print(f"   ⚠️ Local recipe index failed ({e}); asking the model instead.")
+        return []
+    print(f"Local recipe index: {len(recipes)} match(es) in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return recipes
+
+
+@app.route("/api/generate-recipes", methods=["POST"])
+def generate_recipes():
+    """Generate recipe recommendations based on inventory, prioritizing expiring items"""
+    payload, status = generate_recipes_for(request.get_json(silent=True) or {})
+    response = jsonify(payload)
+    if status == 503:
+        response.headers["Retry-After"] = str(int(payload.get("retry_after", 5)))
+    return response, status
+
+
+@app.route("/api/generate-recipes/stream", methods=["POST"])
+def generate_recipes_stream():
+    """
+    Same as /api/generate-recipes, but streams the recipes as NDJSON, one line
+    per recipe as soon as the model has finished writing it:
+        {"type": "recipe", "index": 0, "recipe": {...}}
+        ...
+        {"type": "done", "count": 3, "cached": false}
+    A failure after streaming has started is sent as {"type": "error", ...}.
+    """
+    inventory_data = data.read_data_from_bin(TEST_BIN_ID)  # Change to BIN_ID for actual use
+    if not inventory_data or "inventory" not in inventory_data:
+        return jsonify({"error": "No inventory found"}), 400
+    items = inventory_data["inventory"]
+    if not items:
+        return jsonify({"error": "Inventory is empty"}), 400
+
+    preferences = recipe_preferences(request.get_json(silent=True) or {})
+    cache_key = recipe_cache_key(items, preferences)
+
+    def line(message: dict) -> str:
+        return json.dumps(message) + "\n"
+
+    def stream():
+        cached_recipes = recipe_cache.get(TEST_BIN_ID, cache_key)
+        if cached_recipes is not None:
+            print("Serving recipes from cache.")
+            for index, recipe in enumerate(cached_recipes):
+                yield line({"type": "recipe", "index": index, "recipe": recipe})
+            yield line({"type": "done", "count": len(cached_recipes), "cached": True})
+            return
+
+        # Local matches go out first; the model only writes the rest.
+        recipes = suggest_local_recipes(items, preferences)
+        for index, recipe in enumerate(recipes):
+            yield line({"type": "recipe", "index": index, "recipe": recipe})
+        missing = preferences["num_recipes"] - len(recipes)
+        if missing <= 0:
+            recipe_cache.set(TEST_BIN_ID, cache_key, recipes)
+            yield line({"type": "done", "count": len(recipes), "cached": False, "source": "local"})
+            return
+
+        parser = JSONArrayStreamParser()
+        local_count = len(recipes)
+        response_bytes = 0
+        parse_seconds = 0.0
+        try:
+            prompt, prompt_stats = build_recipe_prompt(
+                items,
+                dict(preferences, num_recipes=missing),
+                exclude_names=[recipe["name"] for recipe in recipes],
+            )
+            prompt_bytes = _payload_bytes([{"text": prompt}], RECIPE_PROMPT_PREFIX)
+            MODEL_REQUEST_BYTES.observe(prompt_bytes, endpoint="recipes_stream")
+            started = time.perf_counter()
+            chunks = model_router.stream(
+                "recipes_stream",
+                lambda model: prompt_cache.generate_content_stream(
+                    client, model, RECIPE_PROMPT_PREFIX, [{"text": prompt}], RECIPES_CONFIG
+                ),
+                payload_bytes=prompt_bytes,
+                num_recipes=missing,
+            )
+            for chunk in chunks:
+                text = chunk.text or ""
+                response_bytes += len(text.encode("utf-8"))
+                parse_started = time.perf_counter()
+                parsed = parser.feed(text)
+                parse_seconds += time.perf_counter() - parse_started
+                for recipe in parsed:
+                    recipe = validate_recipe(recipe)
+                    if recipe is None:
+                        continue
+                    if len(recipes) == local_count:
+                        print(f"First streamed recipe after {time.perf_counter() - started:.2f}s")
+                    yield line({"type": "recipe", "index": len(recipes), "recipe": recipe})
+                    recipes.append(recipe)
+        except Exception as e:
+            print(f"Error streaming recipes: {e}")
+            MODEL_ERRORS.inc(endpoint="recipes_stream")
+            yield line({"type": "error", "error": str(e)})
+            return
+
+        MODEL_LATENCY.observe(time.perf_counter() - started, endpoint="recipes_stream")
+        MODEL_RESPONSE_BYTES.observe(response_bytes, endpoint="recipes_stream")
+        PARSE_LATENCY.observe(parse_seconds, kind="recipes_stream")
+        print(f"Streamed {len(recipes) - local_count} recipe(s) in {time.perf_counter() - started:.2f}s")
+        if parser.done:
+            # Only a complete array is worth reusing.
+            recipe_cache.set(TEST_BIN_ID, cache_key, recipes)
+        elif not recipes:
+            yield line({"type": "error", "error": "Failed to parse recipe data"})
+            return
+        yield line({"type": "done", "count": len(recipes), "cached": False, "prompt_stats": prompt_stats})
+
+    return Response(
+        stream(),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/calorie-tracker", methods=["GET", "POST"])
@@ -365,9 +702,9 @@ def calorie_tracker():
         )
 
 
-@app.route("/analyze", methods=["POST"])
-def analyze():
-    prompt = f"""Analyze this food image and return the data as a Python dictionary. Follow these guidelines carefully:
+# Food recognition instructions, identical for every photo: cached model-side
+# like RECIPE_PROMPT_PREFIX, with the date and the image sent after them.
+ANALYZE_PROMPT_PREFIX = """Analyze this food image and return the data as a Python dictionary. Follow these guidelines carefully:
 
     CRITICAL FORMATTING RULES:
     - Return ONLY valid JSON format within a Python dictionary structure
@@ -396,7 +733,7 @@ def analyze():
     - NEVER use volume measurements (no ml, liters, cups, etc.)
 
     4. EXPIRY DATE: 
-    - **TODAY'S DATE IS: {today_date} - USE THIS AS PURCHASE DATE**
+    - **TODAY'S DATE IS GIVEN AT THE END OF THIS PROMPT - USE IT AS THE PURCHASE DATE**
     - Calculate expiry dates based on TODAY being the purchase date
     - Assume refrigerator storage for perishable items
     - Use DD/MM/YYYY format
@@ -424,20 +761,20 @@ def analyze():
     - 3 bananas → quantity: 3, unit: "items"
 
     EXAMPLE OUTPUT FORMAT:
-    {{
+    {
         "inventory": [
-            {{
+            {
                 "name": "orange",
                 "type": "fruit", 
                 "quantity": 6,
                 "unit": "items",
-                "expected_expiry_date": "{today_date}",
+                "expected_expiry_date": "02/12/2024",
                 "calories": 372,
                 "carbs": 93,
                 "fats": 0,
                 "protein": 0
-            }},
-            {{
+            },
+            {
                 "name": "coca cola", 
                 "type": "beverage",
                 "quantity": 4,
@@ -447,8 +784,8 @@ def analyze():
                 "carbs": 140,
                 "fats": 0,
                 "protein": 0
-            }},
-            {{
+            },
+            {
                 "name": "chicken breast",
                 "type": "protein",
                 "quantity": 500,
@@ -458,8 +795,8 @@ def analyze():
                 "carbs": 0,
                 "fats": 18,
                 "protein": 100
-            }},
-            {{
+            },
+            {
                 "name": "eggs",
                 "type": "protein", 
                 "quantity": 12,
@@ -469,64 +806,457 @@ def analyze():
                 "carbs": 0,
                 "fats": 60,
                 "protein": 72
-            }}
+            }
         ]
-    }}
+    }
 
     IMPORTANT: 
-    - Today's purchase date is {today_date} - calculate all expiry dates from this date
+    - Today's date (given below) is the purchase date - calculate all expiry dates from this date
     - Be realistic with expiry dates based on common food shelf life
     - Ensure dates are chronologically logical (expiry dates must be AFTER today)
     - Use the exact unit values: "items", "grams", "containers", or "eggs" """
-    image_url = request.form.get("image_url")
-    image_file = request.files.get("image_file")
 
-    print(f"DEBUG - Received image_url: {image_url}")
-    print(f"DEBUG - Received image_file: {image_file}")
 
-    parts = [{"text": prompt}]
+# Image hashes being recognized and stored right now, with the owner that
+# claimed each and an event set once it is done. A concurrent upload of the same
+# photo waits for that and reuses its (stored) answer instead of storing twice.
+_analyses_in_flight: dict = {}
+_analyses_lock = threading.Lock()
+# How long a duplicate upload waits for the first one before going ahead anyway.
+ANALYZE_CLAIM_TIMEOUT = 120
 
+
+def _claim_analysis(image_key: tuple, owner: object) -> bool:
+    """
+    Claims an image hash for `owner`. If another owner holds it, waits until
+    it is released; returns False without claiming if that left an answer in
+    the image cache (or the wait timed out), True once the claim is ours.
+    The same owner (e.g. one batch) never waits for itself.
+    """
+    deadline = time.monotonic() + ANALYZE_CLAIM_TIMEOUT
+    while True:
+        with _analyses_lock:
+            holder = _analyses_in_flight.get(image_key)
+            if holder is None:
+                _analyses_in_flight[image_key] = (owner, threading.Event())
+                return True
+        if holder[0] is owner:
+            return False
+        if not holder[1].wait(max(0.0, deadline - time.monotonic())):
+            print(f"DEBUG - Gave up waiting for the same image (sha256 {image_key[0][:12]}...) in flight")
+            return False
+        if image_cache.get(image_key) is not None:
+            return False
+
+
+def _release_analysis(result: dict) -> None:
+    """Releases the result's image hash claim, if it holds one (safe to call more than once)."""
+    if not result.pop("claimed", False):
+        return
+    with _analyses_lock:
+        holder = _analyses_in_flight.pop(result["image_key"], None)
+    if holder is not None:
+        holder[1].set()
+
+
+def recognize_image(
+    image_url: str = None, image_bytes: bytes = None, mime_type: str = None, owner: object = None
+) -> tuple:
+    """
+    Recognizes the food in one image (fetched from `image_url`, or the given
+    bytes) without storing anything. Safe to call from worker threads.
+
+    Returns ({"entry", "image_key", "cached"}, 200) or (error payload, status).
+    `entry` is the image cache record {"response", "parsed", "stored"}; the
+    caller updates "stored" once the items have been written. A fresh result
+    also holds the image hash claim ("claimed"), which the caller releases via
+    _remember_analysis() or _release_analysis() once it has stored the items.
+    Calls sharing an `owner` don't wait for each other's claims.
+    """
+    # The instructions are the cached prefix; only the date and the photo vary.
+    prompt = f"TODAY'S DATE IS: {today_date} - use it as the purchase date of every item."
     if image_url:
         print(f"DEBUG - Attempting to fetch URL: {image_url}")
         try:
-            response = requests.get(image_url, timeout=10)
-            response.raise_for_status()
-            print(
-                f"DEBUG - Successfully fetched image, size: {len(response.content)} bytes"
-            )
-            parts.append(
-                {"inline_data": {"mime_type": "image/jpeg", "data": response.content}}
-            )
+            image_bytes = image_prep.fetch_image(image_url)
+            mime_type = None  # sniffed from the bytes below
+            print(f"DEBUG - Successfully fetched image, size: {len(image_bytes)} bytes")
+        except image_prep.ImageTooLargeError as e:
+            print(f"DEBUG - Image too large: {image_url}")
+            return {"error": str(e)}, 413
         except Exception as e:
             print(f"DEBUG - Failed to fetch image: {str(e)}")
-            return jsonify({"error": f"Failed to fetch image: {str(e)}"}), 400
+            return {"error": f"Failed to fetch image: {str(e)}"}, 400
+    elif image_bytes is None:
+        print("DEBUG - No image provided")
+        return {"error": "No image provided"}, 400
 
-    elif image_file:
-        print(f"DEBUG - Processing uploaded file: {image_file.filename}")
-        parts.append(
-            {
-                "inline_data": {
-                    "mime_type": image_file.mimetype,
-                    "data": image_file.read(),
-                }
-            }
+    # Same bytes (and same purchase date in the prompt) = same answer.
+    # Hashing the original bytes lets repeats skip preprocessing too.
+    image_key = (hashlib.sha256(image_bytes).hexdigest(), today_date)
+    cached = image_cache.get(image_key)
+
+    if cached is None:
+        # Identical uploads in flight: only the first recognizes and stores.
+        claimed = _claim_analysis(image_key, owner if owner is not None else object())
+        cached = image_cache.get(image_key)
+        if claimed and cached is not None:
+            _release_analysis({"claimed": True, "image_key": image_key})
+
+    if cached is not None:
+        print(f"DEBUG - Image already analyzed (sha256 {image_key[0][:12]}...), skipping model call")
+        return {"entry": cached, "image_key": image_key, "cached": True}, 200
+
+    result = {"image_key": image_key, "cached": False, "claimed": claimed}
+    try:
+        image_bytes, mime_type, info = image_prep.preprocess_image(image_bytes, mime_type)
+        print(
+            f"DEBUG - Prepared {mime_type} image: {info['original_bytes']} -> {info['bytes']} bytes"
+            + (" (resized)" if info["resized"] else "")
         )
-    else:
-        print("DEBUG - No image provided")
-        return jsonify({"error": "No image provided"}), 400
+        parts = [
+            {"text": prompt},
+            {"inline_data": {"mime_type": mime_type, "data": image_bytes}},
+        ]
 
-    gemini_response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[{"role": "user", "parts": parts}],
-    )
-    print(gemini_response.text)
+        gemini_response = generate_model_content("analyze", parts, INVENTORY_CONFIG, prefix=ANALYZE_PROMPT_PREFIX)
+        print(gemini_response.text)
 
-    # change TEST_BIN_ID to BIN_ID for actual use
-    data.store_data_to_bin(
-        data.parse_gemini_inventory_output(gemini_response.text), TEST_BIN_ID
-    )
+        parsed = data.parse_gemini_inventory_output(gemini_response.text)
+    except BaseException:
+        _release_analysis(result)
+        raise
+    result["entry"] = {"response": gemini_response.text, "parsed": parsed, "stored": False}
+    return result, 200
+
+
+def _remember_analysis(result: dict, stored: bool) -> None:
+    """Records that an analyzed image's items were stored, caching fresh usable answers."""
+    entry = result["entry"]
+    entry["stored"] = entry["stored"] or stored
+    # Only remember usable answers, so a retry after a parse failure asks the model again
+    if not result["cached"] and entry["parsed"] is not None:
+        image_cache.set(result["image_key"], entry)
+    # Cached first, so a duplicate upload waiting on the claim finds the answer.
+    _release_analysis(result)
+
+
+def analyze_image(
+    image_url: str = None,
+    image_bytes: bytes = None,
+    mime_type: str = None,
+    store_duplicates: bool = False,
+) -> tuple:
+    """
+    Recognizes the food in one image and adds it to the inventory. Runs
+    outside of a request so it can also be used by background jobs.
+
+    Returns a (JSON-serializable payload, HTTP status) tuple.
+    """
+    result, status = recognize_image(image_url, image_bytes, mime_type)
+    if status != 200:
+        return result, status
+
+    entry = result["entry"]
+    stored = entry["stored"]
+    try:
+        if not result["cached"] or store_duplicates or not stored:
+            # change TEST_BIN_ID to BIN_ID for actual use
+            stored = data.add_items_to_bin(entry["parsed"], TEST_BIN_ID)
+            # A pending write is still queued and will most likely land, so a
+            # repeat upload must not add the items again either.
+            _remember_analysis(result, stored is not False)
+    finally:
+        _release_analysis(result)
+
+    payload = {"response": entry["response"], "stored": bool(stored)}
+    if stored is None:
+        payload["pending"] = True
+    if result["cached"]:
+        payload["cached"] = True
+    return payload, 200
+
+
+def analyze_images(images: list, store_duplicates: bool = False) -> tuple:
+    """
+    Analyzes several images at once: up to ANALYZE_CONCURRENCY model calls run
+    in parallel, then every recognized item is added to the bin in a single
+    write. `images` holds recognize_image() keyword arguments plus a "source"
+    label used in the per-image report. A photo that appears more than once
+    (or was already stored) is only added once unless `store_duplicates` is set.
+
+    Returns a (JSON-serializable payload, HTTP status) tuple.
+    """
+    if not images:
+        return {"error": "No images provided"}, 400
+    if len(images) > ANALYZE_BATCH_MAX_IMAGES:
+        return {"error": f"At most {ANALYZE_BATCH_MAX_IMAGES} images per batch"}, 400
+
+    # Recognize each distinct photo once: uploads by content hash, URLs by address.
+    image_keys = [
+        ("sha256", hashlib.sha256(image["image_bytes"]).hexdigest()) if image.get("image_bytes") is not None
+        else ("url", image.get("image_url"))
+        for image in images
+    ]
+    first_index = {}
+    for index, key in enumerate(image_keys):
+        first_index.setdefault(key, index)
+
+    # Different URLs with the same bytes don't wait on each other (see _claim_analysis).
+    owner = object()
+
+    def recognize(image):
+        args = {key: value for key, value in image.items() if key != "source"}
+        return recognize_image(**args, owner=owner)
+
+    with ThreadPoolExecutor(max_workers=min(ANALYZE_CONCURRENCY, len(first_index))) as pool:
+        futures = {key: pool.submit(recognize, images[index]) for key, index in first_index.items()}
+
+    report = []
+    to_store = []
+    repeats = []  # same photo as an earlier image of this batch
+    copies = []  # (outcome, first copy's outcome, key) for photos repeated in the batch
+    items_by_key = {}
+    batch_keys = set()
+    new_items = []
+    for index, (image, key) in enumerate(zip(images, image_keys)):
+        outcome = {"source": image["source"], "ok": False}
+        report.append(outcome)
+        if first_index[key] != index:
+            copies.append((outcome, report[first_index[key]], key))
+            continue
+        try:
+            result, status = futures[key].result()
+        except Exception as e:
+            print(f"Error analyzing {image['source']}: {e}")
+            outcome["error"] = str(e)
+            continue
+        if status != 200:
+            outcome["error"] = result.get("error", "Analysis failed")
+            continue
+
+        entry = result["entry"]
+        outcome["response"] = entry["response"]
+        outcome["cached"] = result["cached"]
+        if not entry["parsed"] or not entry["parsed"].get("inventory"):
+            outcome["error"] = "No inventory items recognized"
+            _remember_analysis(result, False)
+            continue
+
+        outcome["ok"] = True
+        outcome["items"] = len(entry["parsed"]["inventory"])
+        if result["cached"] and entry["stored"] and not store_duplicates:
+            outcome["stored"] = True
+            outcome["duplicate"] = True
+            continue
+        if result["image_key"] in batch_keys and not store_duplicates:
+            outcome["duplicate"] = True
+            repeats.append((outcome, result))
+            continue
+        batch_keys.add(result["image_key"])
+        items_by_key[key] = entry["parsed"]["inventory"]
+        new_items.extend(entry["parsed"]["inventory"])
+        to_store.append((outcome, result))
+
+    if store_duplicates:
+        # Each extra copy of a photo adds its items again.
+        for _, _, key in copies:
+            if key in items_by_key:
+                new_items.extend(copy.deepcopy(items_by_key[key]))
+
+    # One read-merge-write for the whole batch
+    try:
+        stored = bool(new_items) and data.append_items_to_bin(TEST_BIN_ID, new_items)  # change TEST_BIN_ID to BIN_ID for actual use
+        for outcome, result in to_store:
+            outcome["stored"] = stored
+            _remember_analysis(result, stored)
+        for outcome, _ in repeats:
+            outcome["stored"] = stored
+        for outcome, original, _ in copies:
+            outcome.update({field: value for field, value in original.items() if field != "source"})
+            if outcome["ok"] and not store_duplicates:
+                outcome["duplicate"] = True
+    finally:
+        for _, result in to_store + repeats:
+            _release_analysis(result)
+
+    succeeded = sum(1 for outcome in report if outcome["ok"])
+    print(f"Batch analyzed {succeeded}/{len(images)} image(s), stored {len(new_items) if stored else 0} item(s).")
+    return {
+        "results": report,
+        "succeeded": succeeded,
+        "failed": len(images) - succeeded,
+        "items_added": len(new_items) if stored else 0,
+        "stored": stored,
+    }, 200
+
+
+def _analyze_args_from_request() -> dict:
+    """Reads /analyze form fields; uploaded bytes are read now, before the request ends."""
+    image_url = request.form.get("image_url")
+    image_file = request.files.get("image_file")
+
+    print(f"DEBUG - Received image_url: {image_url}")
+    print(f"DEBUG - Received image_file: {image_file}")
+
+    args = {
+        "image_url": image_url,
+        # Set store_duplicates=true to add the items again when the same photo was already analyzed.
+        "store_duplicates": request.form.get("store_duplicates", "").lower() in ("1", "true", "yes"),
+    }
+    if not image_url and image_file:
+        print(f"DEBUG - Processing uploaded file: {image_file.filename}")
+        args["image_bytes"] = image_prep.read_capped(image_file.stream)
+        args["mime_type"] = image_file.mimetype
+    return args
+
+
+class InvalidRequestError(ValueError):
+    """A request body the endpoint can't use (wrong JSON shape); answered with a 400."""
+
+
+@app.errorhandler(InvalidRequestError)
+def invalid_request(e):
+    return jsonify({"error": str(e)}), 400
 
-    return jsonify({"response": gemini_response.text})
+
+@app.errorhandler(image_prep.ImageTooLargeError)
+def image_too_large(e):
+    return jsonify({"error": str(e)}), 413
+
+
+@app.errorhandler(ModelUnavailableError)
+def model_unavailable(e):
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(int(e.retry_after))
+    return response, 503
+
+
+@app.route("/analyze", methods=["POST"])
+def analyze():
+    payload, status = analyze_image(**_analyze_args_from_request())
+    return jsonify(payload), status
+
+
+def _batch_args_from_request() -> dict:
+    """
+    Reads /analyze/batch input: repeated `image_url` / `image_file` form fields,
+    or a JSON body {"image_urls": [...], "store_duplicates": false}.
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        raise InvalidRequestError('Expected a JSON object like {"image_urls": [...]}')
+    image_urls = body.get("image_urls", [])
+    if not isinstance(image_urls, list):
+        raise InvalidRequestError("image_urls must be a list of URLs")
+    images = [
+        {"source": url, "image_url": url}
+        for url in image_urls + request.form.getlist("image_url")
+        if url
+    ]
+    for image_file in request.files.getlist("image_file"):
+        images.append({
+            "source": image_file.filename,
+            "image_bytes": image_prep.read_capped(image_file.stream),
+            "mime_type": image_file.mimetype,
+        })
+
+    store_duplicates = body.get("store_duplicates", request.form.get("store_duplicates", ""))
+    if isinstance(store_duplicates, str):
+        store_duplicates = store_duplicates.lower() in ("1", "true", "yes")
+    return {"images": images, "store_duplicates": bool(store_duplicates)}
+
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """Analyze many photos (e.g. a whole fridge) in one request and one inventory write."""
+    payload, status = analyze_images(**_batch_args_from_request())
+    return jsonify(payload), status
+
+
+# --- Background Jobs ---
+# Same work as /analyze and /api/generate-recipes, but the request returns a job
+# id immediately. Poll /api/jobs/<id> or listen on /api/jobs/<id>/events (SSE).
+
+def _submit_job(kind: str, fn, *args, **kwargs):
+    try:
+        job = job_manager.submit(kind, fn, *args, **kwargs)
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "5"
+        return response, 429
+
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("get_job", job_id=job.id),
+        "events_url": url_for("job_events", job_id=job.id),
+    }), 202
+
+
+@app.route("/api/jobs/analyze", methods=["POST"])
+def submit_analyze_job():
+    return _submit_job("analyze", analyze_image, **_analyze_args_from_request())
+
+
+@app.route("/api/jobs/analyze-batch", methods=["POST"])
+def submit_analyze_batch_job():
+    return _submit_job("analyze-batch", analyze_images, **_batch_args_from_request())
+
+
+@app.route("/api/jobs/generate-recipes", methods=["POST"])
+def submit_recipes_job():
+    return _submit_job("generate-recipes", generate_recipes_for, request.get_json(silent=True) or {})
+
+
+@app.route("/api/jobs")
+def job_stats():
+    return jsonify(job_manager.stats())
+
+
+@app.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if not job_manager.cancel(job_id):
+        return jsonify({"error": f"Job is already {job.status}", "status": job.status}), 409
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events: one event per status change, ending with the result."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    def stream():
+        last_status = None
+        while True:
+            status = job.wait_for_change(last_status, timeout=15)
+            if status == last_status:
+                # Comment line keeps proxies from closing an idle stream.
+                yield ": keep-alive\n\n"
+                continue
+            last_status = status
+            yield f"event: {status}\ndata: {json.dumps(job.to_dict())}\n\n"
+            if status in FINISHED_STATES:
+                return
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+"""
+Benchmarks the inventory and recipe hot paths against local stand-ins (a fake
+JSONBin server and a stub Gemini client, see standins.py), for synthetic
+inventories of increasing size.
+
+Usage (from the Website directory):
+    python benchmarks/bench_app.py [--sizes 10,100,1000,10000] [--iterations 30]
+        [--max-seconds 5] [--model-latency 0] [--jsonbin-latency 0]
+        [--only consume,routes] [--json] [--output results.json]
+
+Benchmarks:
+    store         data.store_data_to_bin (creates a bin)
+    consume       data.consume_data_from_bin (read + conditional write)
+    parse         data.parse_gemini_inventory_output on fenced model output
+    prompt        app.build_recipe_prompt (the prompt half of /api/generate-recipes)
+    routes        GET /api/fridge/<id>, POST /api/consume/<id>,
+                  POST /api/generate-recipes and POST /analyze via the Flask test client
+
+--json prints (and --output writes) the results as JSON so runs can be compared
+across versions: ops/sec and p50/p95/p99 per benchmark and size.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins  # noqa: E402  (sets up the environment the app reads on import)
+
+BENCHMARKS = ("store", "consume", "parse", "prompt", "routes")
+
+
+def run(fn, iterations, max_seconds, setup=None):
+    """Calls fn() up to `iterations` times (at least 3, at most ~max_seconds) and summarizes the timings."""
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    while len(timings) < iterations and (len(timings) < 3 or time.perf_counter() < deadline):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return standins.summarize_timings(timings)
+
+
+def bench_size(app, size, args):
+    data = app.data
+    record = standins.synthetic_inventory(size, seed=size)
+    results = {}
+
+    def fresh_bin():
+        return data.store_data_to_bin(json.loads(json.dumps(record)))
+
+    def measure(name, fn, setup=None):
+        if name.split("/")[0] not in args.only:
+            return
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = run(fn, args.iterations, args.max_seconds, setup)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bin_id = fresh_bin()
+    app.TEST_BIN_ID = bin_id
+    items = record["inventory"]
+    names = sorted({item["name"] for item in items})
+
+    measure("store", fresh_bin)
+
+    # Small amounts so the inventory stays about the same size across iterations.
+    consume_map = {names[0]: 1, names[-1]: 1}
+    measure("consume", lambda: data.consume_data_from_bin(bin_id, consume_map))
+
+    output = standins.synthetic_inventory_output(size, seed=size)
+    measure("parse", lambda: data.parse_gemini_inventory_output(output))
+
+    preferences = app.recipe_preferences({"num_recipes": 3})
+    measure("prompt", lambda: app.build_recipe_prompt(items, preferences))
+
+    client = app.app.test_client()
+    measure("routes/get_fridge", lambda: client.get(f"/api/fridge/{bin_id}"))
+    measure(
+        "routes/consume",
+        lambda: client.post(f"/api/consume/{bin_id}", json={"consumed": consume_map}),
+    )
+    # A new request each time: drop cached recipes, keep the model call and prompt work.
+    measure(
+        "routes/generate_recipes",
+        lambda: client.post("/api/generate-recipes", json={"num_recipes": 3}),
+        setup=lambda: app.recipe_cache.invalidate_bin(bin_id),
+    )
+    measure(
+        "routes/analyze",
+        lambda: client.post(
+            "/analyze",
+            data={"image_file": (io.BytesIO(standins.synthetic_image()), "photo.jpg", "image/jpeg")},
+            content_type="multipart/form-data",
+        ),
+    )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma-separated inventory sizes (batches)")
+    parser.add_argument("--iterations", type=int, default=30, help="max runs per benchmark and size")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="time budget per benchmark and size")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="stub Gemini latency in ms")
+    parser.add_argument("--jsonbin-latency", type=float, default=0.0, help="fake JSONBin latency in ms")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    args.only = {name.strip() for name in args.only.split(",") if name.strip()}
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    fake = standins.FakeJSONBin(latency=args.jsonbin_latency / 1000).start()
+    client = standins.StubGenaiClient(latency=args.model_latency / 1000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = standins.use_standins(fake, client)
+
+    results = []
+    if not args.json:
+        print(f"{'benchmark':<26}{'size':>7}{'runs':>6}{'ops/sec':>12}{'p50 ms':>11}{'p99 ms':>11}")
+    try:
+        for size in sizes:
+            for name, summary in bench_size(app, size, args).items():
+                results.append({"benchmark": name, "size": size, **summary})
+                if not args.json:
+                    print(
+                        f"{name:<26}{size:>7}{summary['count']:>6}{summary['ops_per_sec']:>12}"
+                        f"{summary['p50_ms']:>11}{summary['p99_ms']:>11}",
+                        flush=True,
+                    )
+    finally:
+        fake.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model_latency_ms": args.model_latency,
+            "jsonbin_latency_ms": args.jsonbin_latency,
+            "storage": "jsonbin (fake)",
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
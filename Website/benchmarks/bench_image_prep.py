@@ -0,0 +1,106 @@
+"""
+Benchmarks image_prep.preprocess_image: time spent and bytes saved per image.
+
+Usage (from the Website directory):
+    python benchmarks/bench_image_prep.py [photo.jpg ...] [--max-edge 1536] [--quality 85] [--repeat 5] [--json]
+
+Without file arguments it generates a few synthetic phone-sized photos.
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import image_prep  # noqa: E402
+
+
+def synthetic_photos():
+    """Noisy gradients at common phone camera sizes, so JPEG can't compress them trivially."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    photos = []
+    for name, (width, height), quality in (
+        ("12mp-photo.jpg", (4032, 3024), 95),
+        ("8mp-photo.jpg", (3264, 2448), 92),
+        ("screenshot.png", (1170, 2532), None),
+    ):
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+        pixels += rng.normal(0, 12, pixels.shape)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+        output = io.BytesIO()
+        if quality is None:
+            image.save(output, format="PNG")
+        else:
+            image.save(output, format="JPEG", quality=quality)
+        photos.append((name, output.getvalue()))
+    return photos
+
+
+def bench(name, data, max_edge, quality, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output, mime_type, info = image_prep.preprocess_image(data, None, max_edge=max_edge, quality=quality)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "image": name,
+        "mime_type": mime_type,
+        "original_bytes": len(data),
+        "bytes": len(output),
+        "saved_pct": round(100 * (1 - len(output) / len(data)), 1),
+        "resized": info["resized"],
+        "median_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--max-edge", type=int, default=image_prep.IMAGE_MAX_EDGE)
+    parser.add_argument("--quality", type=int, default=image_prep.IMAGE_QUALITY)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if image_prep.Image is None:
+        sys.exit("Pillow is not installed; preprocessing is a no-op.")
+
+    if args.files:
+        photos = []
+        for path in args.files:
+            with open(path, "rb") as f:
+                photos.append((os.path.basename(path), f.read()))
+    else:
+        photos = synthetic_photos()
+
+    results = [bench(name, data, args.max_edge, args.quality, args.repeat) for name, data in photos]
+
+    if args.json:
+        print(json.dumps({"max_edge": args.max_edge, "quality": args.quality, "results": results}, indent=2))
+        return
+
+    print(f"max edge {args.max_edge}px, JPEG quality {args.quality}, {args.repeat} run(s) each")
+    print(f"{'image':<24}{'before':>12}{'after':>12}{'saved':>8}{'median':>10}{'max':>10}")
+    for r in results:
+        print(
+            f"{r['image']:<24}{r['original_bytes']:>12,}{r['bytes']:>12,}"
+            f"{r['saved_pct']:>7}%{r['median_ms']:>8} ms{r['max_ms']:>7} ms"
+        )
+    total_before = sum(r["original_bytes"] for r in results)
+    total_after = sum(r["bytes"] for r in results)
+    print(f"total: {total_before:,} -> {total_after:,} bytes ({100 * (1 - total_after / total_before):.1f}% saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Closed-loop load test: `--concurrency` simulated users each send requests back
+to back for `--duration` seconds, drawn from a weighted mix of
+
+    fridge            GET  /api/fridge/<bin_id>
+    consume           POST /api/consume/<bin_id>
+    generate_recipes  POST /api/generate-recipes   (preferences vary, so some hit the cache)
+    analyze           POST /analyze                (a new photo each time)
+
+By default the app is started in this process on a threaded WSGI server, wired
+to the fake JSONBin and stub Gemini client from standins.py (with realistic
+latencies, adjustable below). Use --url/--bin-id to load an app that is
+already running instead.
+
+Usage (from the Website directory):
+    python benchmarks/loadtest.py [--concurrency 16] [--duration 30] [--warmup 3]
+        [--mix fridge=50,consume=15,generate_recipes=20,analyze=15]
+        [--model-latency 800 --model-jitter 600 --jsonbin-latency 40] [--inventory 200]
+        [--output run.json] [--baseline previous.json]
+    python benchmarks/loadtest.py --compare before.json after.json
+
+Per endpoint the report gives throughput, p50/p95/p99 latency, error rate,
+status codes and saturation: the average number of requests in flight (by
+Little's law, total latency / wall time) against the number of users.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins  # noqa: E402  (sets up the environment the app reads on import)
+import requests  # noqa: E402
+
+DEFAULT_MIX = "fridge=50,consume=15,generate_recipes=20,analyze=15"
+PREFERENCE_VARIANTS = [
+    {"num_recipes": 3},
+    {"num_recipes": 3, "cuisine_preference": "italian"},
+    {"num_recipes": 2, "dietary_restrictions": "vegetarian"},
+    {"num_recipes": 4, "target_calories_per_meal": 600},
+]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for entry in text.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"fridge", "consume", "generate_recipes", "analyze"}
+    if unknown:
+        sys.exit(f"Unknown endpoint(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def send(session: requests.Session, base_url: str, bin_id: str, endpoint: str, names: List[str], rng: random.Random):
+    if endpoint == "fridge":
+        return session.get(f"{base_url}/api/fridge/{bin_id}", timeout=60)
+    if endpoint == "consume":
+        return session.post(
+            f"{base_url}/api/consume/{bin_id}", json={"consumed": {rng.choice(names): 1}}, timeout=60
+        )
+    if endpoint == "generate_recipes":
+        return session.post(f"{base_url}/api/generate-recipes", json=rng.choice(PREFERENCE_VARIANTS), timeout=120)
+    return session.post(
+        f"{base_url}/analyze",
+        files={"image_file": ("photo.jpg", standins.synthetic_image(), "image/jpeg")},
+        timeout=120,
+    )
+
+
+class Recorder:
+    """Thread-safe per-endpoint samples: (start offset, latency, status or error name)."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, started: float, latency: float, outcome: Any) -> None:
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((started, latency, outcome))
+
+
+def run_load(base_url: str, bin_id: str, names: List[str], args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    endpoints, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    start_at = time.perf_counter()
+    measure_from = start_at + args.warmup
+    stop_at = measure_from + args.duration
+
+    def user(worker: int):
+        rng = random.Random(worker)
+        session = requests.Session()
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            endpoint = rng.choices(endpoints, weights)[0]
+            try:
+                outcome = send(session, base_url, bin_id, endpoint, names, rng).status_code
+            except requests.RequestException as e:
+                outcome = type(e).__name__
+            finished = time.perf_counter()
+            if now >= measure_from:
+                recorder.add(endpoint, now - measure_from, finished - now, outcome)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests still running at the deadline finish late; use the real window.
+    wall = max(args.duration, time.perf_counter() - measure_from)
+    return report(recorder.samples, wall, args.concurrency)
+
+
+def summarize_endpoint(samples: List[tuple], wall: float, concurrency: int) -> Dict[str, Any]:
+    latencies = [latency for _, latency, _ in samples]
+    statuses: Dict[str, int] = {}
+    errors = 0
+    for _, _, outcome in samples:
+        statuses[str(outcome)] = statuses.get(str(outcome), 0) + 1
+        if not isinstance(outcome, int) or outcome >= 400:
+            errors += 1
+    summary = standins.summarize_timings(latencies, elapsed=wall)
+    in_flight = sum(latencies) / wall if wall > 0 else 0.0
+    summary.update({
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "statuses": statuses,
+        "avg_in_flight": round(in_flight, 2),
+        "saturation": round(in_flight / concurrency, 3) if concurrency else 0.0,
+    })
+    return summary
+
+
+def report(samples: Dict[str, List[tuple]], wall: float, concurrency: int) -> Dict[str, Any]:
+    endpoints = {name: summarize_endpoint(entries, wall, concurrency) for name, entries in sorted(samples.items())}
+    everything = [entry for entries in samples.values() for entry in entries]
+    return {"wall_seconds": round(wall, 2), "endpoints": endpoints, "total": summarize_endpoint(everything, wall, concurrency)}
+
+
+# --- Output ---
+
+COLUMNS = ("count", "ops_per_sec", "p50_ms", "p95_ms", "p99_ms", "error_rate", "saturation")
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    meta = result["meta"]
+    latencies = (
+        f" (model ~{meta['model_latency_ms']} ms, jsonbin ~{meta['jsonbin_latency_ms']} ms)"
+        if "model_latency_ms" in meta else ""
+    )
+    print(f"{meta['concurrency']} users for {result['wall_seconds']}s against {meta['target']}{latencies}")
+    print(f"{'endpoint':<18}" + "".join(f"{column:>13}" for column in COLUMNS))
+    for name, summary in [*result["endpoints"].items(), ("TOTAL", result["total"])]:
+        print(f"{name:<18}" + "".join(f"{summary[column]:>13}" for column in COLUMNS))
+    for name, summary in result["endpoints"].items():
+        odd = {status: count for status, count in summary["statuses"].items() if status != "200"}
+        if odd:
+            print(f"  {name}: {odd}")
+
+
+def print_comparison(before: Dict[str, Any], after: Dict[str, Any]) -> None:
+    """Side-by-side of two runs: value before -> after and the relative change."""
+    print(f"before: {before['meta'].get('timestamp')} ({before['meta'].get('git_revision')})")
+    print(f"after:  {after['meta'].get('timestamp')} ({after['meta'].get('git_revision')})")
+    names = sorted(set(before["endpoints"]) | set(after["endpoints"])) + ["TOTAL"]
+    for name in names:
+        old = before["total"] if name == "TOTAL" else before["endpoints"].get(name)
+        new = after["total"] if name == "TOTAL" else after["endpoints"].get(name)
+        if not old or not new:
+            print(f"{name}: only in {'after' if new else 'before'}")
+            continue
+        print(name)
+        for column in ("ops_per_sec", "p50_ms", "p95_ms", "p99_ms", "error_rate"):
+            a, b = old[column], new[column]
+            change = f"{100 * (b - a) / a:+.1f}%" if a else "n/a"
+            print(f"  {column:<12}{a:>12} -> {b:<12}{change:>9}")
+
+
+def git_revision() -> Optional[str]:
+    import subprocess
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- In-Process Target ---
+
+@contextlib.contextmanager
+def local_app(args):
+    """Starts the app on 127.0.0.1 with the stand-ins and yields (base URL, bin id, food names)."""
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    fake = standins.FakeJSONBin(latency=args.jsonbin_latency / 1000).start()
+    client = standins.StubGenaiClient(
+        latency=args.model_latency / 1000, jitter=args.model_jitter / 1000, error_rate=args.model_error_rate
+    )
+    app = standins.use_standins(fake, client)
+    # Failed requests are counted in the report; their tracebacks would drown it.
+    app.app.logger.setLevel(logging.CRITICAL)
+    record = standins.synthetic_inventory(args.inventory)
+    bin_id = app.data.store_data_to_bin(record)
+    app.TEST_BIN_ID = bin_id
+
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", bin_id, sorted({item["name"] for item in record["inventory"]})
+    finally:
+        server.shutdown()
+        fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights")
+    parser.add_argument("--model-latency", type=float, default=800, help="stub Gemini latency in ms")
+    parser.add_argument("--model-jitter", type=float, default=600, help="extra random stub latency, up to this many ms")
+    parser.add_argument("--model-error-rate", type=float, default=0.0, help="share of stub calls that fail")
+    parser.add_argument("--jsonbin-latency", type=float, default=40, help="fake JSONBin latency in ms")
+    parser.add_argument("--inventory", type=int, default=200, help="batches in the starting inventory")
+    parser.add_argument("--url", help="load a running app at this base URL instead")
+    parser.add_argument("--bin-id", help="bin to use with --url (the app's TEST_BIN_ID)")
+    parser.add_argument("--names", default="apple,banana,eggs,milk", help="foods to consume with --url")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare this run with a saved report")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved reports and exit")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            print_comparison(json.load(f_before), json.load(f_after))
+        return
+
+    meta = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "mix": parse_mix(args.mix),
+    }
+    if args.url:
+        if not args.bin_id:
+            sys.exit("--bin-id is required with --url")
+        meta.update(target=args.url)
+        result = run_load(args.url.rstrip("/"), args.bin_id, args.names.split(","), args)
+    else:
+        meta.update(
+            target="in-process app with stand-ins",
+            model_latency_ms=args.model_latency,
+            model_jitter_ms=args.model_jitter,
+            model_error_rate=args.model_error_rate,
+            jsonbin_latency_ms=args.jsonbin_latency,
+            inventory=args.inventory,
+        )
+        # The app logs every request to stdout; keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), local_app(args) as target:
+            result = run_load(*target, args)
+    result = {"meta": meta, **result}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print()
+            print_comparison(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Local stand-ins for FooGie's external services, shared by the benchmarks and
+the load test, so they run offline and measure our code rather than the network:
+
+- FakeJSONBin: an in-process HTTP server speaking the part of the JSONBin v3
+  API that storage.JSONBinStore uses (GET/PUT/POST on /v3/b/<id>).
+- StubGenaiClient: a drop-in for genai.Client with configurable latency that
+  answers inventory prompts (image parts) and recipe prompts, and keeps
+  cached contents in memory (client.caches).
+- synthetic_inventory() / synthetic_inventory_output(): test data of any size.
+
+Import this module before `app` (see use_standins()); it sets the environment
+the app reads at import time.
+"""
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The app builds its Gemini client and storage backend at import time.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("FOOGIE_STORAGE", "jsonbin")
+# Measure the write path itself, not the coalescing window (override to include it).
+os.environ.setdefault("FOOGIE_WRITE_COALESCE_MS", "0")
+# Measure the stubbed model latency, not the app's per-minute model rate limit.
+os.environ.setdefault("FOOGIE_MODEL_RPM", "0")
+
+FOODS = [
+    ("apple", "fruit", "items", 95, 7), ("banana", "fruit", "items", 105, 5), ("orange", "fruit", "items", 62, 10),
+    ("strawberries", "fruit", "grams", 0.32, 4), ("spinach", "vegetable", "grams", 0.23, 5),
+    ("carrot", "vegetable", "items", 25, 14), ("broccoli", "vegetable", "grams", 0.34, 6),
+    ("tomato", "vegetable", "items", 22, 6), ("onion", "vegetable", "items", 44, 30),
+    ("chicken breast", "protein", "grams", 1.65, 2), ("salmon", "protein", "grams", 2.08, 2),
+    ("ground beef", "protein", "grams", 2.5, 2), ("eggs", "protein", "eggs", 70, 21),
+    ("tofu", "protein", "grams", 0.76, 10), ("rice", "grains", "grams", 3.6, 365), ("pasta", "grains", "grams", 3.7, 365),
+    ("bread", "grains", "items", 80, 5), ("milk", "dairy", "containers", 600, 7), ("yogurt", "dairy", "containers", 150, 14),
+    ("cheddar cheese", "dairy", "grams", 4.0, 30), ("butter", "dairy", "grams", 7.2, 60),
+    ("orange juice", "beverage", "containers", 470, 10), ("coca cola", "beverage", "containers", 140, 180),
+    ("crackers", "snacks", "items", 16, 120), ("ketchup", "condiments", "containers", 340, 180),
+]
+
+
+# --- Synthetic Data ---
+
+def synthetic_inventory(batches: int, seed: int = 0, today: Optional[date] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """An {"inventory": [...]} record with `batches` batches drawn from FOODS (names repeat, like a real fridge)."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    items = []
+    for i in range(batches):
+        name, food_type, unit, calories, shelf_life = FOODS[i % len(FOODS)] if i < len(FOODS) else rng.choice(FOODS)
+        quantity = rng.randint(100, 1000) if unit == "grams" else rng.randint(1, 12)
+        expiry = today + timedelta(days=rng.randint(-2, shelf_life))
+        total = round(calories * quantity)
+        items.append({
+            "name": name,
+            "type": food_type,
+            "quantity": quantity,
+            "unit": unit,
+            "expected_expiry_date": expiry.strftime("%d/%m/%Y"),
+            "calories": total,
+            "carbs": total // 10,
+            "fats": total // 30,
+            "protein": total // 20,
+        })
+    return {"inventory": items}
+
+
+def synthetic_inventory_output(batches: int, seed: int = 0, fenced: bool = True) -> str:
+    """Model-style text for an inventory answer: pretty-printed JSON, optionally in a ``` fence."""
+    text = json.dumps(synthetic_inventory(batches, seed), indent=4)
+    return f"```json\n{text}\n```" if fenced else text
+
+
+def synthetic_recipes(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(count):
+        name, food_type, unit, _, _ = rng.choice(FOODS)
+        recipes.append({
+            "name": f"Stand-in {name.title()} Dish {i + 1}",
+            "inventory_only": True,
+            "inventory_items_used": [f"{200 if unit == 'grams' else 2} {unit} of {name}"],
+            "additional_ingredients": ["salt", "pepper"],
+            "instructions": ["Prepare the ingredients.", "Cook until done.", "Serve."],
+            "cooking_time": "20 minutes",
+            "servings": 2,
+            "nutrition_per_serving": {"calories": 400, "carbs": 40, "fats": 12, "protein": 25},
+            "total_nutrition": {"calories": 800, "carbs": 80, "fats": 24, "protein": 50},
+            "food_types_used": [food_type],
+            "urgency": "medium",
+            "urgency_reason": f"Uses {name} before it expires",
+        })
+    return recipes
+
+
+def synthetic_image() -> bytes:
+    """A small JPEG (a 1x1 PNG without Pillow), unique per call so the image cache never hits."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return bytes.fromhex(
+            "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+            "1f15c4890000000d49444154789c6360000002000154a24f5b0000000049454e44ae426082"
+        ) + uuid.uuid4().bytes
+    output = io.BytesIO()
+    Image.new("RGB", (640, 480), tuple(random.randrange(256) for _ in range(3))).save(output, format="JPEG")
+    return output.getvalue()
+
+
+# --- Fake JSONBin ---
+
+class FakeJSONBin:
+    """
+    Threaded HTTP server on 127.0.0.1 implementing the JSONBin v3 calls the app
+    makes, with records kept in memory. `latency` (seconds) is added to every
+    response to imitate the real service.
+
+        with FakeJSONBin() as fake:
+            store = storage.JSONBinStore(base_url=fake.base_url, master_key="local")
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-jsonbin", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v3/b"
+
+    def start(self) -> "FakeJSONBin":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeJSONBin":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API behind the pooled session
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> Any:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"null")
+
+            def _bin_id(self) -> Optional[str]:
+                parts = self.path.rstrip("/").split("/")
+                return parts[3] if len(parts) == 4 and parts[1:3] == ["v3", "b"] else None
+
+            def _begin(self) -> None:
+                with fake._lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+            def do_GET(self):
+                self._begin()
+                bin_id = self._bin_id()
+                with fake._lock:
+                    record = fake.records.get(bin_id)
+                if record is None:
+                    return self._reply(404, {"message": "Bin not found"})
+                self._reply(200, {"record": record, "metadata": {"id": bin_id, "private": False}})
+
+            def do_PUT(self):
+                self._begin()
+                bin_id, record = self._bin_id(), self._body()
+                with fake._lock:
+                    if bin_id not in fake.records:
+                        return self._reply(404, {"message": "Bin not found"})
+                    fake.records[bin_id] = record
+                self._reply(200, {"record": record, "metadata": {"parentId": bin_id, "private": False}})
+
+            def do_POST(self):
+                self._begin()
+                if self.path.rstrip("/") != "/v3/b":
+                    return self._reply(404, {"message": "Route not found"})
+                bin_id, record = uuid.uuid4().hex[:24], self._body()
+                with fake._lock:
+                    fake.records[bin_id] = record
+                self._reply(200, {"record": record, "metadata": {"id": bin_id, "private": False}})
+
+        return Handler
+
+
+# --- Stub Gemini Client ---
+
+class StubAPIError(Exception):
+    """Shaped like google.genai's APIError: an HTTP `code` and a message starting with it."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class _StubCaches:
+    """client.caches: create/update/get/delete of cached contents, which expire after their ttl."""
+
+    def __init__(self, client: "StubGenaiClient"):
+        self._client = client
+        self.contents: Dict[str, Dict[str, Any]] = {}
+
+    def _check(self) -> None:
+        if not self._client.cache_support:
+            raise StubAPIError(400, "INVALID_ARGUMENT. Cached content is not supported for this model (stub)")
+
+    def create(self, model: str, config: Any = None, **kwargs):
+        self._check()
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        text = "".join(part.text or "" for content in config.contents for part in content.parts)
+        with self._client._lock:
+            self.contents[name] = {"model": model, "text": text, "expires": time.monotonic() + int(config.ttl[:-1])}
+        return types.SimpleNamespace(name=name, model=model)
+
+    def get(self, name: str, **kwargs):
+        with self._client._lock:
+            cached = self.contents.get(name)
+        if cached is None or cached["expires"] < time.monotonic():
+            raise StubAPIError(404, f"CachedContent not found: {name} (stub)")
+        return types.SimpleNamespace(name=name, model=cached["model"])
+
+    def update(self, name: str, config: Any = None, **kwargs):
+        self.get(name)
+        with self._client._lock:
+            self.contents[name]["expires"] = time.monotonic() + int(config.ttl[:-1])
+        return self.get(name)
+
+    def delete(self, name: str, **kwargs):
+        with self._client._lock:
+            self.contents.pop(name, None)
+
+
+class _StubModels:
+    def __init__(self, client: "StubGenaiClient"):
+        self._client = client
+
+    def _answer(self, contents: Any) -> str:
+        parts = contents[0]["parts"] if isinstance(contents, list) and isinstance(contents[0], dict) else []
+        if any("inline_data" in part for part in parts):
+            return json.dumps(synthetic_inventory(self._client.inventory_batches, seed=self._client.calls))
+        return json.dumps(synthetic_recipes(self._client.recipes, seed=self._client.calls))
+
+    def generate_content(self, model: str, contents: Any, config: Any = None, **kwargs):
+        self._client.record_call(model, contents, config)
+        time.sleep(self._client.delay())
+        if self._client.error_rate and random.random() < self._client.error_rate:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED (stub)")
+        return types.SimpleNamespace(text=self._answer(contents))
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None, **kwargs):
+        self._client.record_call(model, contents, config)
+        text = self._answer(contents)
+        pieces = max(1, self._client.stream_chunks)
+        size = -(-len(text) // pieces)
+        delay = self._client.delay() / pieces
+        for start in range(0, len(text), size):
+            time.sleep(delay)
+            yield types.SimpleNamespace(text=text[start:start + size])
+
+
+class StubGenaiClient:
+    """
+    Stands in for genai.Client: `client.models.generate_content(...)` sleeps
+    for `latency` seconds (plus up to `jitter`) and returns schema-shaped JSON.
+    Prompts with an inline image get `inventory_batches` batches back, other
+    prompts `recipes` recipes. `error_rate` makes a share of calls raise like a
+    quota error. `prompt_chars` counts the prompt text sent and `cached_calls`
+    the calls that used cached content; `cache_support=False` makes
+    client.caches refuse like a model without context caching.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        inventory_batches: int = 5,
+        recipes: int = 3,
+        error_rate: float = 0.0,
+        stream_chunks: int = 8,
+        cache_support: bool = True,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.inventory_batches = inventory_batches
+        self.recipes = recipes
+        self.error_rate = error_rate
+        self.stream_chunks = stream_chunks
+        self.cache_support = cache_support
+        self.calls = 0
+        self.calls_by_model: Dict[str, int] = {}
+        self.cached_calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self.models = _StubModels(self)
+        self.caches = _StubCaches(self)
+
+    def delay(self) -> float:
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def record_call(self, model: str, contents: Any = None, config: Any = None) -> None:
+        cached_content = getattr(config, "cached_content", None)
+        if cached_content:
+            cached = self.caches.get(cached_content)  # raises like the API if it has expired
+            if cached.model != model:
+                raise StubAPIError(400, f"CachedContent {cached_content} belongs to {cached.model} (stub)")
+        parts = contents[0]["parts"] if isinstance(contents, list) and contents and isinstance(contents[0], dict) else []
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+            self.cached_calls += 1 if cached_content else 0
+            self.prompt_chars += sum(len(part.get("text", "")) for part in parts)
+
+
+# --- Wiring ---
+
+def use_standins(fake_jsonbin: FakeJSONBin, client: StubGenaiClient):
+    """
+    Imports the app and points it at the stand-ins: JSONBin storage talking to
+    `fake_jsonbin` and `client` for model calls. Returns the app module.
+    """
+    import storage
+    storage.set_store(storage.JSONBinStore(base_url=fake_jsonbin.base_url, master_key="local"))
+    import app
+    app.client = client
+    return app
+
+
+# --- Timing ---
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(-(-q * len(sorted_values) // 100))))
+    return sorted_values[rank - 1]
+
+
+def summarize_timings(seconds: List[float], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """Count, throughput and latency percentiles (in ms) for a list of durations in seconds."""
+    ordered = sorted(seconds)
+    total = elapsed if elapsed is not None else sum(ordered)
+    return {
+        "count": len(ordered),
+        "ops_per_sec": round(len(ordered) / total, 2) if total > 0 else 0.0,
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "min_ms": round(1000 * ordered[0], 3) if ordered else 0.0,
+        "p50_ms": round(1000 * percentile(ordered, 50), 3),
+        "p95_ms": round(1000 * percentile(ordered, 95), 3),
+        "p99_ms": round(1000 * percentile(ordered, 99), 3),
+        "max_ms": round(1000 * ordered[-1], 3) if ordered else 0.0,
+    }
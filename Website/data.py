@@ -1,84 +1,315 @@
-import requests
+import copy
 import json
 import os
-from typing import Optional, Dict, List, Any, Tuple
-from datetime import datetime
+import random
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, List, Any, Tuple, Callable
+
+import http_client
+import storage
+from cache import TTLCache
+from metrics import CONSUME_LATENCY, PARSE_LATENCY, STORAGE_LATENCY
+from events import diff_records
+from inventory import Inventory, needs_normalizing, normalize_item
+from schemas import extract_json, validate_inventory
+from write_buffer import WriteBuffer
 
 # =================================================================
 # IMPORTANT CONFIGURATION
-# 1. Replace the placeholder below with your actual JSONBin.io Master Key.
-# 2. To run the example, you may need to install the requests library: pip install requests
+# 1. Set JSONBIN_MASTER_KEY in your .env to your actual JSONBin.io Master Key.
+# 2. Set FOOGIE_STORAGE=sqlite to keep inventories in a local database instead
+#    (see storage.py for the available backends).
 # =================================================================
-MASTER_KEY = os.getenv("JSONBIN_MASTER_KEY")
-BASE_URL = "https://api.jsonbin.io/v3/b"
+MASTER_KEY = storage.MASTER_KEY
+BASE_URL = storage.BASE_URL
+
+# Raised by write_data_to_bin when a conditional write loses a race.
+ConflictError = storage.ConflictError
+
+# How many times a mutation is re-read and re-applied after losing a race
+# against another worker before giving up.
+MAX_CONFLICT_RETRIES = int(os.getenv("FOOGIE_MAX_CONFLICT_RETRIES", "5"))
+
+# Additions from /analyze that pile up behind a write in flight are coalesced
+# per bin for this many milliseconds (or until this many items are queued) and
+# written in one merged update; a lone addition is written at once.
+# A window of 0 writes every addition straight through.
+WRITE_COALESCE_MS = float(os.getenv("FOOGIE_WRITE_COALESCE_MS", "250"))
+WRITE_COALESCE_MAX_ITEMS = int(os.getenv("FOOGIE_WRITE_COALESCE_MAX_ITEMS", "50"))
+# How many bins the write buffer flushes at the same time.
+WRITE_FLUSH_WORKERS = int(os.getenv("FOOGIE_WRITE_FLUSH_WORKERS", "4"))
+# How long a request waits for its buffered items to be written. By default
+# the longest a flush can take: the window, then every HTTP attempt timing out
+# on every conflict retry.
+WRITE_ACK_TIMEOUT = float(os.getenv("FOOGIE_WRITE_ACK_TIMEOUT") or (
+    WRITE_COALESCE_MS / 1000
+    + (http_client.CONNECT_TIMEOUT + http_client.READ_TIMEOUT) * (http_client.MAX_RETRIES + 1) * MAX_CONFLICT_RETRIES
+))
+
+# Per-bin read-through cache in front of the storage backend. Every successful
+# write below refreshes the cached record directly, so a write never forces a
+# follow-up read.
+inventory_cache = TTLCache(
+    maxsize=int(os.getenv("FOOGIE_INVENTORY_CACHE_SIZE", "128")),
+    ttl=float(os.getenv("FOOGIE_INVENTORY_CACHE_TTL", "30")),
+    name="inventory",
+)
+
+
+# Callbacks run with the bin id after every successful write, so caches derived
+# from an inventory (e.g. generated recipes) can drop their stale entries.
+_change_listeners: List[Callable[[str], None]] = []
+
+
+def on_inventory_change(listener: Callable[[str], None]) -> Callable[[str], None]:
+    """Registers a callback that is called with the bin id whenever a bin is written."""
+    _change_listeners.append(listener)
+    return listener
+
+
+def _notify_inventory_change(bin_id: str) -> None:
+    for listener in _change_listeners:
+        try:
+            listener(bin_id)
+        except Exception as e:
+            print(f"Warning: inventory change listener failed for bin {bin_id}: {e}")
 
 
-# --- Utility Function for Expiry Date Sorting ---
+def parse_gemini_inventory_output(raw_text: str) -> dict or None:
+    """
+    Parses the raw text output from Gemini into an {"inventory": [...]}
+    dictionary. Schema-constrained responses are plain JSON; anything else
+    (Markdown fences, surrounding text, trailing commas, Python-style
+    literals) goes through the tolerant extractor. Batches without a name are
+    dropped, and numeric fields are coerced.
+    """
+    with PARSE_LATENCY.time(kind="inventory"):
+        parsed_data = extract_json(raw_text, dict)
+        if not (isinstance(parsed_data, dict) and "inventory" in parsed_data):
+            # A bare list of batches (the first '{' would otherwise be taken for the whole answer)
+            parsed_data = extract_json(raw_text, list) or parsed_data
+        inventory, problems = validate_inventory(parsed_data)
+    if inventory is None:
+        print(f"Error decoding inventory from Gemini output: {'; '.join(problems)}")
+        print(f"Raw text attempting to parse: {(raw_text or '')[:200]}...")
+        return None
 
-def _parse_expiry_date(date_str: str) -> datetime:
-    """Converts a DD/MM/YYYY string to a datetime object for sorting."""
-    try:
-        return datetime.strptime(date_str, "%d/%m/%Y")
-    except (ValueError, TypeError):
-        # If parsing fails, treat it as the maximum date (i.e., expire last)
-        print(f"Warning: Could not parse date '{date_str}'. Treating as last to expire.")
-        return datetime.max
+    if problems:
+        print(f"Warning: Dropped {len(problems)} unusable batch(es): {'; '.join(problems)}")
+    print("Successfully parsed Gemini output into dictionary.")
+    return inventory
 
 
-def parse_gemini_inventory_output(raw_text: str) -> dict or None:
+# --- Ingest Normalization ---
+
+def normalize_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Adds the derived fields (name key, expiry ordinal, per-unit macros) to every batch in place."""
+    for item in items:
+        if isinstance(item, dict):
+            normalize_item(item)
+    return items
+
+
+def migrate_bin(bin_id: str) -> Optional[int]:
     """
-    Parses the raw text output from Gemini, attempting to extract and deserialize
-    the JSON inventory dictionary. Handles Markdown code fences.
+    One-time migration for bins written before ingest normalization: adds the
+    derived fields to every batch that lacks them. Safe to run repeatedly.
+
+    Returns:
+        The number of batches updated (0 if already migrated), or None on failure.
     """
-    # 1. Clean the text by removing common Markdown fences
-    if raw_text.startswith("```json"):
-        clean_text = raw_text.strip().removeprefix("```json").removesuffix("```").strip()
-    else:
-        clean_text = raw_text.strip()
-        
-    try:
-        # 2. Deserialize the JSON string into a Python dictionary
-        parsed_data = json.loads(clean_text)
-        print("Successfully parsed Gemini output into dictionary.")
-        return parsed_data
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from Gemini output: {e}")
-        print(f"Raw text attempting to parse: {clean_text[:200]}...")
+    record = read_data_from_bin(bin_id)
+    if record is None:
+        return None
+    if not any(needs_normalizing(item) for item in record.get("inventory", []) or []):
+        return 0
+
+    def migrate(record: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]], int]:
+        new_record = copy.deepcopy(record)
+        stale = [item for item in new_record.get("inventory", []) or [] if needs_normalizing(item)]
+        normalize_items(stale)
+        return new_record, diff_records(record, new_record, ignore=(storage.REV_KEY,)), len(stale)
+
+    result = mutate_bin(bin_id, migrate)
+    if result is None:
         return None
+    print(f"   Migrated {result[1]} batch(es) in bin {bin_id}.")
+    return result[1]
+
+
 # --- Core JSONBin Functions ---
 
-def read_data_from_bin(bin_id: str) -> Optional[Dict[str, Any]]:
+def read_data_from_bin(bin_id: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
     """
     Retrieves the JSON data (the record dictionary containing "inventory")
-    from a specified public bin.
+    for the specified bin from the configured storage backend. With
+    `use_cache=False` the backend is always asked (and the cache refreshed).
     """
-    url = f"{BASE_URL}/{bin_id}"
-    print(f"\n-> Attempting to READ data from bin: {bin_id}")
+    cached = inventory_cache.get(bin_id) if use_cache else None
+    if cached is not None:
+        print(f"\n-> READ data for bin {bin_id} from cache.")
+        # Callers mutate the record in place, so never hand out the cached object.
+        return copy.deepcopy(cached)
+
+    store = storage.get_store()
+    print(f"\n-> Attempting to READ data from bin: {bin_id} ({store.name})")
+
+    with STORAGE_LATENCY.time(backend=store.name, op="read"):
+        record = store.read(bin_id)
+    if record is not None:
+        print("   Success! Data retrieved.")
+        inventory_cache.set(bin_id, copy.deepcopy(record))
+    return record
 
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Master-Key': MASTER_KEY
-    }
 
-    response = requests.get(url, headers=headers)
+def write_data_to_bin(
+    bin_id: str,
+    data: Dict[str, Any],
+    expected_rev: Optional[int] = None,
+    events: Optional[List[Dict[str, Any]]] = None,
+) -> bool:
+    """
+    Overwrites the whole record of an existing bin (no merge).
+
+    Args:
+        bin_id: The ID of the bin to overwrite.
+        data: The full record to store.
+        expected_rev: If given, the write only succeeds while the bin is still at
+            this revision; otherwise ConflictError is raised. The SQLite
+            backends check this in the write itself; JSONBin can't, and only
+            stamps the next revision (last writer wins).
+        events: The same change expressed as events (see events.py). Event-log
+            storage appends these instead of rewriting the whole record.
 
+    Returns:
+        True if the write succeeded, False otherwise.
+    """
+    store = storage.get_store()
+    print(f"-> Attempting to WRITE data to bin: {bin_id} ({store.name})")
     try:
-        response.raise_for_status()
-        result = response.json()
-        print("   Success! Data retrieved.")
-        return result.get('record')
+        with STORAGE_LATENCY.time(backend=store.name, op="write"):
+            written = store.write(bin_id, data, expected_rev=expected_rev, events=events)
+    except ConflictError:
+        inventory_cache.invalidate(bin_id)
+        raise
+
+    if written and expected_rev is not None:
+        cached = copy.deepcopy(data)
+        cached[storage.REV_KEY] = expected_rev + 1
+        inventory_cache.set(bin_id, cached)
+        _notify_inventory_change(bin_id)
+        return True
+    if written:
+        # Without a base revision we can't know the new one, so re-read next time.
+        inventory_cache.invalidate(bin_id)
+        _notify_inventory_change(bin_id)
+        return True
+
+    # The backend may or may not have applied the write, so drop what we know.
+    inventory_cache.invalidate(bin_id)
+    return False
+
+
+# --- Optimistic Concurrency ---
+
+_bin_locks: Dict[str, threading.Lock] = {}
+_bin_locks_guard = threading.Lock()
+
+
+def _bin_lock(bin_id: str) -> threading.Lock:
+    """Per-bin lock that serializes mutations of the same bin within this process."""
+    with _bin_locks_guard:
+        lock = _bin_locks.get(bin_id)
+        if lock is None:
+            lock = _bin_locks[bin_id] = threading.Lock()
+        return lock
+
+
+def mutate_bin(
+    bin_id: str,
+    mutate: Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]], Any]],
+) -> Optional[Tuple[Dict[str, Any], Any]]:
+    """
+    Runs a read-modify-write cycle on a bin with optimistic concurrency.
+
+    `mutate` receives a private copy of the current record and returns
+    (new record, events describing the change, extra result); events may be
+    None if the change has no compact form. The new record is written only if the bin is
+    still at the revision that was read; if another worker got there first, the
+    bin is re-read and `mutate` is applied again, up to MAX_CONFLICT_RETRIES
+    times. Threads of this process are serialized by a per-bin lock, so
+    conflicts only come from other processes.
+
+    Backends without atomic conditional writes (JSONBin) are read past the
+    inventory cache, so each change is applied to what is really stored rather
+    than to a copy another worker may have overwritten since. Their write is
+    not checked, so a writer slipping in between the read and the write still
+    loses its change (best effort, last writer wins).
 
-    except requests.exceptions.HTTPError as err:
-        print(f"   API Error occurred during read: {err}")
-        return None
-    except Exception as e:
-        print(f"   An unexpected error occurred: {e}")
-        return None
+    Returns:
+        (record as written, extra result), or None if the bin could not be
+        read or written.
+    """
+    use_cache = storage.get_store().atomic_writes
+    for attempt in range(1, MAX_CONFLICT_RETRIES + 1):
+        with _bin_lock(bin_id):
+            record = read_data_from_bin(bin_id, use_cache=use_cache)
+            if record is None:
+                return None
+
+            rev = storage.get_rev(record)
+            new_record, events, result = mutate(record)
+            try:
+                if not write_data_to_bin(bin_id, new_record, expected_rev=rev, events=events):
+                    return None
+            except ConflictError as e:
+                print(f"   ⚠️ Write conflict (attempt {attempt}/{MAX_CONFLICT_RETRIES}): {e}")
+            else:
+                new_record[storage.REV_KEY] = rev + 1
+                return new_record, result
+
+        # Back off outside the lock so the winning writer's peers aren't blocked.
+        time.sleep(random.uniform(0, 0.02 * attempt))
+
+    print(f"   ❌ Giving up on bin {bin_id} after {MAX_CONFLICT_RETRIES} conflicting writes.")
+    return None
+
+
+def replace_data_in_bin(bin_id: str, data: Dict[str, Any], expected_rev: Optional[int] = None) -> bool:
+    """
+    Replaces a bin's whole record (the fridge editor's save).
+
+    If `expected_rev` is given, the caller's edit was based on that revision and
+    ConflictError is raised if the bin has changed since. Only the batches that
+    actually changed are recorded as events.
+    """
+    new_record = {key: value for key, value in data.items() if key != storage.REV_KEY}
+    normalize_items(new_record.get("inventory", []) or [])
+
+    if expected_rev is not None:
+        current = read_data_from_bin(bin_id)
+        if current is not None and storage.get_rev(current) != expected_rev:
+            # The cached copy may be behind the store; only a fresh read can tell
+            # whether the edit is really stale. It also refreshes the cache that
+            # mutate_bin reads from below.
+            inventory_cache.invalidate(bin_id)
+            current = read_data_from_bin(bin_id)
+            if current is not None and storage.get_rev(current) != expected_rev:
+                raise ConflictError(bin_id, expected_rev, storage.get_rev(current))
+
+    def replace(record: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]], None]:
+        if expected_rev is not None and storage.get_rev(record) != expected_rev:
+            raise ConflictError(bin_id, expected_rev, storage.get_rev(record))
+        return new_record, diff_records(record, new_record, ignore=(storage.REV_KEY,)), None
+
+    return mutate_bin(bin_id, replace) is not None
 
 
 def store_data_to_bin(data: Dict[str, List[Dict[str, Any]]], bin_id: Optional[str] = None) -> Optional[str]:
     """
-    Creates a new JSONBin or performs an ADDITIVE UPDATE (list merge) on an existing one.
+    Creates a new bin or performs an ADDITIVE UPDATE (list merge) on an existing one.
 
     The merge logic retrieves the existing list of items and appends the new list
     to preserve unique entries.
@@ -90,228 +321,173 @@ def store_data_to_bin(data: Dict[str, List[Dict[str, Any]]], bin_id: Optional[st
     Returns:
         The ID of the newly created bin (if created), or None (if updated or failed).
     """
-    if MASTER_KEY == "YOUR_MASTER_KEY_HERE":
-        print("ERROR: Please update the MASTER_KEY variable with your actual key.")
+    if bin_id:
+        # Case 1: ADDITIVE UPDATE (Read -> Merge -> Write, retried on conflict)
+        append_items_to_bin(bin_id, data.get("inventory", []))
         return None
 
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Master-Key': MASTER_KEY,
-        'X-Bin-Private': 'false'
-    }
-
-    final_data_to_store = data
+    else:
+        # Case 2: CREATE new bin
+        store = storage.get_store()
+        print(f"-> Attempting to CREATE new bin ({store.name}).")
+        data = dict(data, inventory=normalize_items(copy.deepcopy(data.get("inventory", []) or [])))
+        with STORAGE_LATENCY.time(backend=store.name, op="create"):
+            new_id = store.create(data)
+        if new_id:
+            print(f"   Success! New bin created with ID: {new_id}")
+            cached = copy.deepcopy(data)
+            cached[storage.REV_KEY] = 0
+            inventory_cache.set(new_id, cached)
+        return new_id
 
-    if bin_id:
-        # Case 1: ADDITIVE UPDATE (Read -> Merge -> Write)
 
-        existing_data_wrapper = read_data_from_bin(bin_id)
+def append_items_to_bin(bin_id: str, new_items: List[Dict[str, Any]]) -> bool:
+    """
+    Appends new items to an existing bin's inventory in one read-merge-write cycle.
+    The items are normalized (derived fields added) on the way in.
 
-        if existing_data_wrapper is None:
-            print("   Failed to read existing data. Aborting merge update.")
-            return None
+    Returns:
+        True if the merged inventory was written, False otherwise.
+    """
+    new_items = normalize_items(copy.deepcopy(new_items))
 
+    def merge(existing_data_wrapper: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]], None]:
         existing_inventory: List[Dict[str, Any]] = existing_data_wrapper.get("inventory", [])
-        new_items: List[Dict[str, Any]] = data.get("inventory", [])
 
         # Core merge logic: extend the existing list with new items
-        existing_inventory.extend(new_items)
+        existing_inventory.extend(copy.deepcopy(new_items))
         print(f"   MERGE: Added {len(new_items)} new item(s) to the inventory list.")
+        return {"inventory": existing_inventory}, [{"op": "add", "items": new_items}], None
 
-        final_data_to_store = {"inventory": existing_inventory}
+    if mutate_bin(bin_id, merge) is None:
+        print("   Failed to merge new items into the bin. Aborting merge update.")
+        return False
 
-        # WRITE the MERGED data back (PUT request)
-        url = f"{BASE_URL}/{bin_id}"
-        print(f"-> Attempting to WRITE merged data back to bin: {bin_id}")
-        response = requests.put(url, headers=headers, data=json.dumps(final_data_to_store))
+    print(f"   Success! Bin {bin_id} updated successfully with merged data.")
+    return True
 
-    else:
-        # Case 2: CREATE new bin (POST request)
-        url = BASE_URL
-        print("-> Attempting to CREATE new bin.")
-        response = requests.post(url, headers=headers, data=json.dumps(data))
 
-    try:
-        response.raise_for_status()
-        result = response.json()
-
-        if bin_id:
-            print(f"   Success! Bin {bin_id} updated successfully with merged data.")
-            return None
-        else:
-            new_id = result['metadata']['id']
-            print(f"   Success! New bin created with ID: {new_id}")
-            return new_id
+# --- Coalesced Additions ---
+
+write_buffer = WriteBuffer(
+    append_items_to_bin,
+    window=WRITE_COALESCE_MS / 1000,
+    max_items=WRITE_COALESCE_MAX_ITEMS,
+    workers=WRITE_FLUSH_WORKERS,
+)
+
+
+def add_items_to_bin(data: Optional[Dict[str, Any]], bin_id: str) -> Optional[bool]:
+    """
+    Adds newly recognized items (the output of parse_gemini_inventory_output) to
+    a bin. Additions arriving close together are merged into one write by the
+    write buffer; this call still blocks until its own items are written, so
+    the return value is an accurate acknowledgement.
+
+    Returns:
+        True if the items are stored, False if there was nothing to store or
+        the write failed, or None if they are still queued after
+        WRITE_ACK_TIMEOUT. Pending items may yet be written, so callers must
+        not report them as failed (a retrying client would add them twice).
+    """
+    if not data or not data.get("inventory"):
+        print("   Nothing to add: no inventory items in the parsed data.")
+        return False
+
+    new_items: List[Dict[str, Any]] = data["inventory"]
+    if WRITE_COALESCE_MS <= 0:
+        return append_items_to_bin(bin_id, new_items)
 
-    except requests.exceptions.HTTPError as err:
-        print(f"   API Error occurred: {err}")
+    print(f"-> Queued {len(new_items)} item(s) for coalesced write to bin: {bin_id}")
+    try:
+        return write_buffer.submit(bin_id, new_items).result(timeout=WRITE_ACK_TIMEOUT)
+    except FutureTimeoutError:
+        print(f"   ⚠️ Buffered write to bin {bin_id} still pending after {WRITE_ACK_TIMEOUT:g}s")
         return None
     except Exception as e:
-        print(f"   An unexpected error occurred: {e}")
-        return None
+        print(f"   ❌ Buffered write to bin {bin_id} did not complete: {e}")
+        return False
 
 
 # --- NEW FUNCTION FOR CONSUMPTION ---
 
-def consume_data_from_bin(bin_id: str, consumed_map: Dict[str, Any]) -> None:
+def consume_data_from_bin(
+    bin_id: str, consumed_map: Dict[str, Any]
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]]:
     """
     Subtracts consumed amounts from the inventory, prioritizing items
     with the earliest expiry date (FIFO). Uses case-insensitive matching.
 
+    Performs exactly one read and one write (the read is skipped when the bin is
+    in the inventory cache on the SQLite backends, and repeated only after a
+    concurrent write), and hands the written record back so callers never need
+    to read the bin again.
+
     Args:
         bin_id: The ID of the bin to update.
         consumed_map: A dictionary mapping food name to consumed amount (e.g., {"apple": 2}).
+
+    Returns:
+        A tuple of (updated record, consumption report), or None if the bin could
+        not be read or written. The report maps each requested name to
+        {"requested", "consumed", "shortfall", "status"}, where status is one of
+        "consumed", "partial", "missing" or "invalid".
     """
     print("\n" + "=" * 80)
     print(f"STARTING CONSUMPTION LOGIC for bin: {bin_id}")
     print("=" * 80)
 
-    # 1. READ existing data
-    existing_data_wrapper = read_data_from_bin(bin_id)
-    if existing_data_wrapper is None:
-        print("❌ Error: Could not retrieve data for consumption.")
-        return
-
-    # Get the mutable inventory list
-    inventory: List[Dict[str, Any]] = existing_data_wrapper.get("inventory", [])
-    
-    print(f"\n📦 Current inventory has {len(inventory)} items")
-    print(f"🛒 Request to consume {len(consumed_map)} different types of items")
-    print(f"Items to consume: {list(consumed_map.keys())}")
-
-    # List to hold the items that will be kept (i.e., not fully consumed)
-    updated_inventory = []
-    
-    # Track what was actually consumed for reporting
-    actually_consumed = {}
-
-    # 2. Process Consumption for Each Item Type
-    for item_name, amount_to_consume in consumed_map.items():
-        if not (isinstance(amount_to_consume, (int, float)) and amount_to_consume > 0):
-            print(f"⚠️ Skipping consumption for '{item_name}': Invalid or non-positive amount.")
-            continue
-
-        print(f"\n{'─' * 80}")
-        print(f"Processing: {amount_to_consume} unit(s) of '{item_name}'")
-        print(f"{'─' * 80}")
-
-        # a. Filter and Sort All Matching Items by Expiry Date (CASE-INSENSITIVE)
-        matching_entries: List[Dict[str, Any]] = [
-            item for item in inventory 
-            if item.get('name', '').lower() == item_name.lower()
-        ]
-        
-        print(f"  Found {len(matching_entries)} matching entries in inventory")
-
-        if len(matching_entries) == 0:
-            print(f"  ⚠️ WARNING: No matching items found for '{item_name}'")
-            continue
-
-        # Sort by earliest expiry date (using the custom parse function)
-        matching_entries.sort(key=lambda item: _parse_expiry_date(item.get('expected_expiry_date', '')))
-        
-        # Debug: show what we found
-        for idx, entry in enumerate(matching_entries):
-            print(f"    Match {idx + 1}: {entry.get('quantity')} {entry.get('unit', 'units')} "
-                  f"(expires: {entry.get('expected_expiry_date')})")
-
-        current_consumed = amount_to_consume
-        items_to_keep = []
-        total_consumed_this_item = 0
-
-        # b. Consume from the oldest item first
-        for entry in matching_entries:
-            if current_consumed <= 0:
-                # No more to consume, keep this item and all subsequent items
-                items_to_keep.append(entry)
-                continue
-
-            quantity = entry.get('quantity')
-
-            # Skip entries with non-numerical or zero quantity
-            if not isinstance(quantity, (int, float)) or quantity <= 0:
-                print(f"    ⚠️ Skipping entry with invalid quantity: {quantity}")
-                items_to_keep.append(entry)
-                continue
-
-            # Consumption logic
-            if quantity >= current_consumed:
-                # Consumed amount is less than or equal to current entry quantity
-                consumed_from_this = current_consumed
-                entry['quantity'] -= current_consumed
-                total_consumed_this_item += consumed_from_this
-                current_consumed = 0
-
-                if entry['quantity'] > 0:
-                    items_to_keep.append(entry)
-                    print(f"    ✅ Consumed {consumed_from_this}, {entry['quantity']} remaining in this batch")
-                else:
-                    print(f"    ✅ Consumed {consumed_from_this}, batch fully depleted")
-            else:
-                # Consumed amount is GREATER than current entry quantity. Consume all of this entry.
-                consumed_from_this = quantity
-                total_consumed_this_item += consumed_from_this
-                current_consumed -= quantity
-                print(f"    ✅ Fully consumed batch of {consumed_from_this}. "
-                      f"Still need {current_consumed} more")
-
-        # Track what was actually consumed
-        actually_consumed[item_name] = total_consumed_this_item
-
-        # If any was left to consume, report it
-        if current_consumed > 0:
-            print(f"  ⚠️ WARNING: Could not find enough '{item_name}'. "
-                  f"{current_consumed} units remain unconsumed.")
-            print(f"  Consumed {total_consumed_this_item} out of {amount_to_consume} requested")
-
-        # c. Update the main inventory list with the consumed items
-        # Remove all old matching entries and add back the ones that were partially consumed/saved
-        
-        # First, keep all items that DON'T match this name (case-insensitive)
-        inventory = [
-            item for item in inventory
-            if item.get('name', '').lower() != item_name.lower()
-        ]
-        
-        # Then add back the items we're keeping from this name
-        inventory.extend(items_to_keep)
-        
-        print(f"  📊 Summary for '{item_name}':")
-        print(f"     Requested: {amount_to_consume}")
-        print(f"     Consumed: {total_consumed_this_item}")
-        print(f"     Remaining entries: {len(items_to_keep)}")
-
-    # 3. WRITE the updated data back (using store_data_to_bin PUT logic)
-    final_data_to_store = {"inventory": inventory}
-
-    print(f"\n{'=' * 80}")
-    print("📝 CONSUMPTION SUMMARY")
-    print(f"{'=' * 80}")
-    print(f"Initial inventory size: {len(existing_data_wrapper.get('inventory', []))} items")
-    print(f"Final inventory size: {len(inventory)} items")
-    print(f"\nActually consumed:")
-    for name, amount in actually_consumed.items():
-        print(f"  • {name}: {amount} units")
-    print(f"{'=' * 80}\n")
-
-    url = f"{BASE_URL}/{bin_id}"
-    print("-> FINAL STEP: Writing updated inventory back to server...")
-
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Master-Key': MASTER_KEY
-    }
-
-    # We use requests.put directly here to avoid re-reading the data inside store_data_to_bin
-    response = requests.put(url, headers=headers, data=json.dumps(final_data_to_store))
-
-    try:
-        response.raise_for_status()
-        print(f"   ✅ Success! Bin {bin_id} updated after consumption.")
-    except Exception as e:
-        print(f"   ❌ Error during final update: {e}")
+    def apply_consumption(
+        existing_data_wrapper: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        # Index the batches by name with expiry dates parsed once (see inventory.py).
+        # Consumption edits the batches in place, so work on a copy to diff against.
+        inventory = Inventory.from_record(copy.deepcopy(existing_data_wrapper))
+        initial_size = len(inventory)
+
+        print(f"\n📦 Current inventory has {initial_size} items")
+        print(f"🛒 Request to consume {len(consumed_map)} different types of items")
+        print(f"Items to consume: {list(consumed_map.keys())}")
+
+        # 2. Process Consumption for Each Item Type (earliest expiry first)
+        with CONSUME_LATENCY.time():
+            report = inventory.consume_many(consumed_map)
+
+        for item_name, entry in report.items():
+            if entry["status"] == "invalid":
+                print(f"⚠️ Skipping consumption for '{item_name}': Invalid or non-positive amount.")
+            elif entry["status"] == "missing":
+                print(f"  ⚠️ WARNING: No matching items found for '{item_name}'")
+            elif entry["status"] == "partial":
+                print(f"  ⚠️ WARNING: Could not find enough '{item_name}'. "
+                      f"{entry['shortfall']} units remain unconsumed.")
+
+        print(f"\n{'=' * 80}")
+        print("📝 CONSUMPTION SUMMARY")
+        print(f"{'=' * 80}")
+        print(f"Initial inventory size: {initial_size} items")
+        print(f"Final inventory size: {len(inventory)} items")
+        print(f"\nActually consumed:")
+        for name, entry in report.items():
+            if entry["status"] in ("consumed", "partial"):
+                print(f"  • {name}: {entry['consumed']} out of {entry['requested']} units")
+        print(f"{'=' * 80}\n")
+
+        # Logged as the resulting batch changes rather than the request, so
+        # replaying the log never depends on the consumption rules in force.
+        new_record = dict(existing_data_wrapper, **inventory.to_record())
+        return new_record, diff_records(existing_data_wrapper, new_record, ignore=(storage.REV_KEY,)), report
+
+    # 1. READ existing data, 2. consume, 3. WRITE it back (re-applied if another worker wrote first)
+    result = mutate_bin(bin_id, apply_consumption)
+    if result is None:
+        print("   ❌ Error: Could not read or update the bin for consumption.")
+        print("=" * 80 + "\n")
+        return None
 
+    print(f"   ✅ Success! Bin {bin_id} updated after consumption.")
     print("=" * 80 + "\n")
+    return result
 
 
 # Example Usage
@@ -0,0 +1,129 @@
+import copy
+import json
+from collections import Counter
+from typing import Any, Dict, List
+
+from inventory import Inventory
+
+# =================================================================
+# INVENTORY EVENTS
+# Small, self-describing changes that can be replayed onto a record:
+#   {"op": "add",      "items": [...]}                    - append new batches
+#   {"op": "consume",  "consumed": {"apple": 2}}           - FIFO consumption
+#                                                            (older logs only)
+#   {"op": "edit",     "remove": [...], "add": [...],
+#                      "at": [...]}                        - changed batches
+#   {"op": "set",      "fields": {...}}                    - other changed keys
+#   {"op": "unset",    "keys": [...]}                      - removed keys
+#   {"op": "snapshot", "record": {...}}                    - full replacement
+# Replaying the same events onto the same record always gives the same result.
+# Changes are logged by their outcome (see diff_records), never as a request
+# whose result depends on the code that replays it.
+# =================================================================
+
+
+_MISSING = object()
+
+
+def _batch_key(item: Dict[str, Any]) -> str:
+    return json.dumps(item, sort_keys=True)
+
+
+def apply_event(record: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    """Applies one event to a record in place and returns the (possibly new) record."""
+    op = event.get("op")
+    if op == "add":
+        record.setdefault("inventory", []).extend(copy.deepcopy(event.get("items", [])))
+    elif op == "consume":
+        inventory = Inventory.from_record(record)
+        inventory.consume_many(event.get("consumed", {}))
+        record["inventory"] = inventory.to_record()["inventory"]
+    elif op == "edit":
+        to_remove = Counter(_batch_key(item) for item in event.get("remove", []))
+        kept = []
+        for item in record.get("inventory", []):
+            key = _batch_key(item)
+            if to_remove[key] > 0:
+                to_remove[key] -= 1
+            else:
+                kept.append(item)
+        added = copy.deepcopy(event.get("add", []))
+        if "at" in event:
+            # Positions in the edited list, ascending, so each insert lands where it was.
+            for index, item in zip(event["at"], added):
+                kept.insert(index, item)
+        else:
+            kept.extend(added)
+        record["inventory"] = kept
+    elif op == "set":
+        record.update(copy.deepcopy(event.get("fields", {})))
+    elif op == "unset":
+        for key in event.get("keys", []):
+            record.pop(key, None)
+    elif op == "snapshot":
+        record = copy.deepcopy(event.get("record", {}))
+    else:
+        print(f"Warning: Ignoring unknown inventory event '{op}'.")
+    return record
+
+
+def apply_events(record: Dict[str, Any], events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    for event in events:
+        record = apply_event(record, event)
+    return record
+
+
+def _without_first(keys: List[str], drop: Counter) -> List[str]:
+    """`keys` minus the first occurrences counted in `drop` (how an "edit" removes batches)."""
+    drop = Counter(drop)
+    kept = []
+    for key in keys:
+        if drop[key] > 0:
+            drop[key] -= 1
+        else:
+            kept.append(key)
+    return kept
+
+
+def diff_records(old: Dict[str, Any], new: Dict[str, Any], ignore: tuple = ()) -> List[Dict[str, Any]]:
+    """
+    Describes the change from `old` to `new` as events: one "edit" with only the
+    batches that were removed or added (and where the added ones go), a "set"
+    for other changed keys and an "unset" for removed ones, so replaying them
+    onto `old` gives exactly `new`, batch order included. If the kept batches
+    were reordered, the whole inventory is "set" instead. Keys in `ignore`
+    (e.g. the revision) are skipped.
+    """
+    events: List[Dict[str, Any]] = []
+    fields = {
+        key: value for key, value in new.items()
+        if key != "inventory" and key not in ignore and old.get(key, _MISSING) != value
+    }
+
+    old_keys = [_batch_key(item) for item in old.get("inventory", [])]
+    new_keys = [_batch_key(item) for item in new.get("inventory", [])]
+    removed = Counter(old_keys) - Counter(new_keys)
+    added = Counter(new_keys) - Counter(old_keys)
+    if old_keys != new_keys:
+        remaining = Counter(added)
+        at = []
+        for index, key in enumerate(new_keys):
+            if remaining[key] > 0:
+                remaining[key] -= 1
+                at.append(index)
+        if _without_first(old_keys, removed) == _without_first(new_keys, added):
+            events.append({
+                "op": "edit",
+                "remove": [json.loads(key) for key in removed.elements()],
+                "add": [copy.deepcopy(new["inventory"][index]) for index in at],
+                "at": at,
+            })
+        else:
+            fields["inventory"] = copy.deepcopy(new["inventory"])
+
+    if fields:
+        events.append({"op": "set", "fields": fields})
+    unset = [key for key in old if key not in new and key != "inventory" and key not in ignore]
+    if unset:
+        events.append({"op": "unset", "keys": unset})
+    return events
@@ -0,0 +1,91 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# =================================================================
+# HTTP CONFIGURATION
+# All outbound HTTP (JSONBin traffic and image-URL fetches) goes through one
+# pooled session so connections are kept alive between requests instead of
+# paying a fresh TCP + TLS handshake every time. At most
+# FOOGIE_HTTP_POOL_MAXSIZE connections are open per host; further requests
+# wait for one to be released rather than opening (and then discarding)
+# extra connections.
+# =================================================================
+CONNECT_TIMEOUT = float(os.getenv("FOOGIE_HTTP_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("FOOGIE_HTTP_READ_TIMEOUT", "10"))
+POOL_CONNECTIONS = int(os.getenv("FOOGIE_HTTP_POOL_CONNECTIONS", "10"))  # distinct hosts kept pooled
+POOL_MAXSIZE = int(os.getenv("FOOGIE_HTTP_POOL_MAXSIZE", "20"))  # open connections per host
+MAX_RETRIES = int(os.getenv("FOOGIE_HTTP_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("FOOGIE_HTTP_BACKOFF_FACTOR", "0.3"))
+BACKOFF_JITTER = float(os.getenv("FOOGIE_HTTP_BACKOFF_JITTER", "0.2"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST creates a new bin on JSONBin, so it is never retried automatically.
+RETRY_METHODS = frozenset({"GET", "HEAD", "PUT"})
+
+
+class TimeoutSession(requests.Session):
+    """A requests.Session that applies the default (connect, read) timeout to every call."""
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def _build_retry() -> Retry:
+    options = dict(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True,
+        # Hand the last response back so callers still see it via raise_for_status().
+        raise_on_status=False,
+    )
+    try:
+        return Retry(backoff_jitter=BACKOFF_JITTER, **options)
+    except TypeError:
+        # urllib3 < 2 has no jitter support; plain exponential backoff still applies.
+        return Retry(**options)
+
+
+def build_session() -> TimeoutSession:
+    """Creates a session with keep-alive pooling, per-host limits, timeouts and retries."""
+    session = TimeoutSession()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=True,
+        max_retries=_build_retry(),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session: Optional[TimeoutSession] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> TimeoutSession:
+    """
+    Returns the process-wide pooled session. The underlying urllib3 pools are
+    thread-safe, so one session is shared by every worker thread.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
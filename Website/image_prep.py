@@ -0,0 +1,138 @@
+import io
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import http_client
+from metrics import IMAGE_FETCH_BYTES, IMAGE_FETCH_LATENCY
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent as-is.
+    Image = None
+    ImageOps = None
+
+# =================================================================
+# IMAGE PREPROCESSING CONFIGURATION
+# Photos are checked and shrunk before they're sent to the model. Phone photos
+# are often 3-10 MB and 4000px wide, but the model downsamples them anyway.
+# Resizing to FOOGIE_IMAGE_MAX_EDGE and re-encoding as JPEG makes the upload a
+# fraction of the size, which also makes the model call faster.
+# =================================================================
+IMAGE_MAX_BYTES = int(os.getenv("FOOGIE_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_EDGE = int(os.getenv("FOOGIE_IMAGE_MAX_EDGE", "1536"))
+IMAGE_QUALITY = int(os.getenv("FOOGIE_IMAGE_QUALITY", "85"))
+IMAGE_PREPROCESS = os.getenv("FOOGIE_IMAGE_PREPROCESS", "1").lower() not in ("0", "false", "no")
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the formats the model accepts.
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image is bigger than IMAGE_MAX_BYTES."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Image is larger than the {limit:,} byte limit")
+        self.limit = limit
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """Detects the image format from its first bytes, or returns None if it isn't recognized."""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def read_capped(stream, limit: int = IMAGE_MAX_BYTES) -> bytes:
+    """Reads an uploaded file stream in chunks, refusing to hold more than `limit` bytes."""
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return buffer.getvalue()
+        if buffer.tell() + len(chunk) > limit:
+            raise ImageTooLargeError(limit)
+        buffer.write(chunk)
+
+
+def fetch_image(url: str, limit: int = IMAGE_MAX_BYTES) -> bytes:
+    """
+    Downloads an image in chunks, giving up as soon as it is known to be larger
+    than `limit` (from Content-Length, or while streaming when that's missing).
+    """
+    with IMAGE_FETCH_LATENCY.time(), http_client.get_session().get(url, stream=True) as response:
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > limit:
+            raise ImageTooLargeError(limit)
+
+        buffer = io.BytesIO()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if buffer.tell() + len(chunk) > limit:
+                raise ImageTooLargeError(limit)
+            buffer.write(chunk)
+        IMAGE_FETCH_BYTES.observe(buffer.tell())
+        return buffer.getvalue()
+
+
+def preprocess_image(
+    data: bytes,
+    mime_type: Optional[str] = None,
+    max_edge: int = IMAGE_MAX_EDGE,
+    quality: int = IMAGE_QUALITY,
+) -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Prepares image bytes for the model: detects the real MIME type, applies
+    the EXIF orientation, scales the longest edge down to `max_edge` and
+    re-encodes as JPEG. The original is kept when re-encoding wouldn't make it
+    smaller (or Pillow isn't installed / can't read it).
+
+    Returns:
+        (bytes, mime type, info) where info has original_bytes, bytes, resized
+        and, when decoded, width and height.
+    """
+    mime_type = sniff_mime_type(data) or mime_type or "image/jpeg"
+    info: Dict[str, Any] = {"original_bytes": len(data), "bytes": len(data), "resized": False}
+    if not IMAGE_PREPROCESS or Image is None:
+        return data, mime_type, info
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if max(image.size) > max_edge:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                info["resized"] = True
+            info["width"], info["height"] = image.size
+
+            if image.mode in ("RGBA", "LA", "P"):
+                # JPEG has no alpha channel: flatten transparent areas onto white.
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=quality, optimize=True)
+    except Exception as e:
+        print(f"Warning: Could not preprocess image ({mime_type}), sending it unchanged: {e}")
+        return data, mime_type, info
+
+    encoded = output.getvalue()
+    if not info["resized"] and len(encoded) >= len(data):
+        return data, mime_type, info
+
+    info["bytes"] = len(encoded)
+    return encoded, "image/jpeg", info
@@ -0,0 +1,197 @@
+import heapq
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Ordinal used for batches whose expiry date is missing or unparsable, so they
+# are consumed last.
+NO_EXPIRY_ORDINAL = datetime.max.toordinal()
+
+
+def normalize_name(name: Any) -> str:
+    """Key used to match food names case-insensitively."""
+    return str(name or "").strip().lower()
+
+
+def expiry_ordinal(date_str: Any) -> int:
+    """Converts a DD/MM/YYYY string to a day ordinal, or NO_EXPIRY_ORDINAL if it can't be parsed."""
+    try:
+        return datetime.strptime(date_str, "%d/%m/%Y").toordinal()
+    except (ValueError, TypeError):
+        return NO_EXPIRY_ORDINAL
+
+
+# --- Derived Fields ---
+# Filled in whenever a batch is stored (see normalize_item), so read paths
+# (consumption, recipe prompts, analytics) never re-parse dates,
+# re-normalize names or re-divide nutrition totals:
+#   name_key        normalize_name(name)
+#   expiry_ordinal  expiry_ordinal(expected_expiry_date)
+#   per_unit        {"calories", "protein", "carbs", "fats"} for one unit
+#   per_unit_basis  the nutrition totals per_unit was divided from
+
+MACROS = ("calories", "protein", "carbs", "fats")
+DERIVED_FIELDS = ("name_key", "expiry_ordinal", "per_unit", "per_unit_basis")
+
+
+def normalize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds the derived fields to a batch in place and returns it.
+
+    The name key and expiry ordinal are always recomputed, since the name or
+    date may have been edited. Per-unit nutrition is recomputed when it is
+    missing or the nutrition totals differ from the ones it was divided from
+    (an edit). Consumption only lowers the quantity and leaves the totals as
+    they were, so re-dividing then would overstate it; it is kept instead.
+    """
+    item["name_key"] = normalize_name(item.get("name"))
+    item["expiry_ordinal"] = expiry_ordinal(item.get("expected_expiry_date"))
+    totals = {macro: item.get(macro) for macro in MACROS}
+    # Batches stored before per_unit_basis existed keep their per_unit.
+    basis = item.get("per_unit_basis", totals)
+    if not isinstance(item.get("per_unit"), dict) or basis != totals:
+        quantity = item.get("quantity")
+        has_quantity = isinstance(quantity, (int, float)) and quantity > 0
+        item["per_unit"] = {
+            macro: round(item[macro] / quantity, 3) if has_quantity and isinstance(item.get(macro), (int, float)) else 0
+            for macro in MACROS
+        }
+    item["per_unit_basis"] = totals
+    return item
+
+
+def needs_normalizing(item: Dict[str, Any]) -> bool:
+    return any(field not in item for field in DERIVED_FIELDS)
+
+
+def item_name_key(item: Dict[str, Any]) -> str:
+    """The stored name key, falling back to normalizing the name for batches from before it existed."""
+    key = item.get("name_key")
+    return key if isinstance(key, str) else normalize_name(item.get("name"))
+
+
+def item_expiry_ordinal(item: Dict[str, Any]) -> int:
+    """The stored expiry ordinal, falling back to parsing the date for batches from before it existed."""
+    ordinal = item.get("expiry_ordinal")
+    return ordinal if isinstance(ordinal, int) else expiry_ordinal(item.get("expected_expiry_date"))
+
+
+class Inventory:
+    """
+    In-memory view of a bin's inventory built for fast FIFO consumption.
+
+    Batches are indexed by normalized name; each name holds a min-heap of
+    (expiry ordinal, insertion sequence) so the earliest-expiring batch is
+    always on top. The name key and expiry ordinal come from the batch's
+    stored derived fields, so building the index parses nothing.
+    Consuming M names therefore costs O(M log k) for k batches per name,
+    instead of rescanning and re-sorting the whole list for every name.
+
+    The insertion-ordered `_batches` dict keeps the original list order, so
+    to_record() round-trips the {"inventory": [...]} JSON shape unchanged
+    apart from the consumed quantities.
+    """
+
+    def __init__(self, items: Optional[List[Dict[str, Any]]] = None):
+        self._batches: Dict[int, Dict[str, Any]] = {}
+        self._by_name: Dict[str, List[Tuple[int, int]]] = {}
+        self._next_seq = 0
+        for item in items or []:
+            self.add(item)
+
+    @classmethod
+    def from_record(cls, record: Optional[Dict[str, Any]]) -> "Inventory":
+        return cls((record or {}).get("inventory", []) or [])
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"inventory": list(self._batches.values())}
+
+    def __len__(self) -> int:
+        return len(self._batches)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._batches.values())
+
+    def add(self, item: Dict[str, Any]) -> None:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._batches[seq] = item
+        heap = self._by_name.setdefault(item_name_key(item), [])
+        heapq.heappush(heap, (item_expiry_ordinal(item), seq))
+
+    def extend(self, items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            self.add(item)
+
+    def batches(self, name: str) -> List[Dict[str, Any]]:
+        """Returns the batches for a name, earliest expiry first."""
+        return [self._batches[seq] for _, seq in sorted(self._by_name.get(normalize_name(name), []))]
+
+    def consume(self, name: str, amount: float) -> Tuple[float, float]:
+        """
+        Removes `amount` of `name`, taking from the earliest-expiring batch first.
+        Depleted batches are dropped; only the quantity of a partly used batch
+        changes. Batches with a non-numeric or non-positive quantity are left
+        untouched.
+
+        Returns:
+            (amount actually consumed, amount that could not be found)
+        """
+        key = normalize_name(name)
+        heap = self._by_name.get(key)
+        if not heap:
+            return 0, amount
+
+        remaining = amount
+        consumed = 0
+        unusable: List[Tuple[int, int]] = []
+
+        while remaining > 0 and heap:
+            seq = heap[0][1]
+            batch = self._batches[seq]
+            quantity = batch.get("quantity")
+
+            if not isinstance(quantity, (int, float)) or quantity <= 0:
+                unusable.append(heapq.heappop(heap))
+                continue
+
+            if quantity > remaining:
+                batch["quantity"] = quantity - remaining
+                consumed += remaining
+                remaining = 0
+            else:
+                heapq.heappop(heap)
+                del self._batches[seq]
+                consumed += quantity
+                remaining -= quantity
+
+        for entry in unusable:
+            heapq.heappush(heap, entry)
+        if not heap:
+            del self._by_name[key]
+
+        return consumed, remaining
+
+    def consume_many(self, consumed_map: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Applies a {name: amount} consumption map and returns a per-item report of
+        {"requested", "consumed", "shortfall", "status"}, where status is one of
+        "consumed", "partial", "missing" or "invalid".
+        """
+        report: Dict[str, Dict[str, Any]] = {}
+        for name, amount in consumed_map.items():
+            if not (isinstance(amount, (int, float)) and amount > 0):
+                report[name] = {"requested": amount, "consumed": 0, "shortfall": 0, "status": "invalid"}
+                continue
+
+            if normalize_name(name) not in self._by_name:
+                report[name] = {"requested": amount, "consumed": 0, "shortfall": amount, "status": "missing"}
+                continue
+
+            consumed, shortfall = self.consume(name, amount)
+            report[name] = {
+                "requested": amount,
+                "consumed": consumed,
+                "shortfall": shortfall,
+                "status": "partial" if shortfall > 0 else "consumed",
+            }
+        return report
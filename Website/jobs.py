@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# =================================================================
+# JOB CONFIGURATION
+# Slow model-backed work (/analyze, /api/generate-recipes) can run as a
+# background job so request threads return right away. At most
+# FOOGIE_JOB_WORKERS jobs run at once and FOOGIE_JOB_QUEUE_SIZE more may wait;
+# beyond that, submissions are refused so callers can back off.
+# =================================================================
+JOB_WORKERS = int(os.getenv("FOOGIE_JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("FOOGIE_JOB_QUEUE_SIZE", "32"))
+JOB_RESULT_TTL = float(os.getenv("FOOGIE_JOB_RESULT_TTL", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised by JobManager.submit when the worker pool and its queue are both full."""
+
+
+class Job:
+    """
+    One unit of background work. `fn` returns a (payload, HTTP status) tuple,
+    like the route helpers in app.py; both are kept as the job result.
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.result: Optional[Any] = None
+        self.result_status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+        # Notified on every status change, so SSE streams can wait instead of polling.
+        self.changed = threading.Condition()
+
+    def _set_status(self, status: str) -> None:
+        with self.changed:
+            self.status = status
+            if status == RUNNING:
+                self.started_at = time.time()
+            elif status in FINISHED_STATES:
+                self.finished_at = time.time()
+            self.changed.notify_all()
+
+    def wait_for_change(self, last_status: str, timeout: float) -> str:
+        """Blocks until the status differs from `last_status` (or the timeout passes)."""
+        with self.changed:
+            if self.status == last_status:
+                self.changed.wait(timeout)
+            return self.status
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == DONE:
+            job["result"] = self.result
+            job["result_status"] = self.result_status
+        elif self.status == FAILED:
+            job["error"] = self.error
+        return job
+
+
+class JobManager:
+    """Bounded worker pool plus an in-memory registry of recent jobs."""
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE, result_ttl: float = JOB_RESULT_TTL):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        # Counts queued + running jobs; acquiring it is how a submission gets a slot.
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(f"Job queue is full ({self.workers} running, {self.queue_size} waiting)")
+
+        self._prune()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        job.future.add_done_callback(lambda _: self._slots.release())
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job._set_status(RUNNING)
+        try:
+            job.result, job.result_status = fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job._set_status(FAILED)
+        else:
+            job._set_status(DONE)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancels a job that hasn't started yet. Running jobs are mid model call
+        and can't be interrupted, so they are left to finish.
+        """
+        job = self.get(job_id)
+        if job is None or job.future is None or not job.future.cancel():
+            return False
+        # The done callback also fires for cancelled futures, which frees the slot.
+        job._set_status(CANCELLED)
+        return True
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": counts.get(QUEUED, 0),
+                "running": counts.get(RUNNING, 0),
+                "tracked": len(self._jobs),
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,78 @@
+import json
+from typing import Any, List
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a JSON array of objects that arrives in chunks,
+    e.g. streamed model output like '```json\\n[{"name": ...}, {...}]\\n```'.
+
+    feed() returns every top-level object that was completed by the new text,
+    so each one can be used before the rest of the array has arrived. Text
+    before the opening '[' (such as a code fence) is skipped. Each character is
+    scanned once, tracking nesting depth and string/escape state, so braces
+    inside strings don't confuse it.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = -1
+        self.done = False
+        self.count = 0
+
+    def feed(self, text: str) -> List[Any]:
+        objects: List[Any] = []
+        if self.done or not text:
+            return objects
+
+        self._buffer += text
+        buffer = self._buffer
+        pos = self._pos
+
+        while pos < len(buffer):
+            char = buffer[pos]
+
+            if not self._in_array:
+                if char == "[":
+                    self._in_array = True
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._object_start = pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the outer array.
+                    self.done = True
+                    pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buffer[self._object_start:pos + 1]))
+                        self.count += 1
+                    except json.JSONDecodeError as e:
+                        print(f"Warning: Skipping malformed streamed element: {e}")
+                    self._object_start = -1
+            pos += 1
+
+        # Only keep the unfinished element around; everything before it is done with.
+        keep_from = self._object_start if self._object_start >= 0 else pos
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._object_start >= 0:
+            self._object_start = 0
+        return objects
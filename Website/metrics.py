@@ -0,0 +1,231 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+# =================================================================
+# METRICS CONFIGURATION
+# In-process counters and histograms for the hot paths (storage reads and
+# writes, image fetches, Gemini calls, JSON parsing, consumption), exposed in
+# the Prometheus text format on /metrics. Recording a value is a bisect and a
+# few additions under a lock, so it stays on in production;
+# FOOGIE_METRICS=0 turns every hook into a no-op.
+# =================================================================
+METRICS_ENABLED = os.getenv("FOOGIE_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Bucket upper bounds (seconds / bytes); +Inf is added automatically.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (
+        name + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}_total{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, as Prometheus expects:
+    `<name>_bucket{le=...}`, `<name>_sum` and `<name>_count`.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[LabelKey, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observes the wall time of the `with` block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels: Any) -> Dict[str, Any]:
+        """{"count", "sum", "buckets": {le: cumulative count}} for one label set."""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            counts, total, count = (list(series[0]), series[1], series[2]) if series else ([0] * (len(self.buckets) + 1), 0.0, 0)
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            running += bucket_count
+            cumulative[_format_value(bound)] = running
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in series:
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Holds the metrics and renders them for /metrics. Collectors are callbacks
+    run at scrape time for values that already live elsewhere (cache
+    counters), so they cost nothing between scrapes.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], List[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def add_collector(self, collector: Callable[[], List[Tuple[str, str, str, Dict[str, Any], float]]]) -> None:
+        """`collector()` returns (name, type, help, labels, value) samples."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            # In the 0.0.4 format a counter's family name is its sample name, "_total" included.
+            name = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+
+        # Samples of one metric have to be contiguous, so group them by name first.
+        families: Dict[str, List[Any]] = {}
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, labels, value in samples:
+                family = families.setdefault(name, [kind, documentation, []])
+                family[2].append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        for name, (kind, documentation, samples) in families.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- Hot-Path Metrics ---
+
+STORAGE_LATENCY = REGISTRY.histogram(
+    "foogie_storage_seconds", "Storage backend read/write latency by backend and operation."
+)
+IMAGE_FETCH_LATENCY = REGISTRY.histogram("foogie_image_fetch_seconds", "Time to download an image URL.")
+IMAGE_FETCH_BYTES = REGISTRY.histogram("foogie_image_fetch_bytes", "Size of downloaded images.", SIZE_BUCKETS)
+MODEL_LATENCY = REGISTRY.histogram(
+    "foogie_gemini_seconds", "Gemini call latency by endpoint (until the full answer for streams)."
+)
+MODEL_REQUEST_BYTES = REGISTRY.histogram(
+    "foogie_gemini_request_bytes", "Prompt text plus inline image bytes sent to Gemini.", SIZE_BUCKETS
+)
+MODEL_RESPONSE_BYTES = REGISTRY.histogram(
+    "foogie_gemini_response_bytes", "Size of the text Gemini returned.", SIZE_BUCKETS
+)
+MODEL_ERRORS = REGISTRY.counter("foogie_gemini_errors", "Gemini calls that raised, by endpoint.")
+PARSE_LATENCY = REGISTRY.histogram("foogie_json_parse_seconds", "Time to extract and validate model JSON, by kind.")
+CONSUME_LATENCY = REGISTRY.histogram("foogie_consume_seconds", "Time spent applying a consumption map to an inventory.")
+REQUEST_LATENCY = REGISTRY.histogram("foogie_http_request_seconds", "Flask request latency by endpoint and status.")
+
+
+def cache_collector(*caches) -> Callable[[], List[Tuple[str, str, str, Dict[str, Any], float]]]:
+    """Collector exposing hits, misses, size and hit ratio of objects with a TTLCache-style stats()."""
+
+    def collect():
+        samples = []
+        for cache in caches:
+            stats = cache.stats()
+            labels = {"cache": stats.get("name", "cache")}
+            samples.append(("foogie_cache_hits_total", "counter", "Cache hits.", labels, stats.get("hits", 0)))
+            samples.append(("foogie_cache_misses_total", "counter", "Cache misses.", labels, stats.get("misses", 0)))
+            samples.append(("foogie_cache_entries", "gauge", "Entries currently cached.", labels, stats.get("size", 0)))
+            samples.append(("foogie_cache_hit_ratio", "gauge", "Hits / lookups since start.", labels, stats.get("hit_ratio", 0.0)))
+        return samples
+
+    return collect
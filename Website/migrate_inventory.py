@@ -0,0 +1,36 @@
+"""
+One-time migration: adds the derived fields (name_key, expiry_ordinal,
+per_unit) to every batch of existing bins. Bins that are already migrated are
+left untouched, so it is safe to run more than once.
+
+Usage (from the Website directory):
+    python migrate_inventory.py <bin_id> [<bin_id> ...]
+"""
+import sys
+
+from dotenv import load_dotenv
+
+# Load .env before data/storage read their configuration from it.
+load_dotenv()
+
+import data  # noqa: E402
+
+
+def main():
+    bin_ids = sys.argv[1:]
+    if not bin_ids:
+        sys.exit(__doc__)
+
+    failed = False
+    for bin_id in bin_ids:
+        migrated = data.migrate_bin(bin_id)
+        if migrated is None:
+            print(f"❌ Could not migrate bin {bin_id}.")
+            failed = True
+        else:
+            print(f"Bin {bin_id}: {migrated} batch(es) updated.")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from metrics import REGISTRY
+
+# =================================================================
+# MODEL GOVERNOR CONFIGURATION
+# Every Gemini call goes through one ModelGovernor, which keeps bursts of
+# users from turning into quota errors:
+#   - at most FOOGIE_MODEL_MAX_CONCURRENCY calls in flight,
+#   - at most FOOGIE_MODEL_RPM calls per minute (token bucket, bursts of
+#     FOOGIE_MODEL_BURST); callers wait up to FOOGIE_MODEL_QUEUE_TIMEOUT
+#     seconds for a slot before getting a 503,
+#   - each attempt gives up after FOOGIE_MODEL_TIMEOUT seconds (app.py also
+#     sets it as the Gemini client's HTTP timeout), and quota, overload and
+#     timeout errors are retried FOOGIE_MODEL_MAX_RETRIES times
+#     with jittered exponential backoff,
+#   - identical prompts already in flight share one call (single-flight),
+#   - with FOOGIE_MODEL_HEDGE_AFTER > 0, a second copy of a call that hasn't
+#     answered after that many seconds is sent and the first answer wins.
+# =================================================================
+MODEL_MAX_CONCURRENCY = int(os.getenv("FOOGIE_MODEL_MAX_CONCURRENCY", "8"))
+MODEL_RPM = float(os.getenv("FOOGIE_MODEL_RPM", "60"))  # 0 = no rate limit
+MODEL_BURST = int(os.getenv("FOOGIE_MODEL_BURST", "10"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("FOOGIE_MODEL_QUEUE_TIMEOUT", "10"))
+MODEL_TIMEOUT = float(os.getenv("FOOGIE_MODEL_TIMEOUT", "60"))
+MODEL_MAX_RETRIES = int(os.getenv("FOOGIE_MODEL_MAX_RETRIES", "3"))
+MODEL_BACKOFF = float(os.getenv("FOOGIE_MODEL_BACKOFF", "0.5"))
+MODEL_HEDGE_AFTER = float(os.getenv("FOOGIE_MODEL_HEDGE_AFTER", "0"))  # 0 = no hedging
+
+# HTTP codes and API statuses worth another attempt (quota, overload, transient).
+RETRY_CODES = (408, 429, 500, 502, 503, 504)
+RETRY_STATUSES = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL")
+
+GOVERNOR_EVENTS = REGISTRY.counter(
+    "foogie_model_governor_events",
+    "Model governor decisions: retry, timeout, throttled, rejected, joined, hedge, hedge_won.",
+)
+
+
+class ModelUnavailableError(Exception):
+    """The model couldn't answer in time (quota, overload, timeouts); the caller should try again later."""
+
+    def __init__(self, message: str, retry_after: float = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ModelBusyError(ModelUnavailableError):
+    """No concurrency slot or rate-limit token became free within the queue timeout."""
+
+
+class ModelTimeoutError(ModelUnavailableError):
+    """One attempt took longer than the per-call timeout."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Quota, overload, timeout and connection errors; not bad requests or auth failures."""
+    if isinstance(error, ModelBusyError):
+        return False  # already waited the full queue timeout
+    if isinstance(error, (ModelTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRY_CODES
+    # httpx transport errors (the SDK's HTTP timeouts raise TimeoutException subclasses), without importing httpx
+    if any(cls.__name__ in ("ConnectError", "TimeoutException", "RemoteProtocolError") for cls in type(error).__mro__):
+        return True
+    message = str(error)
+    return any(status in message for status in RETRY_STATUSES) or message.startswith(("429", "503"))
+
+
+def request_key(*parts: Any) -> str:
+    """Stable digest of a model request (model, prompt parts, config) for single-flight."""
+    digest = hashlib.sha256()
+
+    def feed(value: Any) -> None:
+        if isinstance(value, (bytes, bytearray)):
+            digest.update(b"b%d:" % len(value))
+            digest.update(value)
+        elif isinstance(value, dict):
+            digest.update(b"{")
+            for key in sorted(value, key=str):
+                feed(str(key))
+                feed(value[key])
+            digest.update(b"}")
+        elif isinstance(value, (list, tuple)):
+            digest.update(b"[")
+            for item in value:
+                feed(item)
+            digest.update(b"]")
+        else:
+            text = repr(value).encode("utf-8")
+            digest.update(b"s%d:" % len(text))
+            digest.update(text)
+
+    for part in parts:
+        feed(part)
+    return digest.hexdigest()
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`. A rate of 0 never limits."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: float) -> bool:
+        """Takes a token, waiting up to `timeout` seconds for one to accrue."""
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_for = (1 - self._tokens) / self.rate
+            if time.monotonic() + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class ModelGovernor:
+    """
+    Runs model calls under a concurrency cap and rate limit, with timeouts,
+    retries, hedging and single-flight deduplication. Client-agnostic: callers
+    pass a zero-argument function that makes the actual call, e.g.
+
+        governor.call(lambda: client.models.generate_content(...), key=request_key(...))
+
+    A call that times out keeps its slot until the underlying request really
+    returns, so timeouts never push more traffic at an overloaded API.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MODEL_MAX_CONCURRENCY,
+        rpm: float = MODEL_RPM,
+        burst: int = MODEL_BURST,
+        queue_timeout: float = MODEL_QUEUE_TIMEOUT,
+        timeout: float = MODEL_TIMEOUT,
+        max_retries: int = MODEL_MAX_RETRIES,
+        backoff: float = MODEL_BACKOFF,
+        hedge_after: float = MODEL_HEDGE_AFTER,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.bucket = TokenBucket(rpm / 60, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # One thread per slot; both stay taken until the underlying call returns.
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="model-call")
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.active = 0
+
+    def _count(self, event: str) -> None:
+        with self._counts_lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+        GOVERNOR_EVENTS.inc(event=event)
+
+    # --- Admission ---
+
+    def _admit(self, deadline: float) -> None:
+        """Waits for a rate-limit token and a concurrency slot, or raises ModelBusyError."""
+        if not self.bucket.try_acquire():
+            self._count("throttled")
+            if not self.bucket.acquire(max(0.0, deadline - time.monotonic())):
+                self._count("rejected")
+                raise ModelBusyError("Model rate limit reached, try again shortly", retry_after=self._retry_after())
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._count("rejected")
+            raise ModelBusyError("Too many model calls in progress, try again shortly", retry_after=5)
+        with self._counts_lock:
+            self.active += 1
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._counts_lock:
+            self.active -= 1
+        self._slots.release()
+
+    def _retry_after(self) -> float:
+        rate = self.bucket.rate
+        return max(1.0, round(1 / rate)) if rate > 0 else 1.0
+
+    def _start(self, fn: Callable[[], Any]) -> Future:
+        """Submits one already-admitted attempt; its slot is freed when it actually finishes."""
+        future = self._executor.submit(fn)
+        future.add_done_callback(self._release)
+        return future
+
+    # --- Calls ---
+
+    def _attempt(self, fn: Callable[[], Any], timeout: float) -> Any:
+        self._admit(time.monotonic() + self.queue_timeout)
+        futures = [self._start(fn)]
+        deadline = time.monotonic() + timeout
+
+        if self.hedge_after > 0:
+            done, _ = wait(futures, timeout=min(self.hedge_after, timeout))
+            # Hedge only with spare capacity; never queue behind other callers for it.
+            if not done and self._slots.acquire(blocking=False):
+                if self.bucket.try_acquire():
+                    with self._counts_lock:
+                        self.active += 1
+                    self._count("hedge")
+                    futures.append(self._start(fn))
+                else:
+                    self._slots.release()
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count("hedge_won")
+                    return future.result()
+                error = error or future.exception()
+        # A failed attempt's own error beats a timeout from one still hanging.
+        if error is not None:
+            raise error
+        self._count("timeout")
+        raise ModelTimeoutError(f"Model call timed out after {timeout:g}s")
+
+    def _call_with_retries(self, fn: Callable[[], Any], max_retries: int, timeout: float) -> Any:
+        for attempt in range(max_retries + 1):
+            try:
+                return self._attempt(fn, timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if attempt == max_retries:
+                    if isinstance(e, ModelUnavailableError):
+                        raise
+                    raise ModelUnavailableError(f"Model unavailable after {attempt + 1} attempt(s): {e}") from e
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"   ⚠️ Model call failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                self._count("retry")
+                time.sleep(delay)
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        key: Optional[str] = None,
+        max_retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Returns fn()'s result, run under the governor's limits. Calls with the
+        same `key` that overlap in time share the first one's result (or error).
+        `max_retries` and `timeout` override the governor's defaults for this call.
+
+        Raises:
+            ModelUnavailableError: no capacity, or still failing after the retries.
+            Any non-retryable error from fn() unchanged.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        timeout = self.timeout if timeout is None else timeout
+        if key is None:
+            return self._call_with_retries(fn, max_retries, timeout)
+
+        with self._inflight_lock:
+            leader = self._inflight.get(key)
+            if leader is None:
+                shared = self._inflight[key] = Future()
+        if leader is not None:
+            self._count("joined")
+            return leader.result()
+
+        try:
+            result = self._call_with_retries(fn, max_retries, timeout)
+            shared.set_result(result)
+            return result
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, fn: Callable[[], Iterable[Any]], max_retries: Optional[int] = None) -> Iterator[Any]:
+        """
+        Yields the chunks of a streaming call under the same concurrency and
+        rate limits, holding a slot until the stream ends. Failures before the
+        first chunk are retried like call(); after that they are raised as-is,
+        since chunks have already been handed out. There is no per-call timeout.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            self._admit(time.monotonic() + self.queue_timeout)
+            started = False
+            try:
+                for chunk in fn():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_retryable(e):
+                    raise
+                if attempt == max_retries:
+                    raise ModelUnavailableError(f"Model unavailable after {attempt + 1} attempt(s): {e}") from e
+                self._count("retry")
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"   ⚠️ Model stream failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            finally:
+                self._release()
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counts_lock:
+            counts = dict(self.counts)
+            active = self.active
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": active,
+            "rate_per_minute": round(self.bucket.rate * 60, 2),
+            "tokens_available": round(self.bucket.available(), 2) if self.bucket.rate > 0 else None,
+            "timeout": self.timeout,
+            "max_retries": self.max_retries,
+            "hedge_after": self.hedge_after or None,
+            "events": counts,
+        }
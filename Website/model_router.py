@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from metrics import REGISTRY
+from model_governor import ModelBusyError, ModelGovernor, ModelUnavailableError
+
+# =================================================================
+# MODEL ROUTING CONFIGURATION
+# Picks the Gemini model per request instead of pinning one:
+#   - small requests (an analyze payload up to FOOGIE_LIGHT_MAX_ANALYZE_BYTES,
+#     a recipe prompt up to FOOGIE_LIGHT_MAX_RECIPES_BYTES asking for at most
+#     FOOGIE_LIGHT_MAX_RECIPES recipes) try FOOGIE_LIGHT_MODEL first,
+#     everything else FOOGIE_MODEL; leave FOOGIE_LIGHT_MODEL empty to always
+#     use FOOGIE_MODEL,
+#   - on quota errors, timeouts or an unknown model the next model in line is
+#     tried (then FOOGIE_FALLBACK_MODELS, comma-separated); every model but
+#     the last gets one attempt, cut off at the endpoint's latency budget,
+#   - each model's latency and success rate per endpoint are tracked; a model
+#     that keeps failing or runs over the budget moves to the back of the line
+#     for FOOGIE_MODEL_RECOVERY seconds, then gets traffic again.
+# =================================================================
+DEFAULT_MODEL = os.getenv("FOOGIE_MODEL", "gemini-2.0-flash")
+LIGHT_MODEL = os.getenv("FOOGIE_LIGHT_MODEL", "gemini-2.0-flash-lite")
+FALLBACK_MODELS = [name.strip() for name in os.getenv("FOOGIE_FALLBACK_MODELS", "").split(",") if name.strip()]
+LIGHT_MAX_ANALYZE_BYTES = int(os.getenv("FOOGIE_LIGHT_MAX_ANALYZE_BYTES", "200000"))
+LIGHT_MAX_RECIPES_BYTES = int(os.getenv("FOOGIE_LIGHT_MAX_RECIPES_BYTES", "6000"))
+LIGHT_MAX_RECIPES = int(os.getenv("FOOGIE_LIGHT_MAX_RECIPES", "3"))
+LATENCY_BUDGETS = {
+    "analyze": float(os.getenv("FOOGIE_LATENCY_BUDGET_ANALYZE", "10")),
+    "recipes": float(os.getenv("FOOGIE_LATENCY_BUDGET_RECIPES", "20")),
+}
+MODEL_RECOVERY = float(os.getenv("FOOGIE_MODEL_RECOVERY", "60"))
+
+# Stats smoothing, and how much evidence it takes to demote a model.
+EWMA_ALPHA = 0.2
+MIN_SAMPLES = 5
+MIN_SUCCESS_RATE = 0.7
+
+ROUTED_CALLS = REGISTRY.counter(
+    "foogie_model_routed_calls",
+    "Model calls by endpoint, model and outcome (ok, error, fallback).",
+)
+
+
+def budget_for(endpoint: str) -> float:
+    """Latency budget in seconds; recipes_stream shares the recipes budget."""
+    return LATENCY_BUDGETS.get(endpoint.split("_")[0], LATENCY_BUDGETS["recipes"])
+
+
+def should_fall_back(error: BaseException) -> bool:
+    """Errors another model might not hit: quota, overload, timeouts and unknown model names."""
+    if isinstance(error, ModelBusyError):
+        return False  # our own limiter, shared by every model
+    return isinstance(error, ModelUnavailableError) or getattr(error, "code", None) == 404
+
+
+class ModelStats:
+    """Smoothed latency and success rate of one model on one endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+        self.success = 1.0
+        self.last_used = 0.0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        self.calls += 1
+        self.last_used = time.monotonic()
+        if ok:
+            self.latency = seconds if self.latency is None else (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * seconds
+        else:
+            self.failures += 1
+        self.success = (1 - EWMA_ALPHA) * self.success + EWMA_ALPHA * (1.0 if ok else 0.0)
+
+    def degraded(self, budget: float) -> bool:
+        if self.calls < MIN_SAMPLES or time.monotonic() - self.last_used > MODEL_RECOVERY:
+            return False
+        return self.success < MIN_SUCCESS_RATE or (self.latency is not None and self.latency > budget)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_ewma": round(self.latency, 3) if self.latency is not None else None,
+            "success_ewma": round(self.success, 3),
+        }
+
+
+class ModelRouter:
+    """
+    Chooses the model for each call and falls back along the candidate list,
+    running every attempt through the shared ModelGovernor.
+
+        response = router.call("analyze", lambda model: client.models.generate_content(model=model, ...),
+                               payload_bytes=len(image))
+    """
+
+    def __init__(
+        self,
+        governor: ModelGovernor,
+        default_model: str = DEFAULT_MODEL,
+        light_model: Optional[str] = LIGHT_MODEL,
+        fallback_models: Optional[List[str]] = None,
+    ):
+        self.governor = governor
+        self.default_model = default_model
+        self.light_model = light_model or None
+        self.fallback_models = FALLBACK_MODELS if fallback_models is None else fallback_models
+        self._stats: Dict[tuple, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def is_light(self, endpoint: str, payload_bytes: int, num_recipes: int = 0) -> bool:
+        if endpoint == "analyze":
+            return payload_bytes <= LIGHT_MAX_ANALYZE_BYTES
+        return payload_bytes <= LIGHT_MAX_RECIPES_BYTES and num_recipes <= LIGHT_MAX_RECIPES
+
+    def route(self, endpoint: str, payload_bytes: int = 0, num_recipes: int = 0) -> List[str]:
+        """Models to try, in order: by request size first, then degraded models last."""
+        preferred = [self.default_model]
+        if self.light_model:
+            if self.is_light(endpoint, payload_bytes, num_recipes):
+                preferred.insert(0, self.light_model)
+            else:
+                preferred.append(self.light_model)
+        candidates = []
+        for model in preferred + self.fallback_models:
+            if model not in candidates:
+                candidates.append(model)
+        budget = budget_for(endpoint)
+        with self._lock:
+            degraded = {
+                model for model in candidates
+                if (model, endpoint) in self._stats and self._stats[(model, endpoint)].degraded(budget)
+            }
+        # Stable sort: healthy models keep their order ahead of degraded ones.
+        return sorted(candidates, key=lambda model: model in degraded)
+
+    def _get(self, model: str, endpoint: str) -> ModelStats:
+        stats = self._stats.get((model, endpoint))
+        if stats is None:
+            stats = self._stats[(model, endpoint)] = ModelStats()
+        return stats
+
+    def record(self, model: str, endpoint: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._get(model, endpoint).record(seconds, ok)
+
+    def _attempt_limits(self, endpoint: str, last: bool) -> Dict[str, Any]:
+        # Only the last candidate gets the governor's full retries and timeout.
+        return {} if last else {"max_retries": 0, "timeout": budget_for(endpoint)}
+
+    def call(
+        self,
+        endpoint: str,
+        call_model: Callable[[str], Any],
+        payload_bytes: int = 0,
+        num_recipes: int = 0,
+        key: Optional[Callable[[str], str]] = None,
+    ) -> Any:
+        """
+        Returns call_model(model) for the first candidate that answers. `key`
+        maps a model name to a single-flight key for the governor.
+        """
+        candidates = self.route(endpoint, payload_bytes, num_recipes)
+        for index, model in enumerate(candidates):
+            last = index == len(candidates) - 1
+            started = time.monotonic()
+            try:
+                response = self.governor.call(
+                    lambda model=model: call_model(model),
+                    key=key(model) if key else None,
+                    **self._attempt_limits(endpoint, last),
+                )
+            except Exception as e:
+                self.record(model, endpoint, time.monotonic() - started, ok=False)
+                if last or not should_fall_back(e):
+                    ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="error")
+                    raise
+                ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="fallback")
+                print(f"   ⚠️ {model} failed for {endpoint} ({e}); falling back to {candidates[index + 1]}")
+                continue
+            self.record(model, endpoint, time.monotonic() - started, ok=True)
+            ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="ok")
+            print(f"-> {endpoint} answered by {model} in {time.monotonic() - started:.2f}s")
+            return response
+
+    def stream(
+        self,
+        endpoint: str,
+        open_stream: Callable[[str], Iterable[Any]],
+        payload_bytes: int = 0,
+        num_recipes: int = 0,
+    ) -> Iterator[Any]:
+        """
+        Yields the chunks of open_stream(model) for the first candidate that
+        starts answering. Falling back is only possible before the first chunk.
+        """
+        candidates = self.route(endpoint, payload_bytes, num_recipes)
+        for index, model in enumerate(candidates):
+            last = index == len(candidates) - 1
+            limits = self._attempt_limits(endpoint, last)
+            limits.pop("timeout", None)  # streams have no per-call timeout
+            started = time.monotonic()
+            chunks = self.governor.stream(lambda model=model: open_stream(model), **limits)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self.record(model, endpoint, time.monotonic() - started, ok=True)
+                ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="ok")
+                return
+            except Exception as e:
+                self.record(model, endpoint, time.monotonic() - started, ok=False)
+                if last or not should_fall_back(e):
+                    ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="error")
+                    raise
+                ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="fallback")
+                print(f"   ⚠️ {model} failed for {endpoint} ({e}); falling back to {candidates[index + 1]}")
+                continue
+            print(f"-> {endpoint} streaming from {model}")
+            try:
+                yield first
+                yield from chunks
+            except GeneratorExit:
+                chunks.close()
+                raise
+            except Exception:
+                self.record(model, endpoint, time.monotonic() - started, ok=False)
+                ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="error")
+                raise
+            self.record(model, endpoint, time.monotonic() - started, ok=True)
+            ROUTED_CALLS.inc(endpoint=endpoint, model=model, outcome="ok")
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {f"{model}/{endpoint}": stats.snapshot() for (model, endpoint), stats in sorted(self._stats.items())}
+        return {
+            "default_model": self.default_model,
+            "light_model": self.light_model,
+            "fallback_models": self.fallback_models,
+            "latency_budgets": {endpoint: budget_for(endpoint) for endpoint in LATENCY_BUDGETS},
+            "models": models,
+        }
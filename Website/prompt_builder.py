@@ -0,0 +1,164 @@
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from inventory import MACROS, NO_EXPIRY_ORDINAL, item_expiry_ordinal, item_name_key
+
+# =================================================================
+# PROMPT BUILDER CONFIGURATION
+# The inventory part of the recipe prompt is capped at roughly
+# FOOGIE_PROMPT_INVENTORY_TOKENS tokens. Batches of the same food are merged
+# into one row, rows are ranked by expiry, and whatever doesn't fit is listed
+# by name only (or counted), latest-expiring first to go. Prompt size, and
+# with it model latency, therefore stays flat however full the fridge gets.
+# =================================================================
+PROMPT_INVENTORY_TOKENS = int(os.getenv("FOOGIE_PROMPT_INVENTORY_TOKENS", "1500"))
+
+# Share of the budget kept for the names of rows that don't fit in full.
+OVERFLOW_SHARE = 0.15
+
+# Rough English/JSON average; only used to stay under the budget, not for billing.
+CHARS_PER_TOKEN = 4
+
+# Weight/volume units get nutrition per 100 so small per-gram values don't round to 0.
+PER_100_UNITS = ("gram", "grams", "g", "ml", "milliliters")
+
+TABLE_HEADER = "#|name|type|qty|unit|expires|days left|per|kcal|protein g|carbs g|fats g"
+OVERFLOW_PREFIX = "Also available, expiring later (details omitted): "
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _number(value: Any) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def aggregate_inventory(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merges batches of the same food (same name key and unit) into one row with
+    summed quantity and nutrition and the earliest expiry, sorted earliest
+    expiry first. Uses the batches' stored derived fields where present.
+    """
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for item in items:
+        key = item_name_key(item)
+        unit = str(item.get("unit") or "units")
+        ordinal = item_expiry_ordinal(item)
+        quantity = _number(item.get("quantity"))
+        per_unit = item.get("per_unit")
+
+        row = rows.get((key, unit))
+        if row is None:
+            row = rows[(key, unit)] = {
+                "name": key or "unknown",
+                "type": item.get("type") or "food",
+                "unit": unit,
+                "quantity": 0,
+                "batches": 0,
+                "expiry_ordinal": ordinal,
+                "expected_expiry_date": item.get("expected_expiry_date", "Unknown"),
+                **{macro: 0 for macro in MACROS},
+            }
+        row["quantity"] += quantity
+        row["batches"] += 1
+        for macro in MACROS:
+            # Stored per-unit values stay right after partial consumption; totals don't.
+            row[macro] += _number(per_unit.get(macro)) * quantity if isinstance(per_unit, dict) else _number(item.get(macro))
+        if ordinal < row["expiry_ordinal"]:
+            row["expiry_ordinal"] = ordinal
+            row["expected_expiry_date"] = item.get("expected_expiry_date")
+
+    return sorted(rows.values(), key=lambda row: (row["expiry_ordinal"], row["name"]))
+
+
+def _days_left(ordinal: int, today: int) -> str:
+    if ordinal == NO_EXPIRY_ORDINAL:
+        return "?"
+    days = ordinal - today
+    return "EXPIRED" if days < 0 else "TODAY" if days == 0 else str(days)
+
+
+def _format_row(index: int, row: Dict[str, Any], today: int) -> str:
+    quantity = row["quantity"]
+    basis = 100 if row["unit"].lower() in PER_100_UNITS else 1
+    per_unit = [round(row[macro] * basis / quantity) if quantity > 0 else 0 for macro in MACROS]
+    quantity_text = round(quantity, 2) if isinstance(quantity, float) else quantity
+    return "|".join(str(value) for value in (
+        index, row["name"], row["type"], quantity_text, row["unit"],
+        row["expected_expiry_date"] or "?", _days_left(row["expiry_ordinal"], today),
+        f"{basis} {row['unit'].rstrip('s') if basis == 1 else row['unit']}",
+        *per_unit,
+    ))
+
+
+def build_inventory_table(
+    items: List[Dict[str, Any]],
+    token_budget: int = PROMPT_INVENTORY_TOKENS,
+    today: Optional[date] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Renders the inventory as a compact pipe-separated table, most urgent first,
+    within `token_budget` (estimated) tokens.
+
+    Returns:
+        (table text, stats) where stats has the batch/row counts, how many rows
+        were listed in full, only named or left out, the food types present,
+        and the estimated token count of the table.
+    """
+    today_ordinal = (today or date.today()).toordinal()
+    rows = aggregate_inventory(items)
+
+    lines = [
+        "Current Inventory (merged by food, sorted by expiry - USE EARLIEST EXPIRING FIRST).",
+        "Nutrition columns are PER UNIT: for the amount in the 'per' column, NOT the whole quantity.",
+        TABLE_HEADER,
+    ]
+    used = estimate_tokens("\n".join(lines))
+
+    row_lines = [_format_row(index, row, today_ordinal) for index, row in enumerate(rows, 1)]
+    row_costs = [estimate_tokens(line) + 1 for line in row_lines]
+    # When not everything fits, keep part of the budget for naming the rest,
+    # and at least enough for the overflow line itself.
+    overflow_cost = estimate_tokens(f"{OVERFLOW_PREFIX} and {len(rows)} more item(s)") + 1
+    row_budget = token_budget
+    if used + sum(row_costs) > token_budget:
+        row_budget -= max(int(token_budget * OVERFLOW_SHARE), overflow_cost)
+
+    listed = 0
+    for line, cost in zip(row_lines, row_costs):
+        if used + cost > row_budget:
+            break
+        lines.append(line)
+        used += cost
+        listed += 1
+
+    # Rows that didn't fit: name them while there's room, then just count the rest.
+    if listed < len(rows):
+        used += overflow_cost
+    named = []
+    for row in rows[listed:]:
+        cost = estimate_tokens(row["name"] + ", ")
+        if used + cost > token_budget:
+            break
+        named.append(row["name"])
+        used += cost
+    dropped = len(rows) - listed - len(named)
+    if named or dropped:
+        overflow = f"{OVERFLOW_PREFIX}{', '.join(named)}"
+        if dropped:
+            overflow += f"{' and ' if named else ''}{dropped} more item(s)"
+        lines.append(overflow)
+
+    table = "\n".join(lines)
+    stats = {
+        "batches": len(items),
+        "rows": len(rows),
+        "listed": listed,
+        "named_only": len(named),
+        "dropped": dropped,
+        "types": list(dict.fromkeys(row["type"] for row in rows)),
+        "inventory_tokens": estimate_tokens(table),
+    }
+    return table, stats
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from google.genai import types
+
+from metrics import REGISTRY
+from model_governor import is_retryable
+from prompt_builder import estimate_tokens
+
+# =================================================================
+# PROMPT CACHE CONFIGURATION
+# The analyze instructions and the recipe rules are the same on every call,
+# so they are uploaded once per model as Gemini cached content and each
+# request only sends the part that changes (date, photo, inventory,
+# preferences):
+#   - a cache lives FOOGIE_PROMPT_CACHE_TTL seconds on the model side and is
+#     extended when fewer than FOOGIE_PROMPT_CACHE_REFRESH seconds are left,
+#   - prefixes under FOOGIE_PROMPT_CACHE_MIN_TOKENS (estimated) aren't cached,
+#     nor prefixes under the model's own minimum for cached content (see
+#     MODEL_MIN_CACHE_TOKENS; counted with the API before the first create).
+#     The analyze and recipe prefixes are only ~1.1k tokens (estimated), so
+#     with the default gemini-2.0 models (4096-token minimum) they are sent
+#     inline and explicit caching does not apply; on the 2.5 Flash family it
+#     depends on the API's count landing above 1024. The prefix still goes
+#     first either way, so the model's implicit prefix caching can apply,
+#   - if a cache can't be created the prefix is sent inline as before; after
+#     a transient error (quota, overload, timeout) caching is retried for that
+#     model after FOOGIE_PROMPT_CACHE_RETRY seconds, after a rejection (old
+#     SDK, unsupported model, prefix too small) it isn't tried again.
+# FOOGIE_PROMPT_CACHE=0 turns it off.
+# =================================================================
+PROMPT_CACHE_ENABLED = os.getenv("FOOGIE_PROMPT_CACHE", "1").lower() not in ("0", "false", "no")
+PROMPT_CACHE_TTL = int(os.getenv("FOOGIE_PROMPT_CACHE_TTL", "3600"))
+PROMPT_CACHE_REFRESH = int(os.getenv("FOOGIE_PROMPT_CACHE_REFRESH", "300"))
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("FOOGIE_PROMPT_CACHE_MIN_TOKENS", "1024"))
+PROMPT_CACHE_RETRY = float(os.getenv("FOOGIE_PROMPT_CACHE_RETRY", "600"))
+
+# Smallest prefix each model accepts as cached content, by model name prefix
+# (first match wins); other models need DEFAULT_MIN_CACHE_TOKENS.
+MODEL_MIN_CACHE_TOKENS = (
+    ("gemini-2.5-flash", 1024),
+    ("gemini-2.5-pro", 2048),
+)
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+# A cached call failing with this status means the cached content is gone
+# (expired or deleted). Other errors only count as stale when they name the
+# cached content; anything else is the call's own error and is re-raised.
+STALE_CACHE_CODE = 404
+STALE_CACHE_MARKERS = ("cachedcontent", "cached content", "cached_content")
+
+PROMPT_CACHE_EVENTS = REGISTRY.counter(
+    "foogie_prompt_cache_events",
+    "Prompt prefix cache: hit, inline, created, refreshed, too_small, create_failed, invalidated.",
+)
+
+
+def prefix_digest(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+
+def model_min_cache_tokens(model: str) -> int:
+    name = model.split("/")[-1]
+    for prefix, tokens in MODEL_MIN_CACHE_TOKENS:
+        if name.startswith(prefix):
+            return tokens
+    return DEFAULT_MIN_CACHE_TOKENS
+
+
+def is_stale_cache_error(error: BaseException) -> bool:
+    if getattr(error, "code", None) == STALE_CACHE_CODE:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in STALE_CACHE_MARKERS)
+
+
+class CachedPrefix:
+    """One prefix uploaded for one model: its cache name and when it expires (monotonic)."""
+
+    def __init__(self, name: Optional[str], expires: float, tokens: int):
+        self.name = name  # None: not cached, don't try again before `expires` (inf: never)
+        self.expires = expires
+        self.tokens = tokens
+
+
+class PromptCache:
+    """
+    Keeps one Gemini cached-content entry per (model, prompt prefix), creating
+    it on first use and extending its TTL before it runs out.
+
+        contents, config = prompt_cache.request(client, model, PREFIX, parts, config)
+        client.models.generate_content(model=model, contents=contents, config=config)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = PROMPT_CACHE_ENABLED,
+        ttl: int = PROMPT_CACHE_TTL,
+        refresh: int = PROMPT_CACHE_REFRESH,
+        min_tokens: int = PROMPT_CACHE_MIN_TOKENS,
+        retry: float = PROMPT_CACHE_RETRY,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.refresh = min(refresh, ttl // 2)
+        self.min_tokens = min_tokens
+        self.retry = retry
+        self.entries: Dict[tuple, CachedPrefix] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+        PROMPT_CACHE_EVENTS.inc(event=event)
+
+    def _key_lock(self, key: tuple) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def lookup(self, client: Any, model: str, prefix: str) -> Optional[str]:
+        """Name of the cached content holding `prefix` for `model`, or None to send it inline."""
+        if not self.enabled or estimate_tokens(prefix) < self.min_tokens:
+            return None
+        key = (model, prefix_digest(prefix))
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires - time.monotonic() > (self.refresh if entry.name else 0):
+            return entry.name
+        # One thread creates or refreshes; the others wait for its result.
+        with self._key_lock(key):
+            entry = self.entries.get(key)
+            now = time.monotonic()
+            if entry is not None and entry.expires - now > (self.refresh if entry.name else 0):
+                return entry.name
+            if entry is not None and entry.name and entry.expires > now and self._extend(client, entry):
+                return entry.name
+            return self._create(client, model, prefix, key)
+
+    def _extend(self, client: Any, entry: CachedPrefix) -> bool:
+        try:
+            client.caches.update(name=entry.name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+        except Exception as e:
+            print(f"   ⚠️ Could not refresh prompt cache {entry.name} ({e}); creating a new one")
+            return False
+        entry.expires = time.monotonic() + self.ttl
+        self._count("refreshed")
+        return True
+
+    def _count_tokens(self, client: Any, model: str, prefix: str) -> int:
+        """The prefix's token count for `model` from the API, or the local estimate if that fails."""
+        try:
+            return client.models.count_tokens(model=model, contents=prefix).total_tokens
+        except Exception as e:
+            print(f"   ⚠️ Could not count prompt prefix tokens for {model} ({e}); using the estimate")
+            return estimate_tokens(prefix)
+
+    def _create(self, client: Any, model: str, prefix: str, key: tuple) -> Optional[str]:
+        minimum = model_min_cache_tokens(model)
+        tokens = estimate_tokens(prefix)
+        if tokens >= minimum // 2:  # clearly too small needs no API call
+            tokens = self._count_tokens(client, model, prefix)
+        if tokens < minimum:
+            print(f"-> ~{tokens}-token prompt prefix is below {model}'s {minimum}-token cache minimum; sending it inline")
+            self.entries[key] = CachedPrefix(None, float("inf"), tokens)
+            self._count("too_small")
+            return None
+        try:
+            cached = client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                    ttl=f"{self.ttl}s",
+                    display_name=f"foogie-prefix-{key[1][:12]}",
+                ),
+            )
+        except Exception as e:
+            print(f"   ⚠️ Prompt caching unavailable for {model} ({e}); sending the prompt in full")
+            retry_at = time.monotonic() + self.retry if is_retryable(e) else float("inf")
+            self.entries[key] = CachedPrefix(None, retry_at, tokens)
+            self._count("create_failed")
+            return None
+        print(f"-> Cached ~{tokens}-token prompt prefix for {model} as {cached.name}")
+        self.entries[key] = CachedPrefix(cached.name, time.monotonic() + self.ttl, tokens)
+        self._count("created")
+        return cached.name
+
+    def invalidate(self, model: str, prefix: str) -> None:
+        if self.entries.pop((model, prefix_digest(prefix)), None) is not None:
+            self._count("invalidated")
+
+    def request(self, client: Any, model: str, prefix: Optional[str], parts: list, config: Any = None) -> tuple:
+        """
+        (contents, config) for a call: with the prefix as cached content when
+        there is one, otherwise with the prefix as the first text part.
+        """
+        cache_name = self.lookup(client, model, prefix) if prefix else None
+        if cache_name is None:
+            if prefix:
+                self._count("inline")
+            return [{"role": "user", "parts": ([{"text": prefix}] if prefix else []) + parts}], config
+        self._count("hit")
+        if config is None:
+            config = types.GenerateContentConfig(cached_content=cache_name)
+        else:
+            config = config.model_copy(update={"cached_content": cache_name})
+        return [{"role": "user", "parts": parts}], config
+
+    def generate_content(self, client: Any, model: str, prefix: Optional[str], parts: list, config: Any = None):
+        """client.models.generate_content with the prefix cached; resent in full if the cache has gone stale."""
+        contents, call_config = self.request(client, model, prefix, parts, config)
+        try:
+            return client.models.generate_content(model=model, contents=contents, config=call_config)
+        except Exception as e:
+            if call_config is config or not is_stale_cache_error(e):
+                raise
+            print(f"   ⚠️ Cached prompt prefix rejected ({e}); resending it in full")
+            self.invalidate(model, prefix)
+            return client.models.generate_content(
+                model=model,
+                contents=[{"role": "user", "parts": [{"text": prefix}] + parts}],
+                config=config,
+            )
+
+    def generate_content_stream(
+        self, client: Any, model: str, prefix: Optional[str], parts: list, config: Any = None
+    ) -> Iterator[Any]:
+        """Streaming version of generate_content(); a stale cache is only detected before the first chunk."""
+        contents, call_config = self.request(client, model, prefix, parts, config)
+        chunks = iter(client.models.generate_content_stream(model=model, contents=contents, config=call_config))
+        try:
+            first = next(chunks)
+        except StopIteration:
+            return
+        except Exception as e:
+            if call_config is config or not is_stale_cache_error(e):
+                raise
+            print(f"   ⚠️ Cached prompt prefix rejected ({e}); resending it in full")
+            self.invalidate(model, prefix)
+            yield from client.models.generate_content_stream(
+                model=model,
+                contents=[{"role": "user", "parts": [{"text": prefix}] + parts}],
+                config=config,
+            )
+            return
+        yield first
+        yield from chunks
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        entries: List[Dict[str, Any]] = [
+            {
+                "model": model,
+                "prefix": digest[:12],
+                "name": entry.name,
+                "tokens": entry.tokens,
+                "expires_in": round(entry.expires - now, 1) if entry.expires != float("inf") else None,
+            }
+            for (model, digest), entry in list(self.entries.items())
+        ]
+        with self._lock:
+            counts = dict(self.counts)
+        return {"enabled": self.enabled, "ttl": self.ttl, "entries": entries, "events": counts}
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date
+from typing import Any, Dict, List, Optional, Set
+
+from cache import TTLCache
+
+# =================================================================
+# RECIPE CACHE CONFIGURATION
+# Generated recipes are reused while the inventory and the request preferences
+# stay the same. Set FOOGIE_RECIPE_CACHE_PATH to also keep them in a small
+# SQLite file so a restart comes back warm.
+# =================================================================
+RECIPE_CACHE_SIZE = int(os.getenv("FOOGIE_RECIPE_CACHE_SIZE", "256"))
+RECIPE_CACHE_TTL = float(os.getenv("FOOGIE_RECIPE_CACHE_TTL", "3600"))
+RECIPE_CACHE_PATH = os.getenv("FOOGIE_RECIPE_CACHE_PATH", "")
+
+# Request fields that change what the model is asked for.
+PREFERENCE_KEYS = ("dietary_restrictions", "cuisine_preference", "num_recipes", "target_calories_per_meal")
+
+
+def inventory_fingerprint(inventory: List[Dict[str, Any]]) -> str:
+    """Stable hash of an inventory that ignores batch order."""
+    batches = sorted(json.dumps(item, sort_keys=True) for item in inventory)
+    return hashlib.sha256("\n".join(batches).encode("utf-8")).hexdigest()
+
+
+def recipe_cache_key(inventory: List[Dict[str, Any]], preferences: Dict[str, Any]) -> str:
+    """
+    Key for one recipe request: the inventory fingerprint, the preferences and
+    today's date (the prompt counts days until expiry, so it changes daily).
+    """
+    payload = json.dumps(
+        {
+            "inventory": inventory_fingerprint(inventory),
+            "preferences": {key: preferences.get(key) for key in PREFERENCE_KEYS},
+            "day": date.today().isoformat(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecipeCache:
+    """
+    LRU/TTL cache of generated recipe lists, grouped by bin so every entry of a
+    bin can be dropped as soon as its inventory changes (see invalidate_bin).
+    Optionally backed by a SQLite file that survives restarts.
+    """
+
+    def __init__(self, maxsize: int = RECIPE_CACHE_SIZE, ttl: float = RECIPE_CACHE_TTL, path: str = RECIPE_CACHE_PATH):
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl, name="recipes")
+        self._keys_by_bin: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.path = path or None
+        self.disk_hits = 0
+        if self.path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS recipes ("
+                    "key TEXT PRIMARY KEY, bin_id TEXT NOT NULL, created_at REAL NOT NULL, recipes TEXT NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_recipes_bin ON recipes (bin_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Short-lived connections keep this safe to call from any worker thread.
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, bin_id: str, key: str) -> Optional[List[Dict[str, Any]]]:
+        recipes = self._memory.get(key)
+        if recipes is not None or not self.path:
+            return recipes
+
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT recipes FROM recipes WHERE key = ? AND created_at > ?",
+                    (key, time.time() - self.ttl),
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"   Recipe cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+
+        recipes = json.loads(row[0])
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(bin_id, key, recipes)
+        return recipes
+
+    def set(self, bin_id: str, key: str, recipes: List[Dict[str, Any]]) -> None:
+        self._remember(bin_id, key, recipes)
+        if not self.path:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO recipes (key, bin_id, created_at, recipes) VALUES (?, ?, ?, ?)",
+                    (key, bin_id, time.time(), json.dumps(recipes)),
+                )
+        except sqlite3.Error as e:
+            print(f"   Recipe cache write failed: {e}")
+
+    def _remember(self, bin_id: str, key: str, recipes: List[Dict[str, Any]]) -> None:
+        self._memory.set(key, recipes)
+        with self._lock:
+            self._keys_by_bin.setdefault(bin_id, set()).add(key)
+
+    def invalidate_bin(self, bin_id: str) -> None:
+        """Forgets every cached recipe list generated from this bin."""
+        with self._lock:
+            keys = self._keys_by_bin.pop(bin_id, set())
+        for key in keys:
+            self._memory.invalidate(key)
+        if self.path:
+            try:
+                with closing(self._connect()) as conn, conn:
+                    conn.execute("DELETE FROM recipes WHERE bin_id = ?", (bin_id,))
+            except sqlite3.Error as e:
+                print(f"   Recipe cache invalidation failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["persistent"] = bool(self.path)
+        return stats
@@ -0,0 +1,298 @@
+import json
+import os
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from inventory import NO_EXPIRY_ORDINAL, item_expiry_ordinal, item_name_key
+
+# =================================================================
+# LOCAL RECIPE INDEX CONFIGURATION
+# A bundled recipe corpus (corpus/recipes.json) is searched before asking the
+# model. Recipes whose fridge ingredients are all in stock and that score at
+# least FOOGIE_LOCAL_RECIPE_MIN_SCORE are served straight away; the model is
+# only asked for however many recipes are still missing. No network needed.
+# =================================================================
+LOCAL_RECIPES = os.getenv("FOOGIE_LOCAL_RECIPES", "1").lower() not in ("0", "false", "no")
+RECIPE_CORPUS_PATH = os.getenv(
+    "FOOGIE_RECIPE_CORPUS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "recipes.json"),
+)
+LOCAL_RECIPE_MIN_SCORE = float(os.getenv("FOOGIE_LOCAL_RECIPE_MIN_SCORE", "0.55"))
+
+# Score weights; they add up to 1.
+COVERAGE_WEIGHT = 0.4
+URGENCY_WEIGHT = 0.35
+CALORIE_WEIGHT = 0.15
+CUISINE_WEIGHT = 0.1
+
+# Words in dietary_restrictions that map to the corpus "diets" tags. A
+# restriction naming none of them (an allergy, "halal", "no eggs", ...) can't be
+# checked against the corpus, so such requests skip the local index.
+DIET_KEYWORDS = {
+    "vegan": "vegan",
+    "vegetarian": "vegetarian",
+    "veggie": "vegetarian",
+    "gluten": "gluten-free",
+    "celiac": "gluten-free",
+    "coeliac": "gluten-free",
+    "dairy": "dairy-free",
+    "lactose": "dairy-free",
+}
+
+
+# Stock names that also satisfy a corpus ingredient, by ingredient key. Anything
+# else must match the key exactly: "cream cheese" is not "cheese", nor
+# "coconut milk" "milk", so word overlap alone never counts.
+INGREDIENT_ALIASES = {
+    "bean": ("black bean", "kidney bean", "pinto bean", "cannellini bean"),
+    "bell pepper": ("red bell pepper", "green bell pepper", "yellow bell pepper", "red pepper", "green pepper"),
+    "bread": ("white bread", "whole wheat bread", "wholemeal bread", "sourdough bread"),
+    "cheese": ("cheddar", "cheddar cheese", "mozzarella", "mozzarella cheese", "parmesan", "parmesan cheese"),
+    "chicken breast": ("chicken", "chicken fillet", "chicken breast fillet"),
+    "egg": ("large egg", "free range egg"),
+    "ground beef": ("minced beef", "beef mince"),
+    "lettuce": ("romaine lettuce", "iceberg lettuce"),
+    "milk": ("whole milk", "skim milk", "skimmed milk", "semi skimmed milk", "low fat milk"),
+    "mushroom": ("button mushroom", "white mushroom", "cremini mushroom"),
+    "oat": ("rolled oat", "porridge oat"),
+    "onion": ("red onion", "yellow onion", "white onion", "brown onion"),
+    "pasta": ("spaghetti", "penne", "fusilli"),
+    "potato": ("russet potato", "red potato", "baby potato", "new potato"),
+    "rice": ("white rice", "brown rice", "basmati rice", "jasmine rice"),
+    "tomato": ("cherry tomato", "roma tomato", "plum tomato"),
+    "yogurt": ("greek yogurt", "plain yogurt", "natural yogurt"),
+}
+
+# The calorie note on an extra that has to be bought, e.g. "1 tbsp honey (64 cal, ...)".
+CALORIE_NOTE = re.compile(r"\(\s*\d+(?:\.\d+)?\s*cal\b", re.IGNORECASE)
+
+
+def ingredient_key(name: Any) -> str:
+    """Normalized ingredient name used as the index key: lowercase and singular."""
+    words = []
+    for word in re.findall(r"[a-z]+", str(name or "").lower()):
+        if word.endswith("ies") and len(word) > 4:
+            word = word[:-3] + "y"
+        elif word.endswith(("oes", "ches", "shes")):
+            word = word[:-2]
+        elif word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+NO_RESTRICTIONS = {"", "none", "no", "n/a", "na", "nothing", "no restrictions", "anything"}
+
+
+def required_diets(dietary_restrictions: Any) -> Optional[Set[str]]:
+    """
+    Corpus diet tags required by a free-text restrictions field, or None if
+    any restriction in it isn't one the corpus is tagged for.
+    """
+    diets: Set[str] = set()
+    for restriction in re.split(r"[,;/&\n]|\band\b", str(dietary_restrictions or "").lower()):
+        restriction = restriction.strip(" .!-")
+        if restriction in NO_RESTRICTIONS:
+            continue
+        tags = {tag for keyword, tag in DIET_KEYWORDS.items() if keyword in restriction}
+        if not tags:
+            return None
+        diets |= tags
+    return diets
+
+
+def shopping_needed(additional_ingredient: str) -> bool:
+    """Extras with a calorie note have to be bought; the rest are seasonings and staples."""
+    return CALORIE_NOTE.search(additional_ingredient) is not None
+
+
+def _urgency_weight(days_left: Optional[int]) -> float:
+    if days_left is None:
+        return 0.1
+    if days_left <= 3:
+        return 1.0
+    if days_left <= 7:
+        return 0.5
+    return 0.2
+
+
+class RecipeIndex:
+    """
+    Inverted index from ingredient key (and its INGREDIENT_ALIASES) to corpus recipes.
+
+    suggest() looks up only the recipes that share an ingredient with the
+    inventory, checks each one's ingredients against the stock (same unit,
+    enough quantity) and ranks them by coverage (the share of the recipe's
+    non-staple ingredients that come from the fridge), expiry urgency,
+    closeness to the calorie target and cuisine, after filtering on dietary
+    tags.
+    """
+
+    def __init__(self, recipes: List[Dict[str, Any]]):
+        self.recipes = recipes
+        self._index: Dict[str, Set[int]] = {}
+        for recipe_id, recipe in enumerate(recipes):
+            recipe["_keys"] = [ingredient_key(ingredient["name"]) for ingredient in recipe.get("ingredients", [])]
+            for key in recipe["_keys"]:
+                for term in (key, *INGREDIENT_ALIASES.get(key, ())):
+                    self._index.setdefault(term, set()).add(recipe_id)
+
+    @classmethod
+    def load(cls, path: str = RECIPE_CORPUS_PATH) -> "RecipeIndex":
+        try:
+            with open(path, encoding="utf-8") as f:
+                recipes = json.load(f).get("recipes", [])
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load recipe corpus from {path}: {e}")
+            recipes = []
+        print(f"Loaded {len(recipes)} local recipe(s).")
+        return cls(recipes)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    @staticmethod
+    def _stock(items: List[Dict[str, Any]], today: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Inventory merged per ingredient key: name, type, quantity per unit,
+        earliest expiry, per-unit calories. Expired batches are left out, so
+        they are neither cooked with nor counted as urgent.
+        """
+        stock: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            quantity = item.get("quantity")
+            if not isinstance(quantity, (int, float)) or quantity <= 0:
+                continue
+            ordinal = item_expiry_ordinal(item)
+            if ordinal != NO_EXPIRY_ORDINAL and ordinal < today:
+                continue
+            key = ingredient_key(item_name_key(item))
+            entry = stock.setdefault(key, {
+                "name": item_name_key(item),
+                "type": item.get("type"),
+                "quantity": {},
+                "days_left": None,
+                "calories_per_unit": {},
+            })
+            unit = str(item.get("unit") or "items")
+            entry["quantity"][unit] = entry["quantity"].get(unit, 0) + quantity
+            per_unit = item.get("per_unit")
+            if isinstance(per_unit, dict):
+                entry["calories_per_unit"].setdefault(unit, per_unit.get("calories", 0))
+            if ordinal != NO_EXPIRY_ORDINAL:
+                days = ordinal - today
+                entry["days_left"] = days if entry["days_left"] is None else min(entry["days_left"], days)
+        return stock
+
+    @staticmethod
+    def _find(key: str, stock: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Stock entry for an ingredient: exact key, else the first alias in stock ("cheese" -> "cheddar")."""
+        for term in (key, *INGREDIENT_ALIASES.get(key, ())):
+            if term in stock:
+                return stock[term]
+        return None
+
+    def suggest(
+        self,
+        items: List[Dict[str, Any]],
+        preferences: Dict[str, Any],
+        limit: int = 3,
+        min_score: float = LOCAL_RECIPE_MIN_SCORE,
+        today: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns up to `limit` corpus recipes that can be cooked entirely from the
+        inventory, best first, in the same shape as model-generated recipes.
+        Nothing is suggested when the dietary restrictions can't be checked
+        against the corpus tags.
+        """
+        diets = required_diets(preferences.get("dietary_restrictions"))
+        if diets is None:
+            return []
+        today_ordinal = (today or date.today()).toordinal()
+        stock = self._stock(items, today_ordinal)
+        cuisine = str(preferences.get("cuisine_preference") or "").strip().lower()
+        target = preferences.get("target_calories_per_meal")
+        if not isinstance(target, (int, float)) or target <= 0:
+            target = 0
+
+        candidates: Set[int] = set()
+        for key in stock:
+            candidates |= self._index.get(key, set())
+
+        scored: List[Tuple[float, int, List[Tuple[Dict[str, Any], Dict[str, Any]]]]] = []
+        for recipe_id in candidates:
+            recipe = self.recipes[recipe_id]
+            if not diets <= set(recipe.get("diets", [])):
+                continue
+
+            used = []
+            for ingredient, key in zip(recipe["ingredients"], recipe["_keys"]):
+                entry = self._find(key, stock)
+                if entry is None or entry["quantity"].get(ingredient["unit"], 0) < ingredient["quantity"]:
+                    break
+                used.append((ingredient, entry))
+            else:
+                if not used:
+                    continue
+                to_buy = sum(1 for extra in recipe.get("additional_ingredients", []) if shopping_needed(extra))
+                coverage = len(used) / (len(used) + to_buy)
+                urgency = sum(_urgency_weight(entry["days_left"]) for _, entry in used) / len(used)
+                calories = recipe.get("nutrition_per_serving", {}).get("calories", 0)
+                calorie_fit = max(0.0, 1 - abs(calories - target) / target) if target else 0.5
+                cuisine_fit = 1.0 if cuisine and cuisine in recipe.get("cuisine", "") else 0.0
+                score = (
+                    COVERAGE_WEIGHT * coverage
+                    + URGENCY_WEIGHT * urgency
+                    + CALORIE_WEIGHT * calorie_fit
+                    + CUISINE_WEIGHT * cuisine_fit
+                )
+                if score >= min_score:
+                    scored.append((score, recipe_id, used))
+
+        scored.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [self._render(self.recipes[recipe_id], used, score) for score, recipe_id, used in scored[:limit]]
+
+    @staticmethod
+    def _render(recipe: Dict[str, Any], used: List[Tuple[Dict[str, Any], Dict[str, Any]]], score: float) -> Dict[str, Any]:
+        """Formats a corpus recipe like a generated one (see the recipe prompt)."""
+        inventory_items_used = []
+        for ingredient, entry in used:
+            quantity, unit = ingredient["quantity"], ingredient["unit"]
+            per_unit = entry["calories_per_unit"].get(unit)
+            note = f" ({round(quantity * per_unit)} cal from {quantity} × {per_unit:g} cal per {unit.rstrip('s')})" if per_unit else ""
+            # "<qty> <unit> of <inventory name>" is what the recipes page parses to update the fridge.
+            inventory_items_used.append(f"{quantity} {unit} of {entry['name']}{note}")
+
+        most_urgent = min(
+            (entry for _, entry in used if entry["days_left"] is not None),
+            key=lambda entry: entry["days_left"],
+            default=None,
+        )
+        days = most_urgent["days_left"] if most_urgent else None
+        urgency = "high" if days is not None and days <= 3 else "medium" if days is not None and days <= 7 else "low"
+
+        servings = recipe.get("servings", 1)
+        nutrition = recipe.get("nutrition_per_serving", {})
+        additional = recipe.get("additional_ingredients", [])
+        return {
+            "name": recipe["name"],
+            # Only seasonings and staples (no calorie note) beyond the fridge
+            "inventory_only": not any(shopping_needed(extra) for extra in additional),
+            "inventory_items_used": inventory_items_used,
+            "additional_ingredients": additional,
+            "instructions": recipe.get("instructions", []),
+            "cooking_time": recipe.get("cooking_time", ""),
+            "servings": servings,
+            "nutrition_per_serving": nutrition,
+            "total_nutrition": {macro: value * servings for macro, value in nutrition.items()},
+            "food_types_used": list(dict.fromkeys(entry["type"] for _, entry in used if entry["type"])),
+            "urgency": urgency,
+            "urgency_reason": (
+                f"Uses {most_urgent['name']} expiring in {days} day(s)" if most_urgent
+                else "Uses items from your fridge"
+            ),
+            "source": "local",
+            "match_score": round(score, 3),
+        }
@@ -0,0 +1,227 @@
+import ast
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from json_stream import JSONArrayStreamParser
+
+# =================================================================
+# MODEL OUTPUT SCHEMAS
+# Passed to Gemini as response_schema (with response_mime_type
+# "application/json") so it returns bare JSON of the right shape instead of
+# fenced, free-form text. The validators below still check every response,
+# and extract_json() recovers what it can from anything malformed, so a
+# slightly-off answer doesn't cost another model call.
+# =================================================================
+FOOD_TYPES = ["fruit", "vegetable", "protein", "grains", "dairy", "beverage", "snacks", "condiments"]
+UNITS = ["items", "grams", "containers", "eggs"]
+MACROS = ("calories", "carbs", "fats", "protein")
+
+INVENTORY_ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "type": {"type": "STRING", "enum": FOOD_TYPES},
+        "quantity": {"type": "INTEGER"},
+        "unit": {"type": "STRING", "enum": UNITS},
+        "expected_expiry_date": {"type": "STRING", "description": "DD/MM/YYYY"},
+        **{macro: {"type": "INTEGER"} for macro in MACROS},
+    },
+    "required": ["name", "type", "quantity", "unit", "expected_expiry_date", *MACROS],
+    "property_ordering": ["name", "type", "quantity", "unit", "expected_expiry_date", *MACROS],
+}
+
+INVENTORY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"inventory": {"type": "ARRAY", "items": INVENTORY_ITEM_SCHEMA}},
+    "required": ["inventory"],
+}
+
+_NUTRITION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {macro: {"type": "INTEGER"} for macro in MACROS},
+    "required": list(MACROS),
+}
+
+RECIPE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "inventory_only": {"type": "BOOLEAN"},
+        "inventory_items_used": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "additional_ingredients": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "instructions": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "cooking_time": {"type": "STRING"},
+        "servings": {"type": "INTEGER"},
+        "nutrition_per_serving": _NUTRITION_SCHEMA,
+        "total_nutrition": _NUTRITION_SCHEMA,
+        "food_types_used": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "urgency": {"type": "STRING", "enum": ["high", "medium", "low"]},
+        "urgency_reason": {"type": "STRING"},
+    },
+    "required": ["name", "inventory_items_used", "instructions", "nutrition_per_serving"],
+    # Name first, so streamed recipes can be shown as soon as they're complete.
+    "property_ordering": [
+        "name", "inventory_only", "inventory_items_used", "additional_ingredients", "instructions",
+        "cooking_time", "servings", "nutrition_per_serving", "total_nutrition", "food_types_used",
+        "urgency", "urgency_reason",
+    ],
+}
+
+RECIPES_SCHEMA = {"type": "ARRAY", "items": RECIPE_SCHEMA}
+
+_FENCE_RE = re.compile(r"```(?:json|python)?\s*(.*?)\s*(?:```|$)", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+# --- Tolerant Extraction ---
+
+def extract_json(text: Optional[str], expect: type = dict) -> Optional[Any]:
+    """
+    Gets a JSON value of type `expect` (dict or list) out of model output.
+
+    Tries, in order: the text as-is, the contents of a ``` fence, the first
+    complete value starting at the first '{' / '[' (ignoring chatter around
+    it), the same with trailing commas removed, Python-literal syntax (single
+    quotes, True/None) and, for arrays, every complete element of a truncated
+    array. Returns None if nothing usable is found.
+    """
+    if not text:
+        return None
+    text = text.strip()
+    fenced = _FENCE_RE.search(text)
+    candidates = [text] + ([fenced.group(1)] if fenced else [])
+
+    opener = "{" if expect is dict else "["
+    decoder = json.JSONDecoder()
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+            if isinstance(value, expect):
+                return value
+        except json.JSONDecodeError:
+            pass
+
+        start = candidate.find(opener)
+        if start < 0:
+            continue
+        body = candidate[start:]
+        for attempt in (body, _TRAILING_COMMA_RE.sub(r"\1", body)):
+            try:
+                value, _ = decoder.raw_decode(attempt)
+                if isinstance(value, expect):
+                    return value
+            except json.JSONDecodeError:
+                pass
+        try:
+            value = ast.literal_eval(body[: body.rfind("}" if expect is dict else "]") + 1])
+            if isinstance(value, expect):
+                return value
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            pass
+
+    if expect is list:
+        # Truncated output: keep every element that was finished.
+        parser = JSONArrayStreamParser()
+        salvaged = parser.feed(candidates[-1])
+        if salvaged:
+            print(f"Warning: Salvaged {len(salvaged)} element(s) from a malformed JSON array.")
+            return salvaged
+    return None
+
+
+# --- Validation ---
+
+def _to_number(value: Any, default: int = 0) -> Any:
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        match = re.match(r"\s*-?\d+(?:\.\d+)?", value)
+        if match:
+            number = float(match.group())
+            return int(number) if number.is_integer() else number
+    return default
+
+
+def _to_string_list(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [str(entry) for entry in value if entry is not None]
+    return []
+
+
+def validate_inventory_item(item: Any) -> Optional[Dict[str, Any]]:
+    """Returns a cleaned copy of one recognized batch, or None if it has no usable name."""
+    if not isinstance(item, dict) or not str(item.get("name") or "").strip():
+        return None
+    cleaned = dict(item)
+    cleaned["name"] = str(item["name"]).strip()
+    cleaned["type"] = str(item.get("type") or "other").strip().lower()
+    cleaned["unit"] = str(item.get("unit") or "items").strip().lower()
+    cleaned["quantity"] = _to_number(item.get("quantity"), default=1)
+    cleaned["expected_expiry_date"] = str(item.get("expected_expiry_date") or "").strip()
+    for macro in MACROS:
+        cleaned[macro] = _to_number(item.get(macro))
+    return cleaned
+
+
+def validate_inventory(value: Any) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Validates an {"inventory": [...]} payload (a bare list of batches is
+    accepted too). Unusable batches are dropped and reported.
+
+    Returns:
+        ({"inventory": [...]}, problems), or (None, problems) if the shape is wrong.
+    """
+    if isinstance(value, list):
+        value = {"inventory": value}
+    if not isinstance(value, dict) or not isinstance(value.get("inventory"), list):
+        return None, ["expected an object with an 'inventory' list"]
+
+    items, problems = [], []
+    for index, item in enumerate(value["inventory"]):
+        cleaned = validate_inventory_item(item)
+        if cleaned is None:
+            problems.append(f"inventory[{index}] has no name")
+        else:
+            items.append(cleaned)
+    return {"inventory": items}, problems
+
+
+def validate_recipe(recipe: Any) -> Optional[Dict[str, Any]]:
+    """Returns a cleaned copy of one recipe, or None if it has no name."""
+    if not isinstance(recipe, dict) or not str(recipe.get("name") or "").strip():
+        return None
+    cleaned = dict(recipe)
+    cleaned["name"] = str(recipe["name"]).strip()
+    for field in ("inventory_items_used", "additional_ingredients", "instructions", "food_types_used"):
+        cleaned[field] = _to_string_list(recipe.get(field))
+    cleaned["inventory_only"] = bool(recipe.get("inventory_only", False))
+    cleaned["servings"] = _to_number(recipe.get("servings"), default=1) or 1
+    for field in ("nutrition_per_serving", "total_nutrition"):
+        nutrition = recipe.get(field)
+        if isinstance(nutrition, dict):
+            cleaned[field] = {macro: _to_number(nutrition.get(macro)) for macro in MACROS}
+    if cleaned.get("urgency") not in ("high", "medium", "low"):
+        cleaned["urgency"] = "low"
+    return cleaned
+
+
+def validate_recipes(value: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Validates a recipe list (or {"recipes": [...]}); unusable entries are dropped and reported."""
+    if isinstance(value, dict):
+        value = value.get("recipes", [value])
+    if not isinstance(value, list):
+        return [], ["expected a list of recipes"]
+
+    recipes, problems = [], []
+    for index, recipe in enumerate(value):
+        cleaned = validate_recipe(recipe)
+        if cleaned is None:
+            problems.append(f"recipes[{index}] has no name")
+        else:
+            recipes.append(cleaned)
+    return recipes, problems
@@ -101,7 +101,8 @@ class RecipeManager {
     this.showLoading();
 
     try {
-      const response = await fetch("/api/generate-recipes", {
+      // Streaming endpoint: one NDJSON line per recipe, sent as soon as it's ready
+      const response = await fetch("/api/generate-recipes/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json"
@@ -109,9 +110,8 @@ class RecipeManager {
         body: JSON.stringify(requestData)
       });
 
-      const data = await response.json();
-
       if (!response.ok) {
+        const data = await response.json();
         if (data.error && (data.error.includes("No inventory") || data.error.includes("empty"))) {
           this.showEmptyState();
           return;
@@ -119,12 +119,22 @@ class RecipeManager {
         throw new Error(data.error || "Failed to generate recipes");
       }
 
-      if (!data.recipes || data.recipes.length === 0) {
+      let count = 0;
+      await this.readRecipeStream(response, (message) => {
+        if (message.type === "recipe") {
+          if (count === 0) {
+            this.startRecipeList();
+          }
+          this.recipesContainer.appendChild(this.createRecipeCard(message.recipe, message.index));
+          count++;
+        } else if (message.type === "error") {
+          throw new Error(message.error || "Failed to generate recipes");
+        }
+      });
+
+      if (count === 0) {
         this.showEmptyState();
-        return;
       }
-
-      this.renderRecipes(data.recipes);
     } catch (error) {
       console.error("Error generating recipes:", error);
       this.hideLoading();
@@ -136,6 +146,31 @@ class RecipeManager {
     }
   }
 
+  /**
+   * Read an NDJSON response line by line, calling onMessage for each parsed line
+   */
+  async readRecipeStream(response, onMessage) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { value, done } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.filter(line => line.trim()).forEach(line => onMessage(JSON.parse(line)));
+
+      if (done) {
+        if (buffer.trim()) {
+          onMessage(JSON.parse(buffer));
+        }
+        return;
+      }
+    }
+  }
+
   /**
    * Parse inventory items from the recipe to extract item names and quantities
    * Example input: "2 items of banana (182 cal from 2 × 91 cal per item, 0g protein, 46g carbs, 0g fats)"
@@ -210,16 +245,10 @@ class RecipeManager {
     return consumedMap;
   }
 
-  renderRecipes(recipes) {
+  startRecipeList() {
     this.hideLoading();
     this.emptyState.classList.add("hidden");
     this.recipesContainer.innerHTML = "";
-
-    recipes.forEach((recipe, index) => {
-      const recipeCard = this.createRecipeCard(recipe, index);
-      this.recipesContainer.appendChild(recipeCard);
-    });
-
     this.recipesContainer.scrollIntoView({ behavior: "smooth", block: "start" });
   }
 
@@ -411,6 +440,9 @@ class RecipeManager {
       useBtn.innerHTML = '<span>⏳</span> Processing...';
       useBtn.disabled = true;
 
+      // Items the fridge did not have enough of, as reported by the server
+      let shortfalls = {};
+
       // 1. Consume items from fridge
       if (Object.keys(consumedMap).length > 0) {
         console.log('📦 Sending consumption request to server...');
@@ -433,6 +465,10 @@ class RecipeManager {
 
         const consumeData = await consumeResponse.json();
         console.log('✅ Fridge updated successfully:', consumeData);
+        shortfalls = consumeData.shortfalls || {};
+        if (Object.keys(shortfalls).length > 0) {
+          console.warn('⚠️ Not enough in fridge for:', shortfalls);
+        }
         console.log('Items consumed:', Object.entries(consumedMap).map(([name, qty]) => `${qty}x ${name}`).join(', '));
       } else {
         console.log('⏭️ Skipping fridge update (no items to consume)');
@@ -462,11 +498,16 @@ class RecipeManager {
       const consumedText = Object.keys(consumedMap).length > 0 
         ? `<p>🗄️ Fridge updated: ${Object.entries(consumedMap).map(([name, qty]) => `${qty} ${name}`).join(', ')} removed</p>`
         : '<p>🗄️ No fridge items consumed</p>';
+
+      const shortfallText = Object.keys(shortfalls).length > 0
+        ? `<p>⚠️ Not enough in fridge: ${Object.entries(shortfalls).map(([name, entry]) => `${this.escapeHtml(name)} (short ${entry.shortfall})`).join(', ')}</p>`
+        : '';
       
       message.innerHTML = `
         <p><strong>✅ Success!</strong></p>
         <p>🍽️ Meal logged: ${totalCalories} calories</p>
         ${consumedText}
+        ${shortfallText}
         <p>📊 Remaining today: ${summary.remaining} cal (${summary.mealsLeft} meals left = ~${summary.caloriesPerMeal} cal/meal)</p>
       `;
       cardElement.appendChild(message);
@@ -0,0 +1,557 @@
+import requests
+import copy
+from abc import ABC, abstractmethod
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+import http_client
+from events import apply_events
+
+# =================================================================
+# STORAGE CONFIGURATION
+# FOOGIE_STORAGE selects where inventories live:
+#   * "jsonbin" (default) - every read/write goes to api.jsonbin.io
+#   * "sqlite"            - inventories live in a local SQLite (WAL) file
+#   * "sqlite-events"     - same file, but changes are appended as small events
+#                           and folded into a snapshot in the background
+# With the SQLite backends, setting FOOGIE_SYNC_JSONBIN=1 mirrors every write
+# to the remote bin as well, so JSONBin becomes an optional sync target.
+# =================================================================
+MASTER_KEY = os.getenv("JSONBIN_MASTER_KEY")
+BASE_URL = "https://api.jsonbin.io/v3/b"
+
+STORAGE_BACKEND = os.getenv("FOOGIE_STORAGE", "jsonbin").strip().lower()
+# An empty value means the default too: sqlite3 would open a private temporary
+# database per connection (so per thread) for "".
+SQLITE_PATH = os.getenv("FOOGIE_SQLITE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "foogie.db"
+)
+SYNC_TO_JSONBIN = os.getenv("FOOGIE_SYNC_JSONBIN", "").strip().lower() in ("1", "true", "yes")
+# Event-log mode: compact a bin once this many writes have piled up since its
+# last snapshot, checking every FOOGIE_EVENT_COMPACT_INTERVAL seconds.
+EVENT_COMPACT_THRESHOLD = int(os.getenv("FOOGIE_EVENT_COMPACT_THRESHOLD", "100"))
+EVENT_COMPACT_INTERVAL = float(os.getenv("FOOGIE_EVENT_COMPACT_INTERVAL", "30"))
+
+# Every stored record carries a revision number under this key. It starts at 0
+# and is bumped by one on every successful write.
+REV_KEY = "_rev"
+
+
+class ConflictError(Exception):
+    """Raised by a conditional write when the bin's revision no longer matches."""
+
+    def __init__(self, bin_id: str, expected_rev: int, actual_rev: Optional[int]):
+        super().__init__(
+            f"Bin {bin_id} is at revision {actual_rev}, expected {expected_rev}"
+        )
+        self.bin_id = bin_id
+        self.expected_rev = expected_rev
+        self.actual_rev = actual_rev
+
+
+def get_rev(record: Optional[Dict[str, Any]]) -> int:
+    """Returns the revision of a record (records written before revisions existed count as 0)."""
+    if not record:
+        return 0
+    rev = record.get(REV_KEY, 0)
+    return rev if isinstance(rev, int) else 0
+
+
+class InventoryStore(ABC):
+    """
+    Interface for anything that can hold a bin's record (the dictionary
+    containing "inventory"). Implementations return None / False on failure
+    instead of raising, matching the rest of data.py. The one exception is
+    ConflictError, raised by write() when `expected_rev` is given and the
+    stored revision has moved on, so callers can re-read and retry.
+
+    `atomic_writes` says whether the revision is checked in the same atomic
+    step as the write. Backends without it don't check at all (last writer
+    wins), so callers should at least base their changes on a fresh
+    (uncached) read.
+
+    Backends store the record whole; none of them splits batches into
+    separately indexed rows.
+    """
+
+    name = "base"
+    atomic_writes = False
+
+    @abstractmethod
+    def read(self, bin_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(
+        self,
+        bin_id: str,
+        record: Dict[str, Any],
+        expected_rev: Optional[int] = None,
+        events: Optional[List[Dict[str, Any]]] = None,
+    ) -> bool:
+        """
+        Stores `record` as the bin's new contents. `events` optionally describes
+        the same change as small events (see events.py); backends that can
+        append them instead of rewriting the whole document do so.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def create(self, record: Dict[str, Any]) -> Optional[str]:
+        raise NotImplementedError
+
+    def replicate(self, bin_id: str, record: Dict[str, Any]) -> bool:
+        """Stores a copy of a record exactly as given (revision included), for mirroring."""
+        return self.write(bin_id, record)
+
+
+# --- Remote JSONBin Backend ---
+
+class JSONBinStore(InventoryStore):
+    """Stores each inventory as a record in a JSONBin.io bin (v3 API)."""
+
+    name = "jsonbin"
+
+    def __init__(self, base_url: str = BASE_URL, master_key: Optional[str] = MASTER_KEY):
+        self.base_url = base_url
+        self.master_key = master_key
+
+    def _headers(self, private: Optional[bool] = None) -> Dict[str, str]:
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Master-Key': self.master_key
+        }
+        if private is not None:
+            headers['X-Bin-Private'] = 'true' if private else 'false'
+        return headers
+
+    def read(self, bin_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = http_client.get_session().get(f"{self.base_url}/{bin_id}", headers=self._headers())
+            response.raise_for_status()
+            return response.json().get('record')
+        except requests.exceptions.HTTPError as err:
+            print(f"   API Error occurred during read: {err}")
+            return None
+        except Exception as e:
+            print(f"   An unexpected error occurred: {e}")
+            return None
+
+    def write(
+        self,
+        bin_id: str,
+        record: Dict[str, Any],
+        expected_rev: Optional[int] = None,
+        events: Optional[List[Dict[str, Any]]] = None,
+    ) -> bool:
+        """
+        One PUT. JSONBin has no conditional PUT, so `expected_rev` (the revision
+        data.mutate_bin just read, past the cache) is used as the base and the
+        next revision is stamped; ConflictError is never raised. Writes are
+        best-effort last-writer-wins: threads of one process are serialized by
+        mutate_bin, but another process writing the same bin between that read
+        and this PUT loses its change. Use the SQLite backend for several workers.
+        """
+        record = dict(record)
+        record[REV_KEY] = (get_rev(record) if expected_rev is None else expected_rev) + 1
+        return self.replicate(bin_id, record)
+
+    def replicate(self, bin_id: str, record: Dict[str, Any]) -> bool:
+        try:
+            response = http_client.get_session().put(
+                f"{self.base_url}/{bin_id}", headers=self._headers(), data=json.dumps(record)
+            )
+            response.raise_for_status()
+            return True
+        except requests.exceptions.HTTPError as err:
+            print(f"   API Error occurred during write: {err}")
+            return False
+        except Exception as e:
+            print(f"   An unexpected error occurred: {e}")
+            return False
+
+    def create(self, record: Dict[str, Any]) -> Optional[str]:
+        if self.master_key == "YOUR_MASTER_KEY_HERE":
+            print("ERROR: Please update the MASTER_KEY variable with your actual key.")
+            return None
+        try:
+            record = dict(record)
+            record[REV_KEY] = 0
+            response = http_client.get_session().post(
+                self.base_url, headers=self._headers(private=False), data=json.dumps(record)
+            )
+            response.raise_for_status()
+            return response.json()['metadata']['id']
+        except requests.exceptions.HTTPError as err:
+            print(f"   API Error occurred during create: {err}")
+            return None
+        except Exception as e:
+            print(f"   An unexpected error occurred: {e}")
+            return None
+
+
+# --- Local SQLite Backend ---
+
+class SQLiteStore(InventoryStore):
+    """
+    Keeps inventories in a local SQLite database running in WAL mode, so reads
+    never wait on writers and never leave the machine.
+
+    The full record is stored as one JSON document per bin, keyed by bin id;
+    batches are not split into rows, so there are no per-item indexed queries.
+    Lookups by name or expiry happen in memory (see inventory.Inventory).
+
+    If `mirror` is given, every successful write is also pushed to it
+    (best effort), which is how JSONBin is kept in sync.
+    """
+
+    name = "sqlite"
+    atomic_writes = True
+
+    def __init__(self, path: str = SQLITE_PATH, mirror: Optional[InventoryStore] = None):
+        self.path = path
+        self.mirror = mirror
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bins (
+                bin_id     TEXT PRIMARY KEY,
+                record     TEXT NOT NULL,
+                rev        INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        # Databases created before revisions existed lack the rev column.
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(bins)")]
+        if "rev" not in columns:
+            conn.execute("ALTER TABLE bins ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+
+    def read(self, bin_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = self._connect().execute(
+                "SELECT record, rev FROM bins WHERE bin_id = ?", (bin_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"   SQLite error occurred during read: {e}")
+            return None
+        if row is None:
+            print(f"   Bin {bin_id} does not exist in local storage.")
+            return None
+        record = json.loads(row[0])
+        record[REV_KEY] = row[1]
+        return record
+
+    def _write_local(
+        self, bin_id: str, record: Dict[str, Any], expected_rev: Optional[int] = None, rev: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Writes the record inside one IMMEDIATE transaction, so the revision check
+        and the update are atomic across threads and processes sharing the file.
+        The new revision is `rev` if given, otherwise the current one plus one.
+        Returns the record as stored.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT rev FROM bins WHERE bin_id = ?", (bin_id,)).fetchone()
+            current_rev = row[0] if row is not None else 0
+            if expected_rev is not None and current_rev != expected_rev:
+                raise ConflictError(bin_id, expected_rev, current_rev)
+
+            stored = dict(record)
+            stored[REV_KEY] = current_rev + 1 if rev is None else rev
+            conn.execute(
+                "INSERT INTO bins (bin_id, record, rev, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(bin_id) DO UPDATE SET record = excluded.record, rev = excluded.rev, "
+                "updated_at = excluded.updated_at",
+                (bin_id, json.dumps(stored), stored[REV_KEY], time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return stored
+
+    def write(
+        self,
+        bin_id: str,
+        record: Dict[str, Any],
+        expected_rev: Optional[int] = None,
+        events: Optional[List[Dict[str, Any]]] = None,
+    ) -> bool:
+        try:
+            stored = self._write_local(bin_id, record, expected_rev)
+        except sqlite3.Error as e:
+            print(f"   SQLite error occurred during write: {e}")
+            return False
+
+        # The local database is the source of truth; the mirror just gets the latest copy.
+        if self.mirror is not None and not self.mirror.replicate(bin_id, stored):
+            print(f"   Warning: local write succeeded but sync to {self.mirror.name} failed.")
+        return True
+
+    def create(self, record: Dict[str, Any]) -> Optional[str]:
+        # When mirroring, let the remote allocate the id so both sides agree on it.
+        if self.mirror is not None:
+            bin_id = self.mirror.create(record)
+            if bin_id is None:
+                return None
+        else:
+            bin_id = secrets.token_hex(12)
+
+        try:
+            self._write_local(bin_id, record, rev=0)
+        except sqlite3.Error as e:
+            print(f"   SQLite error occurred during create: {e}")
+            return None
+        return bin_id
+
+
+# --- Event-Sourced SQLite Backend ---
+
+class EventLogStore(SQLiteStore):
+    """
+    SQLite backend where each write appends the change as a few small events
+    instead of rewriting the whole inventory, so a write costs O(change).
+
+    `bins.record` holds a snapshot compacted up to `bins.snapshot_rev`, and
+    `bins.rev` is the latest revision. Each write adds one `events` row (the
+    events of that revision). Reads materialize snapshot + newer events and keep
+    the result per bin in memory, so later reads only replay what is new.
+
+    A background thread folds the log into a fresh snapshot once a bin has
+    EVENT_COMPACT_THRESHOLD un-compacted writes.
+    """
+
+    name = "sqlite-events"
+
+    def __init__(
+        self,
+        path: str = SQLITE_PATH,
+        mirror: Optional[InventoryStore] = None,
+        compact_threshold: int = EVENT_COMPACT_THRESHOLD,
+        compact_interval: float = EVENT_COMPACT_INTERVAL,
+    ):
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+        # bin_id -> (revision, materialized record without the revision key)
+        self._states: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._states_lock = threading.Lock()
+        super().__init__(path, mirror=mirror)
+
+        if compact_interval > 0:
+            threading.Thread(target=self._compact_loop, name="event-compactor", daemon=True).start()
+
+    def _init_schema(self) -> None:
+        super()._init_schema()
+        conn = self._connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                bin_id     TEXT NOT NULL REFERENCES bins(bin_id) ON DELETE CASCADE,
+                rev        INTEGER NOT NULL,
+                events     TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (bin_id, rev)
+            );
+            """
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(bins)")]
+        if "snapshot_rev" not in columns:
+            # Existing records are full documents, i.e. snapshots of their current revision.
+            conn.execute("ALTER TABLE bins ADD COLUMN snapshot_rev INTEGER NOT NULL DEFAULT 0")
+            conn.execute("UPDATE bins SET snapshot_rev = rev")
+
+    def read(self, bin_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            # One read transaction, so a compaction committing in between can't
+            # delete the events that come after the snapshot we read.
+            conn.execute("BEGIN")
+            try:
+                row = conn.execute("SELECT snapshot_rev FROM bins WHERE bin_id = ?", (bin_id,)).fetchone()
+                if row is None:
+                    print(f"   Bin {bin_id} does not exist in local storage.")
+                    return None
+                snapshot_rev = row[0]
+
+                with self._states_lock:
+                    state = self._states.get(bin_id)
+                if state is None or state[0] < snapshot_rev:
+                    # Nothing materialized yet, or the log we'd need was compacted away.
+                    snapshot = conn.execute(
+                        "SELECT record, snapshot_rev FROM bins WHERE bin_id = ?", (bin_id,)
+                    ).fetchone()
+                    rev, record = snapshot[1], json.loads(snapshot[0])
+                    record.pop(REV_KEY, None)
+                else:
+                    rev, record = state[0], copy.deepcopy(state[1])
+
+                rows = conn.execute(
+                    "SELECT rev, events FROM events WHERE bin_id = ? AND rev > ? ORDER BY rev",
+                    (bin_id, rev),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"   SQLite error occurred during read: {e}")
+            return None
+
+        for event_rev, events in rows:
+            record = apply_events(record, json.loads(events))
+            rev = event_rev
+
+        with self._states_lock:
+            current = self._states.get(bin_id)
+            if current is None or current[0] <= rev:
+                self._states[bin_id] = (rev, record)
+
+        result = copy.deepcopy(record)
+        result[REV_KEY] = rev
+        return result
+
+    def write(
+        self,
+        bin_id: str,
+        record: Dict[str, Any],
+        expected_rev: Optional[int] = None,
+        events: Optional[List[Dict[str, Any]]] = None,
+    ) -> bool:
+        if events is None:
+            # A plain overwrite is logged as one full-snapshot event.
+            events = [{"op": "snapshot", "record": {k: v for k, v in record.items() if k != REV_KEY}}]
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT rev FROM bins WHERE bin_id = ?", (bin_id,)).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO bins (bin_id, record, rev, snapshot_rev, updated_at) VALUES (?, ?, 0, 0, ?)",
+                        (bin_id, json.dumps({"inventory": []}), time.time()),
+                    )
+                current_rev = row[0] if row is not None else 0
+                if expected_rev is not None and current_rev != expected_rev:
+                    raise ConflictError(bin_id, expected_rev, current_rev)
+
+                new_rev = current_rev + 1
+                conn.execute(
+                    "INSERT INTO events (bin_id, rev, events, created_at) VALUES (?, ?, ?, ?)",
+                    (bin_id, new_rev, json.dumps(events), time.time()),
+                )
+                conn.execute(
+                    "UPDATE bins SET rev = ?, updated_at = ? WHERE bin_id = ?",
+                    (new_rev, time.time(), bin_id),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"   SQLite error occurred during write: {e}")
+            return False
+
+        if self.mirror is not None:
+            stored = dict(record)
+            stored[REV_KEY] = new_rev
+            if not self.mirror.replicate(bin_id, stored):
+                print(f"   Warning: local write succeeded but sync to {self.mirror.name} failed.")
+        return True
+
+    def compact(self, bin_id: str) -> bool:
+        """Folds the bin's event log into a new snapshot and drops the folded events."""
+        record = self.read(bin_id)
+        if record is None:
+            return False
+        rev = record.pop(REV_KEY)
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = conn.execute(
+                    "UPDATE bins SET record = ?, snapshot_rev = ? WHERE bin_id = ? AND snapshot_rev < ?",
+                    (json.dumps(record), rev, bin_id, rev),
+                ).rowcount
+                if updated:
+                    conn.execute("DELETE FROM events WHERE bin_id = ? AND rev <= ?", (bin_id, rev))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"   SQLite error occurred during compaction: {e}")
+            return False
+
+        if updated:
+            print(f"   Compacted bin {bin_id} up to revision {rev}.")
+        return True
+
+    def _compact_loop(self) -> None:
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                bin_ids = [
+                    row[0] for row in self._connect().execute(
+                        "SELECT bin_id FROM bins WHERE rev - snapshot_rev >= ?", (self.compact_threshold,)
+                    )
+                ]
+                for bin_id in bin_ids:
+                    self.compact(bin_id)
+            except Exception as e:
+                print(f"   Error during background compaction: {e}")
+
+
+# --- Backend Selection ---
+
+_store: Optional[InventoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> InventoryStore:
+    """Returns the process-wide store selected by FOOGIE_STORAGE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if STORAGE_BACKEND == "sqlite":
+                    mirror = JSONBinStore() if SYNC_TO_JSONBIN else None
+                    _store = SQLiteStore(SQLITE_PATH, mirror=mirror)
+                elif STORAGE_BACKEND == "sqlite-events":
+                    mirror = JSONBinStore() if SYNC_TO_JSONBIN else None
+                    _store = EventLogStore(SQLITE_PATH, mirror=mirror)
+                elif STORAGE_BACKEND == "jsonbin":
+                    _store = JSONBinStore()
+                else:
+                    raise ValueError(f"Unknown FOOGIE_STORAGE backend: {STORAGE_BACKEND!r}")
+                print(f"Using '{_store.name}' inventory storage.")
+    return _store
+
+
+def set_store(store: InventoryStore) -> None:
+    """Replaces the process-wide store (used by scripts and local tooling)."""
+    global _store
+    with _store_lock:
+        _store = store
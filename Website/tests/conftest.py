@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+# The app and its modules read their configuration at import time.
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("FOOGIE_STORAGE", "sqlite")
+os.environ.setdefault("FOOGIE_SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="foogie-tests-"), "foogie.db"))
+os.environ.setdefault("FOOGIE_WRITE_COALESCE_MS", "0")
+os.environ.setdefault("FOOGIE_MODEL_RPM", "0")
+os.environ.setdefault("FOOGIE_EVENT_COMPACT_INTERVAL", "0")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pytest  # noqa: E402
+
+import data  # noqa: E402
+import storage  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    """A fresh SQLite store as the process-wide store, with an empty inventory cache."""
+    store = storage.SQLiteStore(str(tmp_path / "foogie.db"))
+    storage.set_store(store)
+    data.inventory_cache.clear()
+    yield store
+    data.inventory_cache.clear()
+
+
+@pytest.fixture
+def event_store(tmp_path):
+    """A fresh event-log store (no background compaction) as the process-wide store."""
+    store = storage.EventLogStore(str(tmp_path / "foogie-events.db"), compact_interval=0)
+    storage.set_store(store)
+    data.inventory_cache.clear()
+    yield store
+    data.inventory_cache.clear()
+
+
+def batch(name: str, quantity: int = 1, expiry: str = "01/01/2030", **fields):
+    return dict(
+        {"name": name, "type": "fruit", "quantity": quantity, "unit": "items", "expected_expiry_date": expiry,
+         "calories": 100 * quantity, "carbs": 10 * quantity, "fats": quantity, "protein": quantity},
+        **fields,
+    )
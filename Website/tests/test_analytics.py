@@ -0,0 +1,70 @@
+from datetime import date
+
+import pytest
+
+import data
+from analytics import InventoryColumns, summarize_inventory
+from conftest import batch
+
+TODAY = date(2030, 1, 10)
+
+
+@pytest.fixture
+def columns():
+    return InventoryColumns([
+        batch("apple", quantity=2, expiry="09/01/2030"),                  # expired yesterday
+        batch("milk", quantity=1, type="dairy", expiry="10/01/2030"),     # expires today
+        batch("cheese", quantity=3, type="dairy", expiry="13/01/2030"),   # one half-life away
+        batch("rice", quantity=500, type="grains", unit="grams", expiry="Unknown",
+              calories=650, carbs=140, fats=1, protein=13),
+    ])
+
+
+def test_columns_sum_macros_by_type_and_unit(columns):
+    assert columns.totals() == {"calories": 1250.0, "protein": 19.0, "carbs": 200.0, "fats": 7.0}
+    by_type = columns.totals_by_type()
+    assert by_type["dairy"] == {"batches": 2, "calories": 400.0, "protein": 4.0, "carbs": 40.0, "fats": 4.0}
+    assert by_type["fruit"]["batches"] == 1
+    assert columns.quantity_by_unit() == {"items": 6.0, "grams": 500.0}
+
+
+def test_per_unit_values_follow_the_remaining_quantity():
+    half_eaten = batch("pizza", quantity=2, calories=800, per_unit={"calories": 200, "protein": 8, "carbs": 20, "fats": 9})
+    assert InventoryColumns([half_eaten]).totals() == {"calories": 400.0, "protein": 16.0, "carbs": 40.0, "fats": 18.0}
+
+
+def test_expiry_windows_split_expired_from_expiring(columns):
+    today = TODAY.toordinal()
+    assert columns.expired(today)["batches"] == 1
+    assert columns.expired(today)["calories"] == 200.0
+    expiring = columns.expiring_within(3, today)
+    assert (expiring["batches"], expiring["calories"]) == (2, 400.0)
+    assert columns.expiring_within(0, today)["batches"] == 1
+
+
+def test_waste_risk_weighs_calories_by_days_left(columns):
+    risk = columns.waste_risk(TODAY.toordinal())
+    # apple and milk count fully, cheese (3 days) half, rice (no date) not at all.
+    assert risk["calories_at_risk"] == 200 + 100 + 150
+    assert risk["score"] == round(450 / 1250, 3)
+    assert [entry["name"] for entry in risk["top"]] == ["apple", "cheese", "milk"]
+    assert risk["top"][1]["risk"] == 0.5
+
+
+def test_summary_of_an_empty_inventory():
+    summary = summarize_inventory([], today=TODAY)
+    assert summary["batches"] == 0
+    assert summary["totals"]["calories"] == 0.0
+    assert summary["waste_risk"] == {"score": 0.0, "calories_at_risk": 0.0, "top": []}
+
+
+def test_summary_routes_do_not_shadow_a_bin_named_summary(sqlite_store, monkeypatch):
+    import app
+
+    client = app.app.test_client()
+    sqlite_store.write("summary", {"inventory": [batch("apple")]})
+    monkeypatch.setattr(app, "TEST_BIN_ID", data.store_data_to_bin({"inventory": [batch("pear", quantity=2)]}))
+
+    assert [item["name"] for item in client.get("/api/fridge/summary").get_json()["inventory"]] == ["apple"]
+    assert client.get("/api/fridge/summary/summary").get_json()["batches"] == 1
+    assert client.get("/api/fridge-summary").get_json()["totals"]["calories"] == 200
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+import types
+
+import pytest
+
+import data
+from conftest import batch
+
+
+class SlowInventoryModel:
+    """Stands in for client.models: answers every image with the same three batches, slowly."""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return types.SimpleNamespace(text=json.dumps({"inventory": [batch("apple"), batch("pear"), batch("plum")]}))
+
+
+@pytest.fixture
+def app_module(sqlite_store, monkeypatch):
+    import app
+
+    models = SlowInventoryModel()
+    monkeypatch.setattr(app, "client", types.SimpleNamespace(models=models))
+    monkeypatch.setattr(app, "TEST_BIN_ID", data.store_data_to_bin({"inventory": []}))
+    app.image_cache.clear()
+    yield app, models
+    app.image_cache.clear()
+
+
+def run_concurrently(fn, count):
+    results = [None] * count
+
+    def worker(index):
+        results[index] = fn()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def stored_names(app):
+    return [item["name"] for item in data.read_data_from_bin(app.TEST_BIN_ID)["inventory"]]
+
+
+def test_concurrent_identical_uploads_store_once(app_module):
+    app, models = app_module
+    results = run_concurrently(lambda: app.analyze_image(image_bytes=b"same photo"), 6)
+
+    assert all(status == 200 and payload["stored"] for payload, status in results)
+    assert sum(1 for payload, _ in results if payload.get("cached")) == 5
+    assert models.calls == 1
+    assert sorted(stored_names(app)) == ["apple", "pear", "plum"]
+    assert not app._analyses_in_flight
+
+
+def test_store_duplicates_still_adds_again(app_module):
+    app, models = app_module
+    app.analyze_image(image_bytes=b"same photo")
+    payload, status = app.analyze_image(image_bytes=b"same photo", store_duplicates=True)
+
+    assert status == 200 and payload["cached"]
+    assert models.calls == 1
+    assert len(stored_names(app)) == 6
+
+
+def test_batch_racing_a_single_upload_stores_once(app_module):
+    app, models = app_module
+    results = run_concurrently(
+        lambda: app.analyze_images([{"image_bytes": b"same photo", "source": "a.png"}]), 2
+    ) + run_concurrently(lambda: app.analyze_image(image_bytes=b"same photo"), 1)
+
+    assert all(status == 200 for _, status in results)
+    assert models.calls == 1
+    assert sorted(stored_names(app)) == ["apple", "pear", "plum"]
+
+
+def test_duplicates_within_one_batch_are_recognized_once(app_module, monkeypatch):
+    app, models = app_module
+    recognized = []
+    recognize_image = app.recognize_image
+    monkeypatch.setattr(app, "recognize_image", lambda **kwargs: recognized.append(1) or recognize_image(**kwargs))
+    started = time.monotonic()
+    payload, status = app.analyze_images(
+        [{"image_bytes": b"same photo", "source": "a.png"}, {"image_bytes": b"same photo", "source": "b.png"}]
+    )
+
+    assert status == 200 and payload["succeeded"] == 2
+    assert time.monotonic() - started < 5
+    assert len(recognized) == 1 and models.calls == 1
+    assert payload["items_added"] == 3
+    assert [outcome.get("duplicate", False) for outcome in payload["results"]] == [False, True]
+    assert payload["results"][1]["stored"] and payload["results"][1]["items"] == 3
+    assert sorted(stored_names(app)) == ["apple", "pear", "plum"]
+    assert not app._analyses_in_flight
+
+
+def test_store_duplicates_adds_each_copy_within_one_batch(app_module):
+    app, models = app_module
+    payload, status = app.analyze_images(
+        [{"image_bytes": b"same photo", "source": "a.png"}, {"image_bytes": b"same photo", "source": "b.png"}],
+        store_duplicates=True,
+    )
+
+    assert status == 200 and payload["items_added"] == 6
+    assert len(stored_names(app)) == 6
+
+
+def test_failed_model_call_releases_the_claim(app_module, monkeypatch):
+    app, models = app_module
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("400 INVALID_ARGUMENT")
+
+    monkeypatch.setattr(models, "generate_content", broken)
+    with pytest.raises(RuntimeError):
+        app.analyze_image(image_bytes=b"bad photo")
+    assert not app._analyses_in_flight
+
+
+@pytest.mark.parametrize("body", ['["https://example.com/a.jpg"]', '{"image_urls": "https://example.com/a.jpg"}'])
+def test_batch_rejects_a_malformed_json_body(app_module, body):
+    app, models = app_module
+    client = app.app.test_client()
+    for path in ("/analyze/batch", "/api/jobs/analyze-batch"):
+        response = client.post(path, data=body, content_type="application/json")
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+    assert models.calls == 0
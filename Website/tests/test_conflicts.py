@@ -0,0 +1,129 @@
+import json
+import threading
+import types
+
+import pytest
+
+import data
+import http_client
+import storage
+from conftest import batch
+
+
+def test_incomplete_backend_cannot_be_constructed():
+    class ReadOnlyStore(storage.InventoryStore):
+        def read(self, bin_id):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
+
+
+def test_conditional_write_rejects_stale_revision(sqlite_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple")]})
+    assert data.write_data_to_bin(bin_id, {"inventory": []}, expected_rev=0)
+
+    with pytest.raises(storage.ConflictError) as excinfo:
+        data.write_data_to_bin(bin_id, {"inventory": [batch("pear")]}, expected_rev=0)
+    assert excinfo.value.actual_rev == 1
+    assert data.read_data_from_bin(bin_id)["inventory"] == []
+
+
+def test_replace_rechecks_a_stale_cache_before_conflicting(sqlite_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple")]})
+    # Another process moves the store to revision 1; this process still caches revision 0.
+    sqlite_store.write(bin_id, {"inventory": [batch("pear")]}, expected_rev=0)
+    assert storage.get_rev(data.read_data_from_bin(bin_id)) == 0
+
+    assert data.replace_data_in_bin(bin_id, {"inventory": [batch("kiwi")], "_rev": 1}, expected_rev=1)
+    record = sqlite_store.read(bin_id)
+    assert storage.get_rev(record) == 2
+    assert [item["name"] for item in record["inventory"]] == ["kiwi"]
+
+
+def test_replace_conflict_reports_the_stored_revision(sqlite_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple")]})
+    sqlite_store.write(bin_id, {"inventory": [batch("pear")]}, expected_rev=0)
+    sqlite_store.write(bin_id, {"inventory": [batch("plum")]}, expected_rev=1)
+
+    with pytest.raises(storage.ConflictError) as excinfo:
+        data.replace_data_in_bin(bin_id, {"inventory": []}, expected_rev=1)
+    assert (excinfo.value.expected_rev, excinfo.value.actual_rev) == (1, 2)
+    # The failed save doesn't leave the stale copy behind.
+    assert storage.get_rev(data.read_data_from_bin(bin_id)) == 2
+
+
+def test_concurrent_appends_all_land(sqlite_store):
+    bin_id = data.store_data_to_bin({"inventory": []})
+    threads = [
+        threading.Thread(target=data.append_items_to_bin, args=(bin_id, [batch(f"item{i}")])) for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record = sqlite_store.read(bin_id)
+    assert sorted(item["name"] for item in record["inventory"]) == sorted(f"item{i}" for i in range(8))
+    assert storage.get_rev(record) == 8
+
+
+def test_put_rejects_a_body_that_is_not_an_object(sqlite_store):
+    import app
+
+    client = app.app.test_client()
+    bin_id = data.store_data_to_bin({"inventory": []})
+    for body in ("null", "[]", '"text"'):
+        response = client.put(f"/api/fridge/{bin_id}", data=body, content_type="application/json")
+        assert response.status_code == 400
+
+
+class FakeJSONBinSession:
+    """Records JSONBin calls and keeps the bins in memory."""
+
+    def __init__(self):
+        self.bins = {}
+        self.calls = []
+
+    def _response(self, payload):
+        return types.SimpleNamespace(raise_for_status=lambda: None, json=lambda: payload)
+
+    def get(self, url, headers=None):
+        self.calls.append("GET")
+        return self._response({"record": json.loads(json.dumps(self.bins[url.rsplit("/", 1)[1]]))})
+
+    def put(self, url, headers=None, data=None):
+        self.calls.append("PUT")
+        self.bins[url.rsplit("/", 1)[1]] = json.loads(data)
+        return self._response({})
+
+
+@pytest.fixture
+def jsonbin_session(monkeypatch):
+    session = FakeJSONBinSession()
+    monkeypatch.setattr(http_client, "get_session", lambda: session)
+    monkeypatch.setattr(storage, "_store", storage.JSONBinStore(master_key="test"))
+    data.inventory_cache.clear()
+    yield session
+    data.inventory_cache.clear()
+
+
+def test_jsonbin_mutation_costs_one_read_and_one_write(jsonbin_session):
+    jsonbin_session.bins["b1"] = {"inventory": [batch("apple", quantity=3)], "_rev": 4}
+
+    assert data.consume_data_from_bin("b1", {"apple": 1})
+    assert jsonbin_session.calls == ["GET", "PUT"]
+    assert jsonbin_session.bins["b1"]["_rev"] == 5
+
+
+def test_jsonbin_mutation_keeps_another_writers_change(jsonbin_session):
+    jsonbin_session.bins["b1"] = {"inventory": [batch("apple")], "_rev": 0}
+    assert data.read_data_from_bin("b1")["_rev"] == 0
+
+    # Another worker appends while this process still caches revision 0.
+    jsonbin_session.bins["b1"] = {"inventory": [batch("apple"), batch("pear")], "_rev": 1}
+
+    assert data.append_items_to_bin("b1", [batch("plum")])
+    assert [item["name"] for item in jsonbin_session.bins["b1"]["inventory"]] == ["apple", "pear", "plum"]
+    assert jsonbin_session.bins["b1"]["_rev"] == 2
+
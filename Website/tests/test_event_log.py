@@ -0,0 +1,109 @@
+import threading
+
+import data
+import storage
+from inventory import Inventory
+from conftest import batch
+
+
+def test_reads_replay_events_on_top_of_the_snapshot(event_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple")]})
+    for name in ("pear", "plum"):
+        data.append_items_to_bin(bin_id, [batch(name)])
+
+    assert event_store.compact(bin_id)
+    data.append_items_to_bin(bin_id, [batch("kiwi")])
+
+    fresh = storage.EventLogStore(event_store.path, compact_interval=0)
+    record = fresh.read(bin_id)
+    assert storage.get_rev(record) == 3
+    assert [item["name"] for item in record["inventory"]] == ["apple", "pear", "plum", "kiwi"]
+
+
+def test_compaction_between_snapshot_and_event_reads(event_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple")]})
+    for name in ("pear", "plum"):
+        data.append_items_to_bin(bin_id, [batch(name)])
+
+    # A second process reads the bin while this one compacts it: the compaction
+    # commits right before the reader fetches the events after its snapshot.
+    reader = storage.EventLogStore(event_store.path, compact_interval=0)
+    compactor = storage.EventLogStore(event_store.path, compact_interval=0)
+    compacted = []
+
+    def compact_mid_read(statement):
+        if statement.startswith("SELECT rev, events") and not compacted:
+            compacted.append(compactor.compact(bin_id))
+
+    reader._connect().set_trace_callback(compact_mid_read)
+    record = reader.read(bin_id)
+    reader._connect().set_trace_callback(None)
+
+    assert compacted == [True]
+    assert storage.get_rev(record) == 2
+    assert [item["name"] for item in record["inventory"]] == ["apple", "pear", "plum"]
+    # The materialized state it kept is complete too.
+    data.append_items_to_bin(bin_id, [batch("kiwi")])
+    assert [item["name"] for item in reader.read(bin_id)["inventory"]] == ["apple", "pear", "plum", "kiwi"]
+
+
+def test_concurrent_writes_and_compaction_keep_every_batch(event_store):
+    bin_id = data.store_data_to_bin({"inventory": []})
+    stop = threading.Event()
+    compactor = storage.EventLogStore(event_store.path, compact_interval=0)
+    reader = storage.EventLogStore(event_store.path, compact_interval=0)
+    bad_reads = []
+
+    def compact_loop():
+        while not stop.is_set():
+            compactor.compact(bin_id)
+
+    def read_loop():
+        while not stop.is_set():
+            record = reader.read(bin_id)
+            # Every write appends one batch, so revision and length must agree.
+            if len(record["inventory"]) != storage.get_rev(record):
+                bad_reads.append(record)
+
+    threads = [threading.Thread(target=compact_loop), threading.Thread(target=read_loop)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(40):
+            data.append_items_to_bin(bin_id, [batch(f"item{i}")])
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert not bad_reads
+    assert len(reader.read(bin_id)["inventory"]) == 40
+
+
+def test_replayed_edits_match_the_written_record(event_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple"), batch("pear"), batch("plum")]})
+    assert data.replace_data_in_bin(bin_id, dict(data.read_data_from_bin(bin_id), note="weekly shop"))
+
+    record = data.read_data_from_bin(bin_id)
+    del record["note"]
+    del record["inventory"][1]["protein"]  # an edited batch keeps its place
+    record["inventory"].insert(0, batch("kiwi"))
+    assert data.replace_data_in_bin(bin_id, record)
+
+    written = data.read_data_from_bin(bin_id)
+    replayed = storage.EventLogStore(event_store.path, compact_interval=0).read(bin_id)
+    assert replayed == written
+    assert "note" not in replayed
+    assert [item["name"] for item in replayed["inventory"]] == ["kiwi", "apple", "pear", "plum"]
+    assert "protein" not in replayed["inventory"][2]
+
+
+def test_consumption_is_logged_as_its_outcome(event_store, monkeypatch):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple", quantity=3), batch("pear")]})
+    written, _ = data.consume_data_from_bin(bin_id, {"apple": 1, "pear": 1})
+
+    # Replay must not depend on the consumption rules of the code reading the log.
+    monkeypatch.setattr(Inventory, "consume_many", lambda self, consumed_map: {})
+    replayed = storage.EventLogStore(event_store.path, compact_interval=0).read(bin_id)
+    assert replayed == written
+    assert [(item["name"], item["quantity"]) for item in replayed["inventory"]] == [("apple", 2)]
@@ -0,0 +1,27 @@
+import data
+from conftest import batch
+
+
+def test_per_unit_follows_an_edited_batch(sqlite_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple", quantity=2)]})
+    record = data.read_data_from_bin(bin_id)
+    assert record["inventory"][0]["per_unit"]["calories"] == 100
+
+    edited = dict(record["inventory"][0], quantity=4, calories=800)
+    assert data.replace_data_in_bin(bin_id, {"inventory": [edited]})
+    assert data.read_data_from_bin(bin_id)["inventory"][0]["per_unit"]["calories"] == 200
+
+
+def test_partial_consumption_changes_only_the_quantity(sqlite_store):
+    bin_id = data.store_data_to_bin({"inventory": [batch("apple", quantity=3)]})
+    data.consume_data_from_bin(bin_id, {"apple": 1})
+
+    item = data.read_data_from_bin(bin_id)["inventory"][0]
+    assert (item["quantity"], item["calories"], item["protein"]) == (2, 300, 3)
+    assert item["per_unit"]["calories"] == 100
+
+    # Saving the consumed batch back (as the fridge page does) leaves per-unit values alone.
+    assert data.replace_data_in_bin(bin_id, {"inventory": [item]})
+    item = data.read_data_from_bin(bin_id)["inventory"][0]
+    assert item["per_unit"]["calories"] == 100
+    assert (item["quantity"], item["calories"]) == (2, 300)
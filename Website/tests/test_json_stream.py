@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from json_stream import JSONArrayStreamParser
+
+
+RECIPES = [
+    {"name": "Soup {hot}", "steps": ["chop [finely]", "boil"]},
+    {"name": 'Say "cheese"', "note": "back\\slash \\\" and } inside"},
+    {"name": "Plain", "servings": 2, "tags": []},
+]
+STREAM = "```json\n" + json.dumps(RECIPES) + "\n```"
+
+
+def feed_in_pieces(text, cuts):
+    parser = JSONArrayStreamParser()
+    objects = []
+    start = 0
+    for cut in list(cuts) + [len(text)]:
+        objects.extend(parser.feed(text[start:cut]))
+        start = cut
+    return parser, objects
+
+
+def test_whole_stream_at_once():
+    parser, objects = feed_in_pieces(STREAM, [])
+    assert objects == RECIPES
+    assert parser.done
+    assert parser.count == 3
+
+
+@pytest.mark.parametrize("cut", range(1, len(STREAM)))
+def test_any_chunk_boundary_gives_the_same_objects(cut):
+    parser, objects = feed_in_pieces(STREAM, [cut])
+    assert objects == RECIPES
+    assert parser.done
+
+
+def test_one_character_at_a_time():
+    parser, objects = feed_in_pieces(STREAM, range(1, len(STREAM)))
+    assert objects == RECIPES
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    parser = JSONArrayStreamParser()
+    first = json.dumps(RECIPES[0])
+    assert parser.feed("[" + first[:-1]) == []
+    assert parser.feed(first[-1] + ", {") == [RECIPES[0]]
+    assert not parser.done
+
+
+def test_escaped_quote_split_from_its_backslash():
+    text = '[{"name": "a \\"b\\" }"}]'
+    cut = text.index("\\") + 1
+    parser, objects = feed_in_pieces(text, [cut])
+    assert objects == [{"name": 'a "b" }'}]
+
+
+def test_truncated_stream_keeps_the_complete_objects():
+    text = json.dumps(RECIPES)
+    truncated = text[:text.index("Plain")]
+    parser, objects = feed_in_pieces(truncated, [])
+    assert objects == RECIPES[:2]
+    assert not parser.done
+    assert parser.count == 2
+
+
+def test_text_after_the_array_is_ignored():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"a": 1}]\n```') == [{"a": 1}]
+    assert parser.feed('[{"b": 2}]') == []
+
+
+def test_malformed_element_is_skipped():
+    parser, objects = feed_in_pieces('[{"a": 1,}, {"b": 2}]', [])
+    assert objects == [{"b": 2}]
+    assert parser.count == 1
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from model_governor import ModelGovernor, ModelTimeoutError, ModelUnavailableError, is_retryable
+
+
+def governor(**overrides):
+    options = dict(max_concurrency=4, rpm=0, queue_timeout=1, timeout=2, max_retries=2, backoff=0.01, hedge_after=0)
+    options.update(overrides)
+    return ModelGovernor(**options)
+
+
+@pytest.mark.parametrize("error", [
+    httpx.ReadTimeout("timed out"),
+    httpx.WriteTimeout("timed out"),
+    httpx.PoolTimeout("timed out"),
+    httpx.ConnectError("refused"),
+    ModelTimeoutError("slow"),
+])
+def test_timeouts_and_transport_errors_are_retryable(error):
+    assert is_retryable(error)
+
+
+def test_http_timeouts_are_retried_then_succeed():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ReadTimeout("timed out")
+        return "ok"
+
+    assert governor().call(flaky) == "ok"
+    assert len(calls) == 3
+
+
+def test_bad_requests_are_not_retried():
+    calls = []
+
+    def bad():
+        calls.append(1)
+        raise ValueError("400 INVALID_ARGUMENT")
+
+    with pytest.raises(ValueError):
+        governor().call(bad)
+    assert len(calls) == 1
+
+
+def test_slow_attempts_time_out_after_the_retries():
+    with pytest.raises(ModelUnavailableError):
+        governor(timeout=0.05, max_retries=1).call(lambda: time.sleep(0.3))
+
+
+def test_identical_calls_in_flight_share_one_request():
+    gov = governor()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gov.call(slow, key="same"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert gov.counts["joined"] == 4
+
+
+def test_hedged_copy_answers_when_the_first_stalls():
+    gov = governor(hedge_after=0.05)
+    attempts = []
+    lock = threading.Lock()
+
+    def first_stalls():
+        with lock:
+            attempts.append(1)
+            number = len(attempts)
+        time.sleep(1 if number == 1 else 0)
+        return number
+
+    started = time.monotonic()
+    assert gov.call(first_stalls) == 2
+    assert time.monotonic() - started < 0.5
+    assert gov.counts["hedge_won"] == 1
+
+
+def test_primary_error_is_raised_when_the_hedge_hangs():
+    gov = governor(hedge_after=0.05, timeout=0.3, max_retries=0)
+    attempts = []
+    lock = threading.Lock()
+
+    def first_fails_then_hedge_hangs():
+        with lock:
+            attempts.append(1)
+            number = len(attempts)
+        if number == 1:
+            time.sleep(0.1)  # still running when the hedge starts
+            raise ValueError("400 INVALID_ARGUMENT")
+        time.sleep(1)
+
+    with pytest.raises(ValueError, match="INVALID_ARGUMENT"):
+        gov.call(first_fails_then_hedge_hangs)
+    assert len(attempts) == 2
+    assert gov.counts.get("timeout", 0) == 0
@@ -0,0 +1,68 @@
+import pytest
+
+from model_governor import ModelBusyError, ModelGovernor, ModelUnavailableError
+from model_router import MIN_SAMPLES, ModelRouter
+
+
+class QuotaError(Exception):
+    code = 429
+
+
+@pytest.fixture
+def router():
+    governor = ModelGovernor(max_concurrency=4, rpm=0, queue_timeout=1, timeout=2, max_retries=0, backoff=0.01)
+    return ModelRouter(governor, default_model="big", light_model="light", fallback_models=["spare"])
+
+
+def test_small_requests_try_the_light_model_first(router):
+    assert router.route("analyze", payload_bytes=1000) == ["light", "big", "spare"]
+    assert router.route("analyze", payload_bytes=10_000_000) == ["big", "light", "spare"]
+
+
+def test_quota_errors_fall_back_to_the_next_model(router):
+    tried = []
+
+    def call_model(model):
+        tried.append(model)
+        if model == "light":
+            raise QuotaError("429 RESOURCE_EXHAUSTED")
+        return f"answer from {model}"
+
+    assert router.call("analyze", call_model, payload_bytes=1000) == "answer from big"
+    assert tried == ["light", "big"]
+
+
+@pytest.mark.parametrize("error", [ValueError("400 INVALID_ARGUMENT"), ModelBusyError("limiter full")])
+def test_errors_another_model_would_hit_too_are_raised(router, error):
+    tried = []
+
+    def call_model(model):
+        tried.append(model)
+        raise error
+
+    with pytest.raises(type(error)):
+        router.call("analyze", call_model, payload_bytes=1000)
+    assert tried == ["light"]
+
+
+def test_the_last_model_failing_raises(router):
+    def call_model(model):
+        raise QuotaError("429 RESOURCE_EXHAUSTED")
+
+    with pytest.raises(ModelUnavailableError):
+        router.call("analyze", call_model, payload_bytes=1000)
+
+
+def test_a_failing_model_moves_to_the_back(router):
+    for _ in range(MIN_SAMPLES):
+        router.record("light", "analyze", 0.1, ok=False)
+    assert router.route("analyze", payload_bytes=1000) == ["big", "spare", "light"]
+
+
+def test_streams_fall_back_before_the_first_chunk(router):
+    def open_stream(model):
+        if model == "light":
+            raise QuotaError("429 RESOURCE_EXHAUSTED")
+        return iter(["a", "b"])
+
+    assert list(router.stream("recipes_stream", open_stream, payload_bytes=100)) == ["a", "b"]
@@ -0,0 +1,58 @@
+from datetime import date
+
+from conftest import batch
+from prompt_builder import aggregate_inventory, build_inventory_table, estimate_tokens
+
+TODAY = date(2030, 1, 1)
+
+
+def fridge(count):
+    """`count` different foods; the first 28 expire a day apart in February, the rest in June."""
+    return [batch(f"food{index:03d}", expiry=f"{index + 1:02d}/02/2030" if index < 28 else "01/06/2030")
+            for index in range(count)]
+
+
+def test_batches_of_the_same_food_are_merged():
+    rows = aggregate_inventory([
+        batch("apple", quantity=2, expiry="05/01/2030"),
+        batch(" Apple", quantity=3, expiry="02/01/2030"),
+        batch("apple", quantity=1, unit="grams"),
+    ])
+    by_unit = {row["unit"]: row for row in rows}
+    assert by_unit["items"]["quantity"] == 5
+    assert by_unit["items"]["batches"] == 2
+    assert by_unit["items"]["calories"] == 500
+    assert by_unit["items"]["expected_expiry_date"] == "02/01/2030"
+    assert [row["unit"] for row in rows] == ["grams", "items"]  # earliest expiry first
+
+
+def test_small_inventory_is_listed_in_full():
+    table, stats = build_inventory_table(fridge(3), today=TODAY)
+    assert (stats["rows"], stats["listed"], stats["named_only"], stats["dropped"]) == (3, 3, 0, 0)
+    assert "Also available" not in table
+    assert "|31|" in table  # days left until 01/02/2030
+
+
+def test_table_stays_within_the_token_budget():
+    for budget in (80, 150, 300, 600):
+        table, stats = build_inventory_table(fridge(60), token_budget=budget, today=TODAY)
+        assert estimate_tokens(table) <= budget + 1
+        assert stats["listed"] + stats["named_only"] + stats["dropped"] == 60
+
+
+def test_overflow_names_the_latest_expiring_rows():
+    table, stats = build_inventory_table(fridge(40), token_budget=300, today=TODAY)
+    assert 0 < stats["listed"] < 40
+    assert stats["named_only"] > 0
+    # Earliest expiring foods get full rows; the rest are only named or counted.
+    assert "|food000|" in table
+    assert "|food039|" not in table
+    overflow = table.splitlines()[-1]
+    assert overflow.startswith("Also available")
+    assert f"food{stats['listed']:03d}" in overflow
+
+
+def test_rows_past_the_names_are_counted():
+    table, stats = build_inventory_table(fridge(60), token_budget=120, today=TODAY)
+    assert stats["dropped"] > 0
+    assert table.endswith(f"{stats['dropped']} more item(s)")
@@ -0,0 +1,124 @@
+import types
+
+import pytest
+
+import model_router
+from prompt_builder import estimate_tokens
+from prompt_cache import PromptCache, is_stale_cache_error, model_min_cache_tokens
+
+PREFIX = "Follow these rules. " * 250  # ~1250 tokens
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeClient:
+    """client.caches / client.models.count_tokens, with a fixed token count and an optional create error."""
+
+    def __init__(self, total_tokens=1250, create_error=None):
+        self.total_tokens = total_tokens
+        self.create_error = create_error
+        self.creates = 0
+        self.counts = 0
+        self.caches = types.SimpleNamespace(create=self._create)
+        self.models = types.SimpleNamespace(count_tokens=self._count_tokens)
+
+    def _count_tokens(self, model, contents):
+        self.counts += 1
+        return types.SimpleNamespace(total_tokens=self.total_tokens)
+
+    def _create(self, model, config):
+        self.creates += 1
+        if self.create_error:
+            raise self.create_error
+        return types.SimpleNamespace(name=f"cachedContents/{self.creates}")
+
+
+@pytest.mark.parametrize("model, minimum", [
+    ("gemini-2.5-flash", 1024),
+    ("gemini-2.5-flash-lite", 1024),
+    ("models/gemini-2.5-pro", 2048),
+    ("gemini-2.0-flash", 4096),
+])
+def test_model_minimums(model, minimum):
+    assert model_min_cache_tokens(model) == minimum
+
+
+def test_prefix_large_enough_for_the_model_is_cached():
+    cache, client = PromptCache(min_tokens=0), FakeClient()
+    assert cache.lookup(client, "gemini-2.5-flash", PREFIX) == "cachedContents/1"
+    assert cache.lookup(client, "gemini-2.5-flash", PREFIX) == "cachedContents/1"
+    assert (client.counts, client.creates) == (1, 1)
+
+
+def test_prefix_below_the_model_minimum_is_never_sent_to_create():
+    cache, client = PromptCache(min_tokens=0, retry=0), FakeClient()
+    for _ in range(3):
+        assert cache.lookup(client, "gemini-2.0-flash", PREFIX) is None
+    assert client.creates == 0
+    assert cache.counts["too_small"] == 1
+
+
+def test_counted_tokens_decide_not_the_estimate():
+    cache, client = PromptCache(min_tokens=0), FakeClient(total_tokens=900)
+    assert cache.lookup(client, "gemini-2.5-flash", PREFIX) is None
+    assert (client.counts, client.creates) == (1, 0)
+
+
+def test_rejected_create_is_not_retried():
+    client = FakeClient(create_error=FakeAPIError(400, "INVALID_ARGUMENT: cached content is too small"))
+    cache = PromptCache(min_tokens=0, retry=0)
+    for _ in range(3):
+        assert cache.lookup(client, "gemini-2.5-flash", PREFIX) is None
+    assert client.creates == 1
+    assert cache.stats()["entries"][0]["expires_in"] is None
+
+
+def test_transient_create_failure_is_retried_later():
+    client = FakeClient(create_error=FakeAPIError(503, "UNAVAILABLE"))
+    cache = PromptCache(min_tokens=0, retry=0)
+    cache.lookup(client, "gemini-2.5-flash", PREFIX)
+    client.create_error = None
+    assert cache.lookup(client, "gemini-2.5-flash", PREFIX) == "cachedContents/2"
+
+
+
+@pytest.mark.parametrize("model", [model_router.DEFAULT_MODEL, model_router.LIGHT_MODEL])
+@pytest.mark.parametrize("prefix_name", ["ANALYZE_PROMPT_PREFIX", "RECIPE_PROMPT_PREFIX"])
+def test_app_prefixes_are_sent_inline_on_the_default_models(model, prefix_name):
+    import app
+
+    prefix = getattr(app, prefix_name)
+    cache, client = PromptCache(), FakeClient(total_tokens=estimate_tokens(prefix))
+    assert cache.lookup(client, model, prefix) is None
+    assert client.creates == 0
+
+
+@pytest.mark.parametrize("error, stale", [
+    (FakeAPIError(404, "NOT_FOUND: cachedContents/1"), True),
+    (FakeAPIError(400, "INVALID_ARGUMENT: Cached content cachedContents/1 has expired"), True),
+    (FakeAPIError(400, "INVALID_ARGUMENT: Request contains an invalid argument."), False),
+    (FakeAPIError(403, "PERMISSION_DENIED: API key not valid"), False),
+    (FakeAPIError(429, "RESOURCE_EXHAUSTED"), False),
+])
+def test_only_errors_about_the_cache_count_as_stale(error, stale):
+    assert is_stale_cache_error(error) is stale
+
+
+def test_a_bad_request_on_a_cached_call_is_not_resent_inline():
+    client = FakeClient()
+    calls = []
+
+    def generate_content(model, contents, config=None):
+        calls.append(config)
+        raise FakeAPIError(400, "INVALID_ARGUMENT: Request contains an invalid argument.")
+
+    client.models.generate_content = generate_content
+    cache = PromptCache(min_tokens=0)
+    with pytest.raises(FakeAPIError):
+        cache.generate_content(client, "gemini-2.5-flash", PREFIX, [{"text": "suffix"}])
+    assert len(calls) == 1
+    assert cache.lookup(client, "gemini-2.5-flash", PREFIX) == "cachedContents/1"
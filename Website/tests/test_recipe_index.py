@@ -0,0 +1,115 @@
+from datetime import date
+
+import pytest
+
+from recipe_index import RecipeIndex, required_diets, shopping_needed
+from conftest import batch
+
+TODAY = date(2030, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def index():
+    return RecipeIndex.load()
+
+
+def pancake_fridge():
+    return [
+        batch("banana", quantity=4, expiry="02/01/2030"),
+        batch("eggs", quantity=6, unit="eggs"),
+        batch("oats", quantity=500, unit="grams"),
+    ]
+
+
+def names(recipes):
+    return [recipe["name"] for recipe in recipes]
+
+
+@pytest.mark.parametrize("restrictions, diets", [
+    ("", set()),
+    ("none", set()),
+    ("Vegetarian", {"vegetarian"}),
+    ("vegan, gluten free", {"vegan", "gluten-free"}),
+    ("lactose intolerant and vegetarian", {"dairy-free", "vegetarian"}),
+])
+def test_required_diets_maps_known_restrictions(restrictions, diets):
+    assert required_diets(restrictions) == diets
+
+
+@pytest.mark.parametrize("restrictions", ["no eggs, egg allergy", "halal", "pescatarian", "vegetarian, no nuts"])
+def test_unrecognized_restrictions_skip_the_local_index(index, restrictions):
+    assert required_diets(restrictions) is None
+    preferences = {"dietary_restrictions": restrictions, "target_calories_per_meal": 400}
+    assert index.suggest(pancake_fridge(), preferences, min_score=0, today=TODAY) == []
+
+
+def test_recognized_restrictions_still_match(index):
+    preferences = {"dietary_restrictions": "vegetarian", "target_calories_per_meal": 400}
+    assert "Banana Oat Pancakes" in names(index.suggest(pancake_fridge(), preferences, min_score=0, today=TODAY))
+
+
+def test_expired_batches_are_not_cooked_or_counted_as_urgent(index):
+    fresh = {recipe["name"]: recipe for recipe in index.suggest(pancake_fridge(), {}, limit=10, min_score=0, today=TODAY)}
+    assert fresh["Banana Oat Pancakes"]["urgency"] == "high"
+
+    fridge = pancake_fridge() + [batch("banana", quantity=4, expiry="31/12/2029")]
+    with_expired = {recipe["name"]: recipe for recipe in index.suggest(fridge, {}, limit=10, min_score=0, today=TODAY)}
+    assert with_expired["Banana Oat Pancakes"]["match_score"] == fresh["Banana Oat Pancakes"]["match_score"]
+
+    only_expired = [batch("banana", quantity=4, expiry="31/12/2029")] + pancake_fridge()[1:]
+    assert "Banana Oat Pancakes" not in names(index.suggest(only_expired, {}, limit=10, min_score=0, today=TODAY))
+
+
+def test_coverage_counts_ingredients_to_buy(index):
+    fridge = [
+        batch("chicken breast", quantity=500, unit="grams"),
+        batch("broccoli", quantity=2),
+        batch("rice", quantity=500, unit="grams"),
+        batch("salmon", quantity=500, unit="grams"),
+        batch("lemon"),
+    ]
+    scores = {recipe["name"]: recipe["match_score"] for recipe in index.suggest(fridge, {}, limit=10, min_score=0, today=TODAY)}
+    # Same fridge ingredients and urgency; the rice bowl also needs teriyaki sauce bought.
+    assert scores["Roast Salmon with Broccoli"] > scores["Chicken and Broccoli Rice Bowl"]
+
+
+def one_ingredient_index(name):
+    return RecipeIndex([{
+        "name": f"Just {name}",
+        "ingredients": [{"name": name, "quantity": 1, "unit": "items"}],
+        "nutrition_per_serving": {"calories": 100},
+    }])
+
+
+@pytest.mark.parametrize("ingredient, stocked", [
+    ("cheese", "cream cheese"),
+    ("beans", "coffee beans"),
+    ("milk", "coconut milk"),
+    ("carrot", "carrot cake"),
+])
+def test_ingredients_do_not_match_items_that_merely_contain_their_name(ingredient, stocked):
+    assert one_ingredient_index(ingredient).suggest([batch(stocked)], {}, min_score=0, today=TODAY) == []
+
+
+@pytest.mark.parametrize("ingredient, stocked", [("cheese", "cheddar"), ("chicken breast", "chicken"), ("eggs", "egg")])
+def test_ingredients_match_their_aliases(ingredient, stocked):
+    recipes = one_ingredient_index(ingredient).suggest([batch(stocked)], {}, min_score=0, today=TODAY)
+    assert recipes[0]["inventory_items_used"] == [f"1 items of {stocked}"]
+
+
+@pytest.mark.parametrize("extra, to_buy", [
+    ("1 tbsp honey (64 cal, 0g protein, 17g carbs, 0g fats)", True),
+    ("1 tbsp vinegar (3 cal)", True),
+    ("scallions", False),
+    ("calamansi juice", False),
+    ("salt", False),
+])
+def test_shopping_needed_reads_the_calorie_note(extra, to_buy):
+    assert shopping_needed(extra) is to_buy
+
+
+@pytest.mark.parametrize("target, expected", [("450", 450), ("450.6", 451), ("lots", 500), (None, 500), (-10, 500)])
+def test_recipe_preferences_coerce_the_calorie_target(target, expected):
+    import app
+
+    assert app.recipe_preferences({"target_calories_per_meal": target})["target_calories_per_meal"] == expected
@@ -0,0 +1,66 @@
+import pytest
+
+from schemas import extract_json, validate_inventory, validate_recipes
+
+
+@pytest.mark.parametrize("text", [
+    '{"inventory": [{"name": "apple"}]}',
+    '```json\n{"inventory": [{"name": "apple"}]}\n```',
+    'Here is the inventory:\n{"inventory": [{"name": "apple"}]}\nLet me know!',
+    '{"inventory": [{"name": "apple",},],}',
+    "{'inventory': [{'name': 'apple'}]}",
+    '```\n{"inventory": [{"name": "apple"}]}',
+])
+def test_extract_json_recovers_an_object(text):
+    assert extract_json(text) == {"inventory": [{"name": "apple"}]}
+
+
+def test_extract_json_reads_python_literals():
+    assert extract_json("{'fresh': True, 'note': None}") == {"fresh": True, "note": None}
+
+
+def test_extract_json_checks_the_expected_type():
+    assert extract_json('{"name": "apple"}', expect=list) is None
+
+
+def test_extract_json_salvages_a_truncated_array():
+    text = '```json\n[{"name": "Soup"}, {"name": "Salad"}, {"name": "Ste'
+    assert extract_json(text, expect=list) == [{"name": "Soup"}, {"name": "Salad"}]
+
+
+@pytest.mark.parametrize("text", [None, "", "no json here", "{broken"])
+def test_extract_json_gives_none_for_nothing_usable(text):
+    assert extract_json(text) is None
+
+
+def test_validate_inventory_cleans_batches_and_reports_unusable_ones():
+    value, problems = validate_inventory([
+        {"name": " Apple ", "type": "Fruit", "quantity": "3 pieces", "calories": "95.0", "fats": True},
+        {"type": "dairy"},
+    ])
+    assert problems == ["inventory[1] has no name"]
+    [apple] = value["inventory"]
+    assert apple["name"] == "Apple"
+    assert apple["type"] == "fruit"
+    assert apple["unit"] == "items"
+    assert apple["quantity"] == 3
+    assert apple["calories"] == 95
+    assert apple["fats"] == 0
+
+
+def test_validate_inventory_rejects_the_wrong_shape():
+    assert validate_inventory({"items": []}) == (None, ["expected an object with an 'inventory' list"])
+
+
+def test_validate_recipes_normalizes_fields():
+    recipes, problems = validate_recipes({"recipes": [
+        {"name": "Soup", "instructions": "Boil it", "servings": 0, "urgency": "urgent",
+         "nutrition_per_serving": {"calories": "120 kcal"}},
+        {"instructions": ["nameless"]},
+    ]})
+    assert problems == ["recipes[1] has no name"]
+    [soup] = recipes
+    assert soup["instructions"] == ["Boil it"]
+    assert soup["servings"] == 1
+    assert soup["urgency"] == "low"
+    assert soup["nutrition_per_serving"] == {"calories": 120, "carbs": 0, "fats": 0, "protein": 0}
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from write_buffer import WriteBuffer
+
+
+class Recorder:
+    def __init__(self, result=True):
+        self.result = result
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, bin_id, items):
+        with self._lock:
+            self.calls.append((bin_id, [item["name"] for item in items]))
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class GatedRecorder(Recorder):
+    """Holds the first flush until `gate` is set, so later submissions pile up behind it."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def __call__(self, bin_id, items):
+        if not self.calls:
+            self.gate.wait(5)
+        return super().__call__(bin_id, items)
+
+
+def test_a_lone_submission_does_not_wait_for_the_window():
+    flush = Recorder()
+    buffer = WriteBuffer(flush, window=30)
+
+    assert buffer.submit("a", [{"name": "apple"}]).result(timeout=1)
+    assert flush.calls == [("a", ["apple"])]
+    buffer.close()
+
+
+def test_a_burst_behind_a_write_is_flushed_as_one_write_per_bin():
+    flush = GatedRecorder()
+    buffer = WriteBuffer(flush, window=0.1)
+    first = buffer.submit("a", [{"name": "first"}])
+    time.sleep(0.05)
+    futures = [buffer.submit("a", [{"name": f"item{i}"}]) for i in range(5)] + [buffer.submit("b", [{"name": "x"}])]
+    flush.gate.set()
+
+    assert first.result(timeout=5) and all(future.result(timeout=5) for future in futures)
+    assert sorted(flush.calls) == [("a", ["first"]), ("a", [f"item{i}" for i in range(5)]), ("b", ["x"])]
+    buffer.close()
+
+
+def test_max_items_flushes_before_the_window():
+    flush = Recorder()
+    buffer = WriteBuffer(flush, window=30, max_items=3)
+    buffer.submit("a", [{"name": "first"}]).result(timeout=5)
+    with buffer._cond:  # queue three at once, as if they arrived during a write
+        futures = [buffer.submit("a", [{"name": f"item{i}"}]) for i in range(3)]
+
+    assert all(future.result(timeout=5) for future in futures)
+    assert flush.calls == [("a", ["first"]), ("a", ["item0", "item1", "item2"])]
+    buffer.close()
+
+
+def test_a_failed_flush_reaches_every_caller():
+    buffer = WriteBuffer(Recorder(result=RuntimeError("store down")), window=0.05)
+    futures = [buffer.submit("a", [{"name": "apple"}]), buffer.submit("a", [{"name": "pear"}])]
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    buffer.close()
+
+
+def test_close_flushes_what_is_queued_and_writes_through_afterwards():
+    flush = Recorder()
+    buffer = WriteBuffer(flush, window=30)
+    queued = buffer.submit("a", [{"name": "apple"}])
+    buffer.close()
+
+    assert queued.result(timeout=0)
+    assert buffer.submit("a", [{"name": "pear"}]).result(timeout=0)
+    assert flush.calls == [("a", ["apple"]), ("a", ["pear"])]
+
+
+def test_a_slow_bin_does_not_hold_up_the_others():
+    release = threading.Event()
+
+    def flush(bin_id, items):
+        if bin_id == "slow":
+            release.wait(5)
+        return True
+
+    buffer = WriteBuffer(flush, window=0.01, workers=2)
+    slow = buffer.submit("slow", [{"name": "apple"}])
+    time.sleep(0.05)
+    assert buffer.submit("fast", [{"name": "pear"}]).result(timeout=1)
+    assert not slow.done()
+
+    # Items queued while the slow bin is being written go into its next flush.
+    later = buffer.submit("slow", [{"name": "plum"}])
+    release.set()
+    assert slow.result(timeout=5) and later.result(timeout=5)
+    buffer.close()
+
+
+def test_an_unacknowledged_write_is_reported_pending_not_failed(monkeypatch):
+    import data
+
+    flush = GatedRecorder()
+    buffer = WriteBuffer(flush, window=0.01)
+    monkeypatch.setattr(data, "write_buffer", buffer)
+    monkeypatch.setattr(data, "WRITE_COALESCE_MS", 10)
+    monkeypatch.setattr(data, "WRITE_ACK_TIMEOUT", 0.05)
+
+    assert data.add_items_to_bin({"inventory": [{"name": "apple"}]}, "a") is None
+    flush.gate.set()
+    buffer.close()
+    assert flush.calls == [("a", ["apple"])]
@@ -0,0 +1,154 @@
+import atexit
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer that coalesces item additions per bin.
+
+    submit() queues new items and returns a Future. A background thread flushes
+    each bin's queue with a single `flush_fn(bin_id, items)` call, then
+    resolves every Future in the batch with the flush result, so callers that
+    wait on their Future get an accurate acknowledgement. A lone submission
+    (nothing else queued or being written for its bin) is flushed at once, so
+    a single request never waits for the window. Submissions that pile up
+    behind a flush in flight are merged and written once the oldest is
+    `window` seconds old or `max_items` items are waiting, so a burst of N
+    additions costs two writes instead of N.
+
+    Up to `workers` bins are flushed in parallel, so one slow write doesn't
+    hold up the others. A bin has at most one flush in flight; items queued
+    for it meanwhile go into its next flush, in order.
+
+    Anything still queued is flushed when the interpreter exits (atexit), and
+    submissions made after close() are written straight through.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[str, List[Dict[str, Any]]], bool],
+        window: float = 0.25,
+        max_items: int = 50,
+        workers: int = 4,
+    ):
+        self.flush_fn = flush_fn
+        self.window = window
+        self.max_items = max_items
+        self.workers = max(1, workers)
+        self._pending: Dict[str, List[Tuple[List[Dict[str, Any]], Future]]] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._flushing: Set[str] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.submits = 0
+        self.flushes = 0
+        self.items_flushed = 0
+        atexit.register(self.close)
+
+    def submit(self, bin_id: str, items: List[Dict[str, Any]]) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self.submits += 1
+            if not self._closed:
+                self._pending.setdefault(bin_id, []).append((items, future))
+                self._deadlines.setdefault(bin_id, time.monotonic() + self.window)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+                    self._thread.start()
+                self._cond.notify()
+                return future
+
+        # Shutting down: don't queue anything that might never be flushed.
+        self._flush(bin_id, [(items, future)])
+        return future
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """Flushes everything still queued and stops the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _due_bins(self) -> List[str]:
+        now = time.monotonic()
+        due = [
+            bin_id for bin_id, entries in self._pending.items()
+            if bin_id not in self._flushing and (
+                self._closed
+                or len(entries) == 1
+                or self._deadlines[bin_id] <= now
+                or sum(len(items) for items, _ in entries) >= self.max_items
+            )
+        ]
+        return due[:self.workers - len(self._flushing)]
+
+    def _next_deadline(self) -> Optional[float]:
+        if len(self._flushing) >= self.workers:
+            return None  # woken up when a flush finishes
+        deadlines = [deadline for bin_id, deadline in self._deadlines.items() if bin_id not in self._flushing]
+        return max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                due = self._due_bins()
+                while not due:
+                    if self._closed and not self._pending and not self._flushing:
+                        return
+                    self._cond.wait(self._next_deadline())
+                    due = self._due_bins()
+
+                batches = {bin_id: self._pending.pop(bin_id) for bin_id in due}
+                for bin_id in due:
+                    del self._deadlines[bin_id]
+                self._flushing.update(due)
+
+            # Plain threads rather than an executor: those refuse new work
+            # while the interpreter shuts down, which is when close() flushes.
+            for bin_id, entries in batches.items():
+                threading.Thread(
+                    target=self._flush_in_background, args=(bin_id, entries), name=f"write-buffer-{bin_id}", daemon=True
+                ).start()
+
+    def _flush_in_background(self, bin_id: str, entries: List[Tuple[List[Dict[str, Any]], Future]]) -> None:
+        try:
+            self._flush(bin_id, entries)
+        finally:
+            with self._cond:
+                self._flushing.discard(bin_id)
+                self._cond.notify()
+
+    def _flush(self, bin_id: str, entries: List[Tuple[List[Dict[str, Any]], Future]]) -> None:
+        items = [item for batch, _ in entries for item in batch]
+        try:
+            ok = bool(self.flush_fn(bin_id, items))
+        except Exception as e:
+            print(f"   ❌ Error flushing {len(items)} buffered item(s) to bin {bin_id}: {e}")
+            for _, future in entries:
+                future.set_exception(e)
+            return
+
+        with self._cond:
+            self.flushes += 1
+            if ok:
+                self.items_flushed += len(items)
+        for _, future in entries:
+            future.set_result(ok)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "window": self.window,
+                "max_items": self.max_items,
+                "queued_bins": len(self._pending),
+                "flushing_bins": len(self._flushing),
+                "submits": self.submits,
+                "flushes": self.flushes,
+                "items_flushed": self.items_flushed,
+            }